@@ -36,10 +36,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'isp_inventory.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'isp_inventory.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -154,19 +156,47 @@ LOGGING = {
     },
 }
 
+# Two tiers (see isp_inventory/caching.py): a per-process LRU in front of
+# Redis. Without REDIS_URL the shared tier is process-local memory, which
+# is what tests and single-process development use.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+        'BACKEND': 'isp_inventory.caching.TieredCache',
+        'TIMEOUT': 60 * 60 * 1,
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
         'KEY_PREFIX': 'isp_inventory',
         'VERSION': 1,
         'TIMEOUT': 60 * 60 * 1,
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Redis being down costs cache misses, not errors
+            'IGNORE_EXCEPTIONS': True,
         },
-        'KEY_FUNCTION': lambda key: f'{settings.KEY_PREFIX}:{settings.VERSION}:{key}',
-    }
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'isp_inventory',
+        'KEY_PREFIX': 'isp_inventory',
+        'VERSION': 1,
+        'TIMEOUT': 60 * 60 * 1,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
 SESSION_COOKIE_AGE = 60 * 60 * 12
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+
+# Rendered PDF reports, stored by content hash (see isp_inventory/pdf.py)
+REPORT_PDF_DIR = os.path.join(MEDIA_ROOT, 'reports')
+REPORT_PDF_WORKERS = 2
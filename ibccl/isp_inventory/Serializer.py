@@ -1,7 +1,59 @@
 from rest_framework import serializers
-from .models import Material
+from .models import Material, MaterialRequest, Task, UsedMaterial
 
-class MaterialSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """Serialize only the fields named in the `fields` context entry.
+
+    `fields` is a list of field names, or None for every field. Unknown
+    names raise a ValidationError listing the fields on offer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get('fields')
+        if selected is None:
+            return
+        unknown = [name for name in selected if name not in self.fields]
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': [f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.fields)}."]
+            })
+        for name in set(self.fields) - set(selected):
+            self.fields.pop(name)
+
+
+class MaterialSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Material
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class MaterialRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    requester_username = serializers.CharField(source='requester.username', read_only=True)
+    material_name = serializers.CharField(source='material.name', read_only=True)
+    material_category = serializers.CharField(source='material.category', read_only=True)
+
+    class Meta:
+        model = MaterialRequest
+        fields = ['id', 'material', 'material_name', 'material_category', 'requester', 'requester_username',
+                  'quantity', 'user_note', 'status', 'admin_note', 'requested_at']
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    technician_username = serializers.CharField(source='technician.username', read_only=True)
+
+    class Meta:
+        model = Task
+        fields = ['id', 'title', 'customer', 'address', 'technician', 'technician_username', 'status', 'created_at']
+
+
+class UsedMaterialSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    technician_username = serializers.CharField(source='technician.username', read_only=True)
+    material_name = serializers.CharField(source='material.name', read_only=True)
+    material_category = serializers.CharField(source='material.category', read_only=True)
+
+    class Meta:
+        model = UsedMaterial
+        fields = ['id', 'technician', 'technician_username', 'material', 'material_name', 'material_category',
+                  'quantity', 'address', 'issue', 'status', 'admin_note', 'added_at']
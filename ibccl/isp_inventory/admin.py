@@ -1,10 +1,40 @@
 from django.contrib import admin
-from .models import Material, Task, MaterialRequest,UserProfile,Material,Vendor,SystemSetting,NotificationSetting
+from .models import Material, Task, MaterialRequest,UserProfile,Material,Vendor,SystemSetting,NotificationSetting,InventoryStat,TechnicianStock,StockMovement,StockSnapshot
+from .utils import attach_added_by_display
+
+
+class MaterialAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'quantity', 'status', 'added_by_display', 'added_at')
+
+    def get_changelist_instance(self, request):
+        # Resolve every "added by" name on the page with one query
+        cl = super().get_changelist_instance(request)
+        cl.result_list = attach_added_by_display(cl.result_list)
+        return cl
+
+
+class StockMovementAdmin(admin.ModelAdmin):
+    # The journal is append-only
+    list_display = ('created_at', 'material', 'delta', 'quantity_after', 'reason', 'reference', 'user')
+    list_filter = ('reason',)
+    list_select_related = ('material', 'user')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Register your models here.
-admin.site.register(Material)
+admin.site.register(Material, MaterialAdmin)
 admin.site.register(Task)
 admin.site.register(MaterialRequest)
 admin.site.register(UserProfile)
 admin.site.register(Vendor)
 admin.site.register(SystemSetting)
 admin.site.register(NotificationSetting)
+admin.site.register(InventoryStat)
+admin.site.register(TechnicianStock)
+admin.site.register(StockMovement, StockMovementAdmin)
+admin.site.register(StockSnapshot)
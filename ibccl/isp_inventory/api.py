@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+from rest_framework import permissions, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import Material, MaterialRequest, Task, UsedMaterial
+from .Serializer import MaterialSerializer, MaterialRequestSerializer, TaskSerializer, UsedMaterialSerializer
+from . import journal, sync, versions
+
+
+class ApiCursorPagination(CursorPagination):
+    """Cursor pages in each viewset's `ordering`.
+
+    Cursors seek from the last row seen, so page 1000 costs what page 1
+    does and rows inserted meanwhile never shift or repeat a page.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        return view.ordering
+
+
+class ReadOnlyApiViewSet(viewsets.ReadOnlyModelViewSet):
+    """List and retrieve, filtered, cursor-paginated and sparse.
+
+    Query parameters:
+      fields=a,b     serialize only these fields; the query selects only
+                     their columns and joins only the tables they read
+      status=        one of the model's STATUS_CHOICES
+      category=      one of Material.CATEGORY_CHOICES (where `category_lookup` is set)
+      from_date=, to_date=
+                     YYYY-MM-DD bounds, inclusive, on `date_field`
+      cursor=, page_size=
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ApiCursorPagination
+    ordering = ('pk',)
+    date_field = None
+    category_lookup = None
+    # Lookup limiting technicians to their own rows; None shows them everything
+    owner_lookup = None
+    # Change counters of the tables responses are built from (see versions.py)
+    tables = ()
+
+    def selected_fields(self):
+        value = self.request.query_params.get('fields')
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fields': self.selected_fields()}
+
+    def columns(self):
+        """(select_related paths, only() columns) the selected fields read."""
+        related, columns = set(), {field.lstrip('-') for field in self.ordering}
+        for field in self.get_serializer().fields.values():
+            parts = field.source.split('.')
+            if len(parts) > 1:
+                related.add(parts[0])
+            columns.add('__'.join(parts))
+        return sorted(related), sorted(columns)
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        model = queryset.model
+        status = params.get('status')
+        if status:
+            if status not in dict(model.STATUS_CHOICES):
+                raise ValidationError({'status': [f"Expected one of: {', '.join(dict(model.STATUS_CHOICES))}."]})
+            queryset = queryset.filter(status=status)
+        category = params.get('category')
+        if category and self.category_lookup:
+            if category not in dict(Material.CATEGORY_CHOICES):
+                raise ValidationError({'category': [f"Expected one of: {', '.join(dict(Material.CATEGORY_CHOICES))}."]})
+            queryset = queryset.filter(**{self.category_lookup: category})
+        for param, lookup, day_offset in (('from_date', 'gte', -1), ('to_date', 'lt', 0)):
+            if params.get(param) and self.date_field:
+                try:
+                    day = datetime.strptime(params[param], '%Y-%m-%d').date()
+                except ValueError:
+                    raise ValidationError({param: ['Invalid date, expected YYYY-MM-DD.']})
+                # Half-open local-day bounds keep the timestamp index usable
+                queryset = queryset.filter(**{
+                    f'{self.date_field}__{lookup}': journal.day_end(day + timedelta(days=day_offset)),
+                })
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return versions.conditional(*self.tables)(super().list)(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return versions.conditional(*self.tables)(super().retrieve)(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = self.queryset.all()
+        if self.owner_lookup and self.request.role not in ['Admin', 'Storekeeper']:
+            queryset = queryset.filter(**{self.owner_lookup: self.request.user})
+        related, columns = self.columns()
+        if related:
+            # select_related() with no arguments would follow every foreign key
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+
+class MaterialViewSet(ReadOnlyApiViewSet):
+    """The material catalog, readable by every role (technicians request from it)."""
+    queryset = Material.objects.all()
+    serializer_class = MaterialSerializer
+    tables = (versions.MATERIAL,)
+    date_field = 'added_at'
+    category_lookup = 'category'
+
+
+class MaterialRequestViewSet(ReadOnlyApiViewSet):
+    queryset = MaterialRequest.objects.all()
+    serializer_class = MaterialRequestSerializer
+    tables = (versions.REQUEST, versions.MATERIAL, versions.USER)
+    ordering = ('-requested_at', '-pk')
+    date_field = 'requested_at'
+    category_lookup = 'material__category'
+    owner_lookup = 'requester'
+
+
+class TaskViewSet(ReadOnlyApiViewSet):
+    queryset = Task.objects.all()
+    serializer_class = TaskSerializer
+    tables = (versions.TASK, versions.USER)
+    ordering = ('-created_at', '-pk')
+    date_field = 'created_at'
+    owner_lookup = 'technician'
+
+
+class UsedMaterialViewSet(ReadOnlyApiViewSet):
+    queryset = UsedMaterial.objects.all()
+    serializer_class = UsedMaterialSerializer
+    tables = (versions.USED_MATERIAL, versions.MATERIAL, versions.USER)
+    ordering = ('-added_at', '-pk')
+    date_field = 'added_at'
+    category_lookup = 'material__category'
+    owner_lookup = 'technician'
+
+
+class SyncView(APIView):
+    """Delta sync: GET ?since=<token> returns what changed after it (see sync.changes)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(sync.changes(request.user, request.role, request.query_params.get('since')))
+        except ValueError:
+            raise ValidationError({'since': ['Expected a token returned by an earlier sync.']})
@@ -0,0 +1,109 @@
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .models import Material, MaterialRequest
+from . import stats, ledger, stock, search, rollups, sync, versions
+
+
+def bulk_process_requests(request_ids, action, user=None, note='', allow_partial=False):
+    """Approve or reject many material requests in one transaction.
+
+    Requests and their Material rows are locked once, each in primary-key
+    order so concurrent batches cannot deadlock. Stock is deducted (or
+    returned) per material in aggregate: one stock UPDATE for all
+    materials, one bulk update for the requests. Requests are processed in id order; when a
+    material runs short, later requests are partially filled if
+    `allow_partial` is set, otherwise left pending.
+
+    Returns one result dict per requested id:
+    `{'id', 'result', 'quantity', 'reason'}` where result is one of
+    'approved', 'partial', 'rejected', 'skipped' or 'failed'.
+    """
+    if action not in ('approve', 'reject'):
+        raise ValueError(f"Unknown action: {action}")
+    ids = sorted({int(pk) for pk in request_ids})
+    results = {}
+
+    with transaction.atomic():
+        reqs = list(MaterialRequest.objects.select_for_update().filter(pk__in=ids).order_by('pk'))
+        material_ids = sorted({req.material_id for req in reqs})
+        materials = {
+            mat.pk: mat
+            for mat in Material.objects.select_for_update().filter(pk__in=material_ids).order_by('pk')
+        }
+
+        stock_delta = defaultdict(int)     # material_id -> change to Material.quantity
+        ledger_delta = defaultdict(int)    # (requester_id, material_id) -> change to TechnicianStock
+        status_moves = Counter()           # (old status, new status) -> count
+        rollup_rows = []                   # report rollup deltas, see rollups.add_requests
+        changed = []
+
+        for req in reqs:
+            mat = materials[req.material_id]
+            old_status, old_quantity = req.status, req.quantity
+            if action == 'approve':
+                if old_status == 'Approved':
+                    results[req.pk] = {'result': 'skipped', 'quantity': req.quantity, 'reason': 'Already approved.'}
+                    continue
+                available = mat.quantity + stock_delta[mat.pk]
+                qty = req.quantity
+                result, reason = 'approved', ''
+                if qty > available:
+                    if allow_partial and available > 0:
+                        result = 'partial'
+                        reason = f"Partially filled: {available} of {qty} available."
+                        qty = available
+                    else:
+                        results[req.pk] = {
+                            'result': 'failed', 'quantity': 0,
+                            'reason': f"Insufficient stock for {mat.name}. Available: {available}, Requested: {qty}",
+                        }
+                        continue
+                stock_delta[mat.pk] -= qty
+                ledger_delta[(req.requester_id, mat.pk)] += qty
+                req.quantity = qty
+                req.status = 'Approved'
+            else:
+                if old_status == 'Rejected':
+                    results[req.pk] = {'result': 'skipped', 'quantity': req.quantity, 'reason': 'Already rejected.'}
+                    continue
+                result, reason = 'rejected', ''
+                if old_status == 'Approved':
+                    # Return stock issued for this request
+                    stock_delta[mat.pk] += req.quantity
+                    ledger_delta[(req.requester_id, mat.pk)] -= req.quantity
+                    reason = f"{req.quantity} units returned to {mat.name}."
+                req.status = 'Rejected'
+            req.admin_note = note
+            status_moves[(old_status, req.status)] += 1
+            day = rollups.day_of(req.requested_at)
+            rollup_rows += [
+                (day, req.material_id, old_status, -1, -old_quantity),
+                (day, req.material_id, req.status, 1, req.quantity),
+            ]
+            changed.append(req)
+            results[req.pk] = {'result': result, 'quantity': req.quantity, 'reason': reason}
+
+        # One statement moves every material's quantity and status together
+        stock.adjust_many(stock_delta.items(), action, user, f"bulk {action}: {len(changed)} requests")
+
+        # bulk_update skips the per-row signals, so apply their effects here
+        now = timezone.now()
+        for req in changed:
+            req.updated_at = now
+        MaterialRequest.objects.bulk_update(changed, ['status', 'quantity', 'admin_note', 'updated_at'])
+        counters = Counter()
+        for (old_status, new_status), count in status_moves.items():
+            counters[stats.request_key(old_status)] -= count
+            counters[stats.request_key(new_status)] += count
+        for key, delta in counters.items():
+            stats.bump(key, delta)
+        ledger.adjust_many(ledger_delta)
+        rollups.add_requests(rollup_rows)
+        search.index('request', [req.pk for req in changed])
+        sync.record_many([('request', req.pk, req.requester_id, False) for req in changed])
+        versions.bump(versions.REQUEST)
+
+    for pk in ids:
+        results.setdefault(pk, {'result': 'failed', 'quantity': 0, 'reason': 'Request not found.'})
+    return [dict(id=pk, **results[pk]) for pk in ids]
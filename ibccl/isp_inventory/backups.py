@@ -0,0 +1,289 @@
+import json
+import multiprocessing
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Pool processes unpickle this module before Django is set up, so models
+# and the app's own modules are only imported inside functions here.
+
+FORMAT = 'isp-inventory-backup'
+VERSION = 1
+COMPRESSIONS = ('gzip', 'brotli', 'none')
+EXCLUDED = {'contenttypes.contenttype', 'auth.permission', 'sessions.session'}
+# Rebuilt from history after a restore rather than backed up
+DERIVED = {
+    'isp_inventory.inventorystat', 'isp_inventory.technicianstock', 'isp_inventory.searchdocument',
+    'isp_inventory.dailyrequestrollup', 'isp_inventory.dailyusagerollup',
+    # Restoring old counters could repeat versions clients already cached
+    'isp_inventory.tableversion',
+    # Emptied by a restore instead, so every sync client reloads
+    'isp_inventory.changelog',
+}
+# Tables rows are only ever added to: incremental backups take the new rows.
+# Models with an updated_at column take the rows changed since; the rest
+# are always backed up in full.
+APPEND_ONLY = {
+    'isp_inventory.stockmovement': 'created_at',
+    'admin.logentry': 'action_time',
+}
+
+
+class _Encoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder, but keeping microseconds so restores are exact."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def backup_models():
+    """Models a backup holds, parents before the models that reference them."""
+    models = [
+        model for model in apps.get_models()
+        if model._meta.managed and not model._meta.proxy
+        and model._meta.label_lower not in EXCLUDED | DERIVED
+    ]
+    # serializers.sort_dependencies only follows natural keys, so order by
+    # every foreign key and many-to-many target instead
+    remaining = {
+        model: {
+            field.related_model for field in model._meta.concrete_fields + model._meta.many_to_many
+            if field.is_relation and field.related_model in models and field.related_model is not model
+        }
+        for model in models
+    }
+    ordered = []
+    while remaining:
+        ready = [model for model in models if model in remaining and not remaining[model] - set(ordered)]
+        if not ready:
+            raise ValueError(f'Circular references between {sorted(m._meta.label for m in remaining)}')
+        ordered += ready
+        for model in ready:
+            del remaining[model]
+    return ordered
+
+
+def change_field(model):
+    """Field an incremental backup of `model` filters on, or None for a full copy."""
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        return 'updated_at'
+    return APPEND_ONLY.get(model._meta.label_lower)
+
+
+def records(since=None, chunk_size=2000):
+    """Yield the backup as JSON-ready dicts: a header, then one per model chunk.
+
+    Chunks hold up to `chunk_size` objects in dumpdata's format. With
+    `since`, models with a change_field() only contribute rows changed
+    from then on; deletions are not captured.
+    """
+    started = timezone.now()
+    models = backup_models()
+    yield {
+        'format': FORMAT, 'version': VERSION, 'created_at': started.isoformat(),
+        'since': since.isoformat() if since else None, 'models': [model._meta.label_lower for model in models],
+    }
+    for model in models:
+        qs = model._default_manager.order_by('pk')
+        field = change_field(model)
+        if since and field:
+            qs = qs.filter(**{f'{field}__gte': since})
+        m2m = [field.name for field in model._meta.many_to_many]
+        if m2m:
+            qs = qs.prefetch_related(*m2m)
+        batch = []
+        for obj in qs.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) == chunk_size:
+                yield {'model': model._meta.label_lower, 'objects': serializers.serialize('python', batch)}
+                batch = []
+        if batch:
+            yield {'model': model._meta.label_lower, 'objects': serializers.serialize('python', batch)}
+
+
+def _compressor(compression):
+    """(process, finish) callables for `compression`."""
+    if compression == 'gzip':
+        stream = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return stream.compress, stream.flush
+    if compression == 'brotli':
+        import brotli
+        stream = brotli.Compressor(quality=5)
+        return stream.process, stream.finish
+    if compression == 'none':
+        return (lambda data: data), (lambda: b'')
+    raise ValueError(f'Unknown compression: {compression}')
+
+
+def stream(since=None, compression='gzip', chunk_size=2000):
+    """Yield the compressed backup, one JSON line per record, as it is read.
+
+    Runs in one transaction so every model is read from the same
+    snapshot (REPEATABLE READ on PostgreSQL), keeping references
+    between chunks consistent while the site stays writable.
+    """
+    process, finish = _compressor(compression)
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        for record in records(since, chunk_size):
+            data = process((json.dumps(record, cls=_Encoder) + '\n').encode())
+            if data:
+                yield data
+    yield finish()
+
+
+def _decompressor(head):
+    if head[:2] == b'\x1f\x8b':
+        return zlib.decompressobj(31).decompress
+    if head[:1] == b'{':
+        return lambda data: data
+    import brotli
+    return brotli.Decompressor().process
+
+
+def read(fileobj, block_size=1 << 20):
+    """Yield the records of a backup from a binary file, in any compression."""
+    block = fileobj.read(block_size)
+    decompress = _decompressor(block)
+    pending = b''
+    while block:
+        pending += decompress(block)
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if line:
+                yield json.loads(line)
+        block = fileobj.read(block_size)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+def read_header(path):
+    with open(path, 'rb') as fileobj:
+        header = next(read(fileobj), None)
+    if not header or header.get('format') != FORMAT:
+        raise ValueError(f'{path} is not an inventory backup')
+    if header['version'] > VERSION:
+        raise ValueError(f'{path} is backup format {header["version"]}; this code reads up to {VERSION}')
+    return header
+
+
+def load_chunk(label, objects):
+    """Upsert one chunk of serialized objects by primary key; returns the row count.
+
+    Uses bulk_create, so no signals run: restore() rebuilds the derived
+    tables once at the end instead.
+    """
+    from .seeding import explicit_timestamps
+    model = apps.get_model(label)
+    items = list(serializers.deserialize('python', objects, ignorenonexistent=True))
+    instances = [item.object for item in items]
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    timestamps = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+                  or getattr(field, 'auto_now_add', False)]
+    with transaction.atomic(), explicit_timestamps(*timestamps):
+        model._default_manager.bulk_create(
+            instances, update_conflicts=bool(fields), ignore_conflicts=not fields,
+            unique_fields=[model._meta.pk.name] if fields else None, update_fields=fields or None,
+        )
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            source, target = field.m2m_field_name() + '_id', field.m2m_reverse_field_name() + '_id'
+            owners = [item.object.pk for item in items if field.name in item.m2m_data]
+            through._default_manager.filter(**{f'{source}__in': owners}).delete()
+            through._default_manager.bulk_create([
+                through(**{source: item.object.pk, target: pk})
+                for item in items for pk in item.m2m_data.get(field.name, [])
+            ])
+    return len(instances)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def restore(fileobj, workers=1, rebuild=True, progress=None):
+    """Load a backup from `fileobj`; returns {model label: rows loaded}.
+
+    Models arrive parents first, and each model's chunks are loaded before
+    the next model starts. With `workers` > 1 the chunks of a model are
+    upserted in parallel by a pool of processes, each with its own
+    database connection. Restoring a full backup and then incremental
+    ones in order reproduces the source, apart from rows deleted there.
+    """
+    from . import stats, ledger, search, rollups, sync, versions
+    loaded = {}
+    records_iter = read(fileobj)
+    header = next(records_iter, None)
+    if not header or header.get('format') != FORMAT:
+        raise ValueError('Not an inventory backup')
+
+    pool = None
+    if workers > 1:
+        # The parent's connections must not leak into the children
+        connection.close()
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker)
+    def collect(futures):
+        for future in futures:
+            label = running.pop(future)
+            loaded[label] = loaded.get(label, 0) + future.result()
+
+    running = {}  # future -> model label
+    try:
+        current = None
+        for record in records_iter:
+            label = record['model']
+            if pool is None:
+                loaded[label] = loaded.get(label, 0) + load_chunk(label, record['objects'])
+            else:
+                if label != current:
+                    # The next model's rows may reference any of this one's
+                    collect(wait(list(running)).done)
+                elif len(running) >= workers * 2:
+                    collect(wait(list(running), return_when=FIRST_COMPLETED).done)
+                running[pool.submit(load_chunk, label, record['objects'])] = label
+            current = label
+            if progress:
+                progress(f'{label}: {loaded.get(label, 0)} rows')
+        collect(wait(list(running)).done)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # Explicit primary keys leave PostgreSQL sequences behind
+    models = [apps.get_model(label) for label in loaded]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    if rebuild:
+        stats.rebuild()
+        ledger.rebuild()
+        search.rebuild()
+        rollups.rebuild()
+    versions.bump(*versions.TABLES)
+    sync.clear()
+    return loaded
+
+
+def parse_since(value):
+    """A --since value: an ISO timestamp, or a backup file whose start time to use."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        moment = datetime.fromisoformat(read_header(value)['created_at'])
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
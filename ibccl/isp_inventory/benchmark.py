@@ -0,0 +1,104 @@
+import json
+import math
+import time
+import tracemalloc
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.urls import reverse
+from .instrumentation import QueryRecorder
+
+# (url name, role of the user loading it)
+BENCHMARK_VIEWS = [
+    ('dashboard', 'Admin'),
+    ('dashboard', 'Technician'),
+    ('materials', 'Storekeeper'),
+    ('requests', 'Admin'),
+    ('reports', 'Admin'),
+    ('settings', 'Admin'),
+    ('used_materials', 'Technician'),
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (pct in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def benchmark_users():
+    """One user per role, {role: User}, preferring the earliest account."""
+    return {
+        role: User.objects.filter(userprofile__role=role).order_by('pk').first()
+        for role in {role for _, role in BENCHMARK_VIEWS}
+    }
+
+
+def run(client, label, repeat=10, views=BENCHMARK_VIEWS):
+    """Load each view `repeat` times through `client` and summarise.
+
+    Latency and query counts come from untraced runs; peak memory from
+    one extra run under tracemalloc, which would otherwise slow every
+    request. Returns {"<label>:<view>:<role>": {...}}.
+    """
+    users = benchmark_users()
+    results = {}
+    for name, role in views:
+        user = users.get(role)
+        if user is None:
+            continue
+        client.force_login(user)
+        url = reverse(name)
+        client.get(url)  # warm caches
+        timings = []
+        for _ in range(repeat):
+            with QueryRecorder() as recorder:
+                started = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        try:
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        results[f'{label}:{name}:{role}'] = {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': recorder.count,
+            'peak_kb': round(peak / 1024, 1),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Return a description of each result worse than its baseline entry.
+
+    Latency and peak memory may exceed the baseline by `tolerance`
+    (a fraction); any increase in query count is a regression.
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ('p95_ms', 'peak_kb'):
+            if current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{key} {metric} {base[metric]} -> {current[metric]}')
+        if current['queries'] > base['queries']:
+            regressions.append(f"{key} queries {base['queries']} -> {current['queries']}")
+    return regressions
+
+
+def load_baseline(path):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_baseline(path, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,266 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+
+# Tags name what an entry was built from, as colon-separated paths:
+#   'material:12'        one row
+#   'requests:user:5'    one technician's requests
+#   'material:*'         any material (on an entry: built from many of them)
+# invalidate('material:12') expires entries tagged 'material:12' or
+# 'material:*'; invalidate('material:*') expires every 'material:...' entry.
+#
+# Each tag is checked through version counters kept in the shared tier:
+#   exact:<tag>      bumped when that tag is invalidated
+#   all:<prefix>     bumped by invalidate('<prefix>:*')
+#   any:<prefix>     bumped by any invalidation under <prefix>
+# An entry stores the versions of the counters its tags depend on, and is
+# stale once any of them has moved. Untagged entries never read counters.
+#
+# Role entries are tagged 'user:<id>' and expired, on commit, from the
+# profile and group signal handlers (utils.invalidate_user_roles). Row
+# fragments need no tags: they carry their row's updated_at in the key.
+
+_request_counts = ContextVar('isp_inventory_cache_counts', default=None)
+# Local tiers by LOCATION: Django makes a cache instance per thread, the
+# process shares one LRU
+_locals = {}
+_locals_lock = threading.Lock()
+
+
+def _prefixes(path):
+    parts = path.split(':')
+    return [':'.join(parts[:i]) for i in range(1, len(parts))]
+
+
+def dependencies(tag):
+    """Version counters an entry tagged `tag` must still match."""
+    if tag.endswith(':*'):
+        prefix = tag[:-2]
+        return [f'any:{prefix}'] + [f'all:{p}' for p in _prefixes(prefix)]
+    return [f'exact:{tag}'] + [f'all:{p}' for p in _prefixes(tag)]
+
+
+def bumps(tag):
+    """Version counters invalidate(`tag`) moves."""
+    if tag.endswith(':*'):
+        prefix = tag[:-2]
+        return [f'all:{prefix}', f'any:{prefix}'] + [f'any:{p}' for p in _prefixes(prefix)]
+    return [f'exact:{tag}'] + [f'any:{p}' for p in _prefixes(tag)]
+
+
+class TieredCache(BaseCache):
+    """A bounded in-process LRU in front of a shared cache (Redis).
+
+    Reads try the local tier, then the shared one, keeping what they
+    find locally for LOCAL_TIMEOUT seconds. Writes, deletes and tag
+    invalidations go to both tiers. Other processes' local copies are
+    not reached, so they may serve an entry up to LOCAL_TIMEOUT after it
+    changed; keep it short.
+
+    OPTIONS:
+      SHARED              alias of the shared cache in CACHES (default 'shared')
+      LOCAL_MAX_ENTRIES   local entries kept, least recently used dropped first (1000)
+      LOCAL_TIMEOUT       seconds a local copy is trusted (5)
+    """
+
+    def __init__(self, server, params):
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_max = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        super().__init__({**params, 'OPTIONS': {}})
+        with _locals_lock:
+            # key -> (value, {counter: version}, expires), plus its lock and event counts
+            self._local, self._lock, self._counts = _locals.setdefault(
+                server, (OrderedDict(), threading.Lock(), Counter()),
+            )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _count(self, event):
+        with self._lock:
+            self._counts[event] += 1
+        counts = _request_counts.get()
+        if counts is not None:
+            counts[event] += 1
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            if item[2] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return item
+
+    def _local_set(self, key, value, deps, timeout):
+        expires = time.monotonic() + (self._local_timeout if timeout is None else min(timeout, self._local_timeout))
+        with self._lock:
+            self._local[key] = (value, deps, expires)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _versions(self, counters):
+        found = self.shared.get_many([f'tagver:{counter}' for counter in counters])
+        return {counter: found.get(f'tagver:{counter}', 0) for counter in counters}
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        """Local hits, then one shared get_many and one version check for the rest."""
+        found, missing = {}, []
+        for key in keys:
+            item = self._local_get(self.make_and_validate_key(key, version=version))
+            if item is None:
+                missing.append(key)
+            else:
+                self._count('local_hit')
+                found[key] = item[0]
+        if not missing:
+            return found
+        envelopes = self.shared.get_many(missing, version=version)
+        counters = sorted({counter for _, deps in envelopes.values() if deps for counter in deps})
+        current = self._versions(counters) if counters else {}
+        for key in missing:
+            if key not in envelopes:
+                self._count('miss')
+                continue
+            value, deps = envelopes[key]
+            if deps and any(current[counter] != seen for counter, seen in deps.items()):
+                self._count('stale')
+                continue
+            self._count('shared_hit')
+            self._local_set(self.make_and_validate_key(key, version=version), value, deps, None)
+            found[key] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, tags=()):
+        """Store `value`; with `tags` it expires when any of them is invalidated."""
+        self.set_many({key: value}, timeout, version, tags={key: tags})
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, tags=None):
+        """Store every item of `data` in one shared write.
+
+        `tags` maps keys to the tags of their entries.
+        """
+        tags = tags or {}
+        counters = {key: sorted({c for tag in tags.get(key, ()) for c in dependencies(tag)}) for key in data}
+        needed = sorted({counter for keyed in counters.values() for counter in keyed})
+        current = self._versions(needed) if needed else {}
+        envelopes = {
+            key: (value, {counter: current[counter] for counter in counters[key]} or None)
+            for key, value in data.items()
+        }
+        self.shared.set_many(envelopes, timeout, version=version)
+        local_timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        for key, (value, deps) in envelopes.items():
+            self._local_set(self.make_and_validate_key(key, version=version), value, deps, local_timeout)
+            self._count('set')
+        return []
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, tags=()):
+        return await sync_to_async(self.set)(key, value, timeout, version, tags)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.add(key, (value, None), timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def invalidate(self, *tags):
+        """Expire every entry depending on any of `tags`, in both tiers."""
+        counters = sorted({counter for tag in tags for counter in bumps(tag)})
+        if not counters:
+            return
+        for counter in counters:
+            key = f'tagver:{counter}'
+            # Counters start from the clock, so one evicted and recreated
+            # never comes back to a value an old entry recorded
+            self.shared.add(key, time.time_ns() // 1000, None)
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.set(key, time.time_ns() // 1000, None)
+        moved = set(counters)
+        with self._lock:
+            for key in [key for key, (_, deps, _) in self._local.items() if deps and moved & deps.keys()]:
+                del self._local[key]
+        self._count('invalidate')
+
+    def stats(self):
+        """Hit and miss counts for this process, with the overall hit ratio."""
+        with self._lock:
+            counts = dict(self._counts)
+            local_entries = len(self._local)
+        reads = sum(counts.get(event, 0) for event in ('local_hit', 'shared_hit', 'miss', 'stale'))
+        hits = counts.get('local_hit', 0) + counts.get('shared_hit', 0)
+        return {**counts, 'local_entries': local_entries, 'hit_ratio': round(hits / reads, 4) if reads else None}
+
+
+def invalidate(*tags):
+    """Invalidate `tags` on every tiered cache in CACHES."""
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if isinstance(cache, TieredCache):
+            cache.invalidate(*tags)
+
+
+def invalidate_on_commit(*tags):
+    """invalidate(*tags) once the current transaction commits.
+
+    Before the commit a reader could rebuild an entry from the old rows
+    and store it under the new counter versions.
+    """
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+class CacheRecorder:
+    """Count cache events (local_hit, shared_hit, miss, ...) while active.
+
+        with CacheRecorder() as recorder:
+            ...
+        recorder.counts
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _request_counts.set(self.counts)
+        return self
+
+    def __exit__(self, *exc_info):
+        _request_counts.reset(self._token)
@@ -0,0 +1,99 @@
+import csv
+import tempfile
+from datetime import timedelta
+from django.utils import timezone
+from openpyxl import Workbook
+from .models import MaterialRequest, StockMovement, UsedMaterial
+from . import journal
+
+# name -> (sheet title, model, timestamp field, select_related, [(header, row -> value)])
+EXPORTS = {
+    'requests': ('Material Requests', MaterialRequest, 'requested_at', ('requester', 'material'), [
+        ('ID', lambda r: r.pk),
+        ('Requested At', lambda r: r.requested_at),
+        ('Technician', lambda r: r.requester.username),
+        ('Material', lambda r: r.material.name),
+        ('Category', lambda r: r.material.category),
+        ('Quantity', lambda r: r.quantity),
+        ('Status', lambda r: r.status),
+        ('Note', lambda r: r.user_note),
+        ('Admin Note', lambda r: r.admin_note),
+    ]),
+    'used_materials': ('Used Materials', UsedMaterial, 'added_at', ('technician', 'material'), [
+        ('ID', lambda r: r.pk),
+        ('Added At', lambda r: r.added_at),
+        ('Technician', lambda r: r.technician.username),
+        ('Material', lambda r: r.material.name),
+        ('Category', lambda r: r.material.category),
+        ('Quantity', lambda r: r.quantity),
+        ('Status', lambda r: r.status),
+        ('Address', lambda r: r.address),
+        ('Issue', lambda r: r.issue),
+        ('Admin Note', lambda r: r.admin_note),
+    ]),
+    'movements': ('Stock Movements', StockMovement, 'created_at', ('material', 'user'), [
+        ('ID', lambda r: r.pk),
+        ('Created At', lambda r: r.created_at),
+        ('Material', lambda r: r.material_label),
+        ('Change', lambda r: r.delta),
+        ('Quantity After', lambda r: r.quantity_after),
+        ('Reason', lambda r: r.get_reason_display()),
+        ('Reference', lambda r: r.reference),
+        ('User', lambda r: r.user.username if r.user else ''),
+    ]),
+}
+
+
+def _local(value):
+    # Excel has no time zones: write wall-clock time in the site zone
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+    return value
+
+
+def rows(name, start, end, chunk_size=2000):
+    """Yield the header, then one list per row of export `name` for days start..end.
+
+    Rows are read with a chunked iterator, so memory stays flat however
+    long the range is.
+    """
+    _, model, field, related, columns = EXPORTS[name]
+    yield [header for header, _ in columns]
+    qs = model.objects.filter(**{
+        f'{field}__gte': journal.day_end(start - timedelta(days=1)),
+        f'{field}__lt': journal.day_end(end),
+    }).select_related(*related).order_by(field, 'pk')
+    for obj in qs.iterator(chunk_size=chunk_size):
+        yield [_local(get(obj)) for _, get in columns]
+
+
+class _Echo:
+    """File-like object whose write() hands back the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    """Encode `rows` as CSV lines, one string per row, as they are produced."""
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM so Excel detects UTF-8
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def xlsx_file(sheets):
+    """Write {sheet title: rows} to an XLSX temp file and return it rewound.
+
+    Uses openpyxl's write-only mode, which spools each row to disk
+    instead of building the sheet in memory.
+    """
+    workbook = Workbook(write_only=True)
+    for title, sheet_rows in sheets.items():
+        sheet = workbook.create_sheet(title=title[:31])
+        for row in sheet_rows:
+            sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
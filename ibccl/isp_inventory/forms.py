@@ -1,8 +1,10 @@
 from django import forms
+from django.db.models import Q
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Material, Task, MaterialRequest, Vendor, SystemSetting, NotificationSetting, UsedMaterial
-from .utils import ensure_userprofile
+from .utils import get_user_role
+from . import ledger
 
 class RegisterForm(UserCreationForm):
     ROLE_CHOICES = [('Technician', 'Technician'), ('Storekeeper', 'Storekeeper'), ('Admin', 'Admin')]
@@ -28,8 +30,7 @@ class MaterialForm(forms.ModelForm):
         
         if self.user:
             try:
-                profile = ensure_userprofile(self.user)
-                role = profile.role if profile else None
+                role = get_user_role(self.user)['role']
             except Exception:
                 role = None
             
@@ -92,15 +93,56 @@ class UsedMaterialForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        self.technician = None
         if user:
             try:
-                profile = ensure_userprofile(user)
-                if profile and profile.role == 'Technician':
-                    # Filter to only show materials that have been approved for this technician
-                    approved_material_ids = MaterialRequest.objects.filter(
-                        requester=user, 
-                        status='Approved'
-                    ).values_list('material', flat=True).distinct()
-                    self.fields['material'].queryset = Material.objects.filter(id__in=approved_material_ids)
+                if get_user_role(user)['role'] == 'Technician':
+                    # Only show materials this technician currently holds stock of
+                    self.technician = user
+                    held = Q(technician_stock__technician=user, technician_stock__quantity__gt=0)
+                    if self.instance.pk:
+                        held |= Q(pk=self.instance.material_id)
+                    self.fields['material'].queryset = Material.objects.filter(held).distinct()
             except Exception:
                 pass
+
+    def clean(self):
+        cleaned_data = super().clean()
+        material = cleaned_data.get('material')
+        quantity = cleaned_data.get('quantity')
+        if self.technician and material and quantity is not None:
+            if quantity <= 0:
+                self.add_error('quantity', "Quantity must be a positive integer.")
+                return cleaned_data
+            available = ledger.balance(self.technician, material)
+            # Editing a row: its current quantity is already deducted
+            if self.instance.pk and self.instance.material_id == material.pk:
+                available += self.instance.quantity
+            if quantity > available:
+                self.add_error('quantity', f"Only {available} of {material.name} in your stock.")
+        return cleaned_data
+
+
+# Bulk import (see imports.py): one form per file row, validated without
+# database lookups; foreign keys and existing rows are resolved per batch.
+
+class MaterialImportForm(forms.Form):
+    name = forms.CharField(max_length=100)
+    category = forms.ChoiceField(choices=Material.CATEGORY_CHOICES, required=False)
+    quantity = forms.IntegerField(min_value=0, required=False)
+    min_stock_level = forms.IntegerField(min_value=0, required=False)
+    notes = forms.CharField(required=False)
+
+class TaskImportForm(forms.Form):
+    title = forms.CharField(max_length=200)
+    customer = forms.CharField(max_length=100)
+    address = forms.CharField()
+    technician = forms.CharField(max_length=150, help_text='Username')
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+
+class VendorImportForm(forms.Form):
+    name = forms.CharField(max_length=100)
+    contact_person = forms.CharField(max_length=100, required=False)
+    email = forms.EmailField(required=False)
+    phone = forms.CharField(max_length=20, required=False)
+    address = forms.CharField(required=False)
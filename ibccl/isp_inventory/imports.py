@@ -0,0 +1,239 @@
+import csv
+import io
+import zipfile
+from collections import Counter
+from itertools import islice
+from django.contrib.auth.models import User
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from .forms import MaterialImportForm, TaskImportForm, VendorImportForm
+from .models import Material, Task, Vendor
+from . import journal, search, stats, sync, versions
+
+# Changed rows listed in a report; the counts always cover the whole file
+DIFF_LIMIT = 500
+MATERIAL_DEFAULTS = {'category': '', 'quantity': 0, 'min_stock_level': 10, 'notes': ''}
+VENDOR_FIELDS = ['contact_person', 'email', 'phone', 'address']
+
+
+def _column(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+class ImportFileError(Exception):
+    """The upload is not a readable CSV or XLSX file."""
+
+
+def read_rows(fileobj, filename):
+    """Yield (line number, {column: value}) for each non-blank row of a CSV or XLSX upload.
+
+    Columns are matched case-insensitively, with spaces read as
+    underscores ("Min Stock Level" is min_stock_level).
+    """
+    try:
+        if filename.lower().endswith('.xlsx'):
+            rows = load_workbook(fileobj, read_only=True, data_only=True).worksheets[0].iter_rows(values_only=True)
+        else:
+            rows = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+        columns = [_column(value) for value in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            if all(value in (None, '') for value in values):
+                continue
+            yield number, {column: '' if value is None else value for column, value in zip(columns, values) if column}
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, InvalidFileException, IndexError) as exc:
+        raise ImportFileError(f'{filename}: {exc}') from exc
+
+
+def _status(quantity, min_stock_level, current='Normal'):
+    # Same rules as Material.save()
+    if quantity <= 0:
+        return 'Out of Stock'
+    if quantity < (min_stock_level or 0):
+        return 'Low Stock'
+    return current if current in ('Reserved', 'Deprecated') else 'Normal'
+
+
+def _record(report, number, action, key, changes=None):
+    report[{'create': 'created', 'update': 'updated', 'unchanged': 'unchanged'}[action]] += 1
+    if action != 'unchanged' and len(report['diff']) < DIFF_LIMIT:
+        report['diff'].append({'row': number, 'action': action, 'key': key, 'changes': changes or {}})
+
+
+def _error(report, number, errors):
+    report['errors'].append({'row': number, 'errors': errors})
+
+
+def _import_materials(rows, columns, user, dry_run, report, seen, reference):
+    """Upsert materials on name, journaling each quantity change."""
+    matches = Material.objects.filter(name__in=[data['name'] for _, data in rows]).order_by('pk')
+    if not dry_run:
+        # Lock the rows so the journaled deltas match what is overwritten
+        matches = matches.select_for_update()
+    existing = {material.name: material for material in matches}
+    fields = [field for field in MATERIAL_DEFAULTS if field in columns]
+    creates, updates = [], []   # (material, old quantity, old status)
+    for number, data in rows:
+        name = data['name']
+        if name in seen:
+            _error(report, number, {'name': [f'Duplicate of row {seen[name]}.']})
+            continue
+        seen[name] = number
+        current = existing.get(name)
+        given = {field: data[field] for field in fields if data[field] not in (None, '')}
+        if current is None:
+            if 'category' not in given:
+                _error(report, number, {'category': ['Required for a new material.']})
+                continue
+            values = {**MATERIAL_DEFAULTS, **given}
+            values['status'] = _status(values['quantity'], values['min_stock_level'])
+            material = Material(name=name, added_by=user.username if user else '', **values)
+            creates.append((material, 0, None))
+            _record(report, number, 'create', name, {field: [None, value] for field, value in values.items()})
+            continue
+        values = {field: getattr(current, field) for field in MATERIAL_DEFAULTS}
+        values.update(given)
+        values['status'] = _status(values['quantity'], values['min_stock_level'], current.status)
+        changes = {
+            field: [getattr(current, field), value]
+            for field, value in values.items() if getattr(current, field) != value
+        }
+        if not changes:
+            _record(report, number, 'unchanged', name)
+            continue
+        updates.append((Material(name=name, added_by=current.added_by, **values), current.quantity, current.status))
+        _record(report, number, 'update', name, changes)
+
+    if dry_run or not (creates or updates):
+        return
+    Material.objects.bulk_create(
+        [material for material, _, _ in creates + updates],
+        update_conflicts=True, unique_fields=['name'], update_fields=fields + ['status', 'updated_at'],
+    )
+    # bulk_create skips the Material signals: journal, count and index here
+    ids = dict(Material.objects.filter(name__in=[m.name for m, _, _ in creates + updates]).values_list('name', 'pk'))
+    for reason, batch in (('create', creates), ('adjust', updates)):
+        journal.record_many(
+            [(ids[m.name], m.quantity - old_quantity, m.quantity) for m, old_quantity, _ in batch],
+            reason, user, reference,
+        )
+    counters = Counter()
+    for material, _, old_status in creates + updates:
+        if old_status is None:
+            counters[stats.MATERIAL_TOTAL] += 1
+        elif old_status != material.status:
+            counters[stats.material_key(old_status)] -= 1
+        if old_status != material.status:
+            counters[stats.material_key(material.status)] += 1
+    for key, delta in counters.items():
+        stats.bump(key, delta)
+    search.index('material', list(ids.values()))
+    sync.record_many([('material', pk, None, False) for pk in ids.values()])
+    versions.bump(versions.MATERIAL)
+
+
+def _import_tasks(rows, columns, user, dry_run, report, seen, reference):
+    """Create tasks, resolving technician usernames in one query per batch."""
+    technicians = dict(
+        User.objects.filter(username__in={data['technician'] for _, data in rows}).values_list('username', 'pk')
+    )
+    tasks = []
+    for number, data in rows:
+        if data['technician'] not in technicians:
+            _error(report, number, {'technician': [f"No user named {data['technician']!r}."]})
+            continue
+        task = Task(
+            title=data['title'], customer=data['customer'], address=data['address'],
+            technician_id=technicians[data['technician']], status=data['status'] or 'Pending',
+        )
+        tasks.append(task)
+        _record(report, number, 'create', task.title, {
+            'customer': [None, task.customer], 'technician': [None, data['technician']], 'status': [None, task.status],
+        })
+
+    if dry_run or not tasks:
+        return
+    tasks = Task.objects.bulk_create(tasks)
+    counters = Counter(stats.task_key(task.status) for task in tasks)
+    counters[stats.TASK_TOTAL] = len(tasks)
+    for key, delta in counters.items():
+        stats.bump(key, delta)
+    search.index('task', [task.pk for task in tasks])
+    sync.record_many([('task', task.pk, task.technician_id, False) for task in tasks])
+    versions.bump(versions.TASK)
+
+
+def _import_vendors(rows, columns, user, dry_run, report, seen, reference):
+    """Upsert vendors on name (the oldest vendor wins when names repeat)."""
+    existing = {}
+    for vendor in Vendor.objects.filter(name__in=[data['name'] for _, data in rows]).order_by('-pk'):
+        existing[vendor.name] = vendor
+    fields = [field for field in VENDOR_FIELDS if field in columns]
+    creates, updates = [], []
+    for number, data in rows:
+        name = data['name']
+        if name in seen:
+            _error(report, number, {'name': [f'Duplicate of row {seen[name]}.']})
+            continue
+        seen[name] = number
+        current = existing.get(name)
+        if current is None:
+            creates.append(Vendor(name=name, created_by=user, **{field: data[field] for field in fields}))
+            _record(report, number, 'create', name, {field: [None, data[field]] for field in fields})
+            continue
+        changes = {field: [getattr(current, field), data[field]] for field in fields if getattr(current, field) != data[field]}
+        if not changes:
+            _record(report, number, 'unchanged', name)
+            continue
+        for field, (_, value) in changes.items():
+            setattr(current, field, value)
+        updates.append(current)
+        _record(report, number, 'update', name, changes)
+
+    if dry_run:
+        return
+    Vendor.objects.bulk_create(creates)
+    if updates:
+        Vendor.objects.bulk_update(updates, fields)
+
+
+# entity -> (row form, batch importer, roles allowed to import)
+IMPORTERS = {
+    'materials': (MaterialImportForm, _import_materials, ('Admin', 'Storekeeper')),
+    'tasks': (TaskImportForm, _import_tasks, ('Admin', 'Storekeeper')),
+    'vendors': (VendorImportForm, _import_vendors, ('Admin',)),
+}
+
+
+def import_rows(entity, rows, user=None, dry_run=False, batch_size=500, source=''):
+    """Validate and import (line number, {column: value}) rows of `entity`.
+
+    Rows are validated and written `batch_size` at a time, each batch in
+    its own transaction with one lookup of the rows it touches. Invalid
+    rows are skipped and listed in the report; with `dry_run` nothing is
+    written and the report is the diff the import would apply.
+
+    Returns {'created', 'updated', 'unchanged', 'errors', 'diff'}.
+    """
+    form_class, import_batch, _ = IMPORTERS[entity]
+    report = {'entity': entity, 'dry_run': dry_run, 'created': 0, 'updated': 0, 'unchanged': 0,
+              'errors': [], 'diff': []}
+    seen = {}        # upsert key -> first line number, across batches
+    columns = None   # taken from the first row: every row of a file has the same header
+    reference = f'import:{source}'[:100]
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return report
+        if columns is None:
+            columns = set(batch[0][1])
+        valid = []
+        for number, data in batch:
+            form = form_class(data)
+            if form.is_valid():
+                valid.append((number, form.cleaned_data))
+            else:
+                _error(report, number, {field: list(errors) for field, errors in form.errors.items()})
+        with transaction.atomic():
+            import_batch(valid, columns, user, dry_run, report, seen, reference)
@@ -0,0 +1,148 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.db import connections
+
+# Most queries each URL name may run per request once its caches are warm
+# (roles, display names, fragments). Page loads stay at that count however
+# many rows there are; writes vary with the rows they touch. Enforced for
+# every name in isp_inventory/urls.py by QueryBudgetTests and reported
+# (over_budget) in the per-request log line.
+QUERY_BUDGETS = {
+    'login': 2,
+    'register': 2,
+    'logout': 4,
+    'dashboard': 8,
+    'dashboard_modal': 5,
+    'materials': 8,
+    'material_json': 4,
+    'technician_stock': 4,
+    'tasks': 6,
+    'requests': 8,
+    'requests_bulk': 24,    # fixed per batch: one statement per table and counter touched
+    'approve_request': 3,
+    'settings': 6,
+    'reports': 8,
+    'inventory_at': 6,
+    'reports_export': 6,    # CSV rows are read while streaming, after the response returns
+    'reports_pdf': 10,      # cold: version check plus the page's rows; warm: version check only
+    'reports_pdf_file': 4,
+    'import_data': 4,       # page only; an upload's queries scale with its batches
+    'used_materials': 8,
+    'manage_used_material': 3,
+    # API pages select only the requested fields' columns and joins
+    'api_materials-list': 4,
+    'api_materials-detail': 4,
+    'api_requests-list': 4,
+    'api_requests-detail': 4,
+    'api_tasks-list': 4,
+    'api_tasks-detail': 4,
+    'api_used_materials-list': 4,
+    'api_used_materials-detail': 4,
+    'api_sync': 10,         # token check, horizon, entries, then one query per entity changed
+}
+
+# First loads, with nothing cached, where they need more than the above:
+# mostly the role lookup (profile and groups, see utils.get_user_role)
+COLD_QUERY_BUDGETS = {
+    'logout': 6,
+    'dashboard': 9,
+    'material_json': 6,
+    'technician_stock': 5,
+    'tasks': 7,
+    'requests_bulk': 26,
+    'approve_request': 4,
+    'settings': 10,         # plus creating the user's NotificationSetting on first visit
+    'reports': 10,
+    'inventory_at': 7,
+    'reports_export': 7,
+    'used_materials': 9,
+    'manage_used_material': 4,
+    'api_materials-list': 6,
+    'api_materials-detail': 6,
+    'api_requests-list': 6,
+    'api_requests-detail': 6,
+    'api_tasks-list': 6,
+    'api_tasks-detail': 6,
+    'api_used_materials-list': 6,
+    'api_used_materials-detail': 6,
+}
+
+
+def query_budget(view, cold=False):
+    """The query budget for URL name `view`, or None if it has none."""
+    if cold and view in COLD_QUERY_BUDGETS:
+        return COLD_QUERY_BUDGETS[view]
+    return QUERY_BUDGETS.get(view)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise `sql` so statements differing only in literals compare equal."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _IN_LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Record every SQL statement run while active, on all connections.
+
+    Uses Django's execute_wrapper hooks, so it works with DEBUG off:
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.total_ms, recorder.duplicates()
+    """
+
+    def __init__(self):
+        self.queries = []   # (sql, milliseconds)
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(ms for _, ms in self.queries)
+
+    def slowest(self):
+        """(sql, milliseconds) of the slowest statement, or None."""
+        return max(self.queries, key=lambda query: query[1], default=None)
+
+    def duplicates(self):
+        """[(fingerprint, count)] for statements run more than once, most first."""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [(fp, n) for fp, n in counts.most_common() if n > 1]
+
+    def summary(self, budget=None):
+        """Structured dict for the per-request log line."""
+        slowest = self.slowest()
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 2),
+            'budget': budget,
+            'over_budget': budget is not None and self.count > budget,
+            'duplicates': [{'sql': fp[:200], 'count': n} for fp, n in self.duplicates()[:5]],
+            'slowest': {'sql': slowest[0][:500], 'ms': round(slowest[1], 2)} if slowest else None,
+        }
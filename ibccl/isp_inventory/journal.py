@@ -0,0 +1,106 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from .models import StockMovement, StockSnapshot
+
+
+def describe(material, reason, user=None, reference=''):
+    """Tag the next save of `material` with why its quantity changes.
+
+    The Material post_save signal journals the quantity change using this
+    context; untagged saves are journaled as 'create' or 'adjust'.
+    """
+    material._movement = {'reason': reason, 'user': user, 'reference': reference}
+    return material
+
+
+def check_reason(reason):
+    """Raise ValueError unless `reason` is one of StockMovement.REASON_CHOICES."""
+    if reason not in dict(StockMovement.REASON_CHOICES):
+        raise ValueError(f"Unknown movement reason: {reason}")
+
+
+def record(material_id, delta, quantity_after, reason='adjust', user=None, reference=''):
+    """Append one movement to the journal (no-op for a zero delta)."""
+    check_reason(reason)
+    if not delta:
+        return None
+    return StockMovement.objects.create(
+        material_id=material_id,
+        delta=delta,
+        quantity_after=quantity_after,
+        reason=reason,
+        user=user if user is not None and user.is_authenticated else None,
+        reference=reference,
+    )
+
+
+def record_many(movements, reason='adjust', user=None, reference=''):
+    """Append many (material_id, delta, quantity_after) movements in one insert."""
+    check_reason(reason)
+    user = user if user is not None and user.is_authenticated else None
+    return StockMovement.objects.bulk_create([
+        StockMovement(material_id=material_id, delta=delta, quantity_after=quantity_after,
+                      reason=reason, user=user, reference=reference)
+        for material_id, delta, quantity_after in movements if delta
+    ])
+
+
+def close(material):
+    """Journal the deletion of `material`: its stock leaves the inventory.
+
+    The movements and snapshots stay (they do not cascade), labelled with
+    the material's last name, so inventory_at() for earlier times still
+    adds up.
+    """
+    movements = StockMovement.objects.filter(material_id=material.pk)
+    # The instance may predate SQL stock updates; the journal does not
+    last = movements.order_by('-created_at', '-pk').values_list('quantity_after', flat=True).first()
+    movements.update(material_name=material.name)
+    quantity = (material.quantity or 0) if last is None else last
+    # Written even at zero: it marks when the material left (see take_snapshot)
+    StockMovement.objects.create(
+        material_id=material.pk, material_name=material.name, delta=-quantity, quantity_after=0, reason='delete',
+    )
+
+
+def day_end(day):
+    """Aware datetime at which the snapshot for `day` is taken."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def inventory_at(when):
+    """On-hand quantity of every material at `when`, as {material_id: qty}.
+
+    Starts from the latest snapshot taken at or before `when` and applies
+    the journal movements since then, so the cost is one snapshot read
+    plus a delta scan bounded by the snapshot interval.
+    """
+    base_day = StockSnapshot.objects.filter(day__lt=when.date()).aggregate(d=Max('day'))['d']
+    if base_day is not None and day_end(base_day) > when:
+        base_day = None
+    movements = StockMovement.objects.filter(created_at__lt=when)
+    quantities = {}
+    if base_day is not None:
+        quantities = dict(StockSnapshot.objects.filter(day=base_day).values_list('material_id', 'quantity'))
+        movements = movements.filter(created_at__gte=day_end(base_day))
+    for material_id, delta in movements.values('material_id').annotate(d=Sum('delta')).values_list('material_id', 'd'):
+        quantities[material_id] = quantities.get(material_id, 0) + delta
+    return quantities
+
+
+def take_snapshot(day):
+    """Store the end-of-day quantities for `day`, replacing any existing rows.
+
+    Materials deleted by then (closed at zero) get no row.
+    """
+    quantities = inventory_at(day_end(day))
+    closed = set(StockMovement.objects.filter(
+        material_id__in=quantities, reason='delete', created_at__lt=day_end(day),
+    ).values_list('material_id', flat=True))
+    rows = [StockSnapshot(day=day, material_id=pk, quantity=qty) for pk, qty in quantities.items() if pk not in closed]
+    with transaction.atomic():
+        StockSnapshot.objects.filter(day=day).delete()
+        StockSnapshot.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
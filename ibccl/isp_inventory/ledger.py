@@ -0,0 +1,90 @@
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import MaterialRequest, TechnicianStock, UsedMaterial
+
+
+def adjust(technician_id, material_id, delta, create=True):
+    """Add `delta` to a technician's balance of one material.
+
+    With `create=False` only an existing row is updated; deletions use
+    this so a cascading Material/User delete never re-creates a row.
+    """
+    if not delta or technician_id is None or material_id is None:
+        return
+    rows = TechnicianStock.objects.filter(technician_id=technician_id, material_id=material_id)
+    now = timezone.now()
+    if rows.update(quantity=F('quantity') + delta, updated_at=now) or not create:
+        return
+    _, created = TechnicianStock.objects.get_or_create(
+        technician_id=technician_id, material_id=material_id, defaults={'quantity': delta}
+    )
+    if not created:
+        rows.update(quantity=F('quantity') + delta, updated_at=now)
+
+
+def adjust_many(changes):
+    """Apply {(technician_id, material_id): delta} in a single upsert."""
+    rows = [(t, m, d) for (t, m), d in changes.items() if d and t is not None and m is not None]
+    if not rows:
+        return
+    table = connection.ops.quote_name(TechnicianStock._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    sql = (
+        f"INSERT INTO {table} (technician_id, material_id, quantity, updated_at) VALUES {values} "
+        f"ON CONFLICT (technician_id, material_id) DO UPDATE "
+        f"SET quantity = {table}.quantity + excluded.quantity, updated_at = excluded.updated_at"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in (*row, now)])
+
+
+def balance(user, material):
+    """On-hand quantity of `material` held by `user`."""
+    return TechnicianStock.objects.filter(
+        technician=user, material=material
+    ).values_list('quantity', flat=True).first() or 0
+
+
+def balances(user):
+    """The user's balances as a queryset of TechnicianStock with materials."""
+    return TechnicianStock.objects.filter(technician=user).select_related('material').order_by('material__name')
+
+
+def total(user):
+    """Total units held by `user` across all materials."""
+    return TechnicianStock.objects.filter(technician=user).aggregate(s=Sum('quantity'))['s'] or 0
+
+
+async def atotal(user):
+    """Async total()."""
+    return (await TechnicianStock.objects.filter(technician=user).aaggregate(s=Sum('quantity')))['s'] or 0
+
+
+def compute_balances():
+    """Recompute every (technician_id, material_id) -> quantity from history."""
+    result = {}
+    approved = MaterialRequest.objects.filter(status='Approved').values(
+        'requester_id', 'material_id'
+    ).annotate(q=Sum('quantity'))
+    for row in approved:
+        key = (row['requester_id'], row['material_id'])
+        result[key] = result.get(key, 0) + row['q']
+    used = UsedMaterial.objects.values('technician_id', 'material_id').annotate(q=Sum('quantity'))
+    for row in used:
+        key = (row['technician_id'], row['material_id'])
+        result[key] = result.get(key, 0) - row['q']
+    return result
+
+
+def rebuild(batch_size=1000):
+    """Replace the balance table with balances recomputed from history."""
+    result = compute_balances()
+    with transaction.atomic():
+        TechnicianStock.objects.all().delete()
+        TechnicianStock.objects.bulk_create(
+            [TechnicianStock(technician_id=t, material_id=m, quantity=q) for (t, m), q in result.items()],
+            batch_size=batch_size,
+        )
+    return len(result)
@@ -1,17 +1,51 @@
+import time
+from collections import Counter
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from isp_inventory.utils import ensure_userprofile
+from isp_inventory.utils import create_missing_profiles, invalidate_user_roles
 
 
 class Command(BaseCommand):
     help = 'Create UserProfile records for all users if missing.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users fetched and inserted per batch (default 1000).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the profiles that would be created without writing.')
+
     def handle(self, *args, **options):
-        users = User.objects.all()
-        created = 0
-        for u in users:
-            profile = ensure_userprofile(u)
-            if profile:
-                # ensure_userprofile created or returned an existing profile
-                pass
-        self.stdout.write(self.style.SUCCESS(f'Processed {users.count()} users.'))
\ No newline at end of file
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+
+        missing = User.objects.filter(userprofile__isnull=True)
+        total = missing.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Every user already has a profile.'))
+            return
+
+        roles = Counter()
+        processed = 0
+        last_pk = 0
+        started = time.monotonic()
+        # Keyset iteration over primary keys keeps memory flat and stays
+        # correct while rows disappear from `missing` as they are filled.
+        while True:
+            ids = list(
+                missing.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            planned = create_missing_profiles(ids, dry_run=dry_run)
+            if not dry_run:
+                invalidate_user_roles(ids)
+            roles.update(role for _, role in planned)
+            processed += len(ids)
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0
+            self.stdout.write(f'{processed}/{total} users ({rate:.0f} rows/sec)')
+
+        summary = ', '.join(f'{role}: {n}' for role, n in sorted(roles.items()))
+        verb = 'Would create' if dry_run else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {processed} profiles ({summary}).'))
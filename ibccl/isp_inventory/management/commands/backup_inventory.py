@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from isp_inventory import backups
+
+SUFFIXES = {'gzip': '.jsonl.gz', 'brotli': '.jsonl.br', 'none': '.jsonl'}
+
+
+class Command(BaseCommand):
+    help = 'Stream a compressed backup of the inventory, in full or incrementally since an earlier backup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, or '-' for stdout.")
+        parser.add_argument('--compression', choices=backups.COMPRESSIONS, default='gzip')
+        parser.add_argument('--since', help='ISO timestamp, or a previous backup file whose start time to use: '
+                                            'only rows changed from then on are written.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Objects per chunk (default 2000).')
+
+    def handle(self, *args, **options):
+        try:
+            since = backups.parse_since(options['since']) if options['since'] else None
+        except (ValueError, OSError) as exc:
+            raise CommandError(f'--since: {exc}')
+        started = time.monotonic()
+        chunks = backups.stream(since, options['compression'], max(1, options['chunk_size']))
+        path = options['output']
+        if path == '-':
+            for data in chunks:
+                sys.stdout.buffer.write(data)
+            return
+        if os.path.isdir(path):
+            name = f"isp_backup_{time.strftime('%Y%m%d_%H%M%S')}{SUFFIXES[options['compression']]}"
+            path = os.path.join(path, name)
+        written = 0
+        with open(path, 'wb') as output:
+            for data in chunks:
+                output.write(data)
+                written += len(data)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {"incremental" if since else "full"} backup {path} '
+            f'({written / 1024:.0f} KiB in {time.monotonic() - started:.1f}s).'
+        ))
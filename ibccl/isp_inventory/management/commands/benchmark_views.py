@@ -0,0 +1,74 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from isp_inventory import benchmark, seeding
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the main views at growing data sizes in a throwaway test database and '
+            'compare p50/p95 latency, query counts and peak memory against a stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help='Comma-separated request counts to benchmark at (default 1000,10000). '
+                                 'Other tables scale with it: materials /40, technicians /4000, '
+                                 'used materials x2.5, tasks /4.')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed loads per view (default 10).')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+                            help='Baseline JSON file to compare against.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write these results as the new baseline instead of comparing.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95/memory growth over the baseline, as a fraction (default 0.25).')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',') if size.strip()})
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers.')
+
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run_sizes(sizes, max(1, options['repeat']))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}."))
+            return
+        baseline = benchmark.load_baseline(options['baseline'])
+        if not baseline:
+            self.stdout.write(self.style.WARNING('No baseline to compare against; run with --save-baseline.'))
+            return
+        regressions = benchmark.compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def run_sizes(self, sizes, repeat):
+        client = Client()
+        results = {}
+        seeded = 0
+        self.stdout.write(f"{'size':>9}  {'view':<16}{'role':<13}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KB':>10}")
+        for size in sizes:
+            extra = size - seeded
+            seeding.seed(
+                materials=max(1, extra // 40), technicians=max(3, extra // 4000), requests=extra,
+                used=extra * 5 // 2, tasks=extra // 4, batch_size=5000, seed=size,
+            )
+            seeded = size
+            for key, row in benchmark.run(client, str(size), repeat).items():
+                _, view, role = key.split(':')
+                self.stdout.write(
+                    f"{size:>9}  {view:<16}{role:<13}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                    f"{row['queries']:>9}{row['peak_kb']:>10}"
+                )
+                results[key] = row
+        return results
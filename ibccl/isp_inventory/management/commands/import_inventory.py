@@ -0,0 +1,45 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from isp_inventory import imports
+
+
+class Command(BaseCommand):
+    help = 'Bulk import materials, tasks or vendors from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', choices=sorted(imports.IMPORTERS))
+        parser.add_argument('file', help='.csv or .xlsx file with a header row.')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them.')
+        parser.add_argument('--user', help='Username recorded as the importer (added_by, stock journal).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows validated and written per transaction (default 500).')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}")
+        started = time.monotonic()
+        try:
+            with open(options['file'], 'rb') as fileobj:
+                report = imports.import_rows(
+                    options['entity'], imports.read_rows(fileobj, options['file']), user,
+                    dry_run=options['dry_run'], batch_size=max(1, options['batch_size']),
+                    source=options['file'].rsplit('/', 1)[-1],
+                )
+        except (OSError, imports.ImportFileError) as exc:
+            raise CommandError(str(exc))
+        for change in report['diff']:
+            fields = ', '.join(f'{field}: {old} -> {new}' for field, (old, new) in change['changes'].items())
+            self.stdout.write(f"row {change['row']}: {change['action']} {change['key']} ({fields})")
+        for error in report['errors']:
+            problems = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in error['errors'].items())
+            self.stderr.write(f"row {error['row']}: {problems}")
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {options['entity']}: {report['created']} new, {report['updated']} updated, "
+            f"{report['unchanged']} unchanged, {len(report['errors'])} rows with errors "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
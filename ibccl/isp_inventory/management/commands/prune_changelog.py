@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from isp_inventory import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync change log entries older than --days (run daily).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Entries to keep, in days (default 30). Clients further behind reload in full.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        deleted = sync.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from isp_inventory import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the inventory statistics summary table from scratch.'
+
+    def handle(self, *args, **options):
+        counts = stats.rebuild()
+        for key in sorted(counts):
+            self.stdout.write(f'{key}: {counts[key]}')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(counts)} counters.'))
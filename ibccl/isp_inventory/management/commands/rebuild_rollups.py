@@ -0,0 +1,28 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from isp_inventory import rollups
+
+
+def parse_day(value, option):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        raise CommandError(f'{option} must be YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily request and usage rollups behind the reports page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to rebuild, YYYY-MM-DD (default: all history).')
+        parser.add_argument('--to', dest='end', help='Last day to rebuild, YYYY-MM-DD (default: all history).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rollup rows written per batch (default 1000).')
+
+    def handle(self, *args, **options):
+        start = parse_day(options['start'], '--from')
+        end = parse_day(options['end'], '--to')
+        if start and end and start > end:
+            raise CommandError('--from must not be after --to')
+        total = rollups.rebuild(start, end, batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} rollup rows.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from isp_inventory import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents for materials, requests, tasks and used materials.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows indexed per batch (default 1000).')
+
+    def handle(self, *args, **options):
+        total = search.rebuild(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} search documents.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from isp_inventory import ledger
+
+
+class Command(BaseCommand):
+    help = 'Recompute every technician stock balance from request and usage history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per batch (default 1000).')
+
+    def handle(self, *args, **options):
+        rows = ledger.rebuild(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} technician stock balances.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from isp_inventory.utils import reconcile_user_roles
+
+
+class Command(BaseCommand):
+    help = 'Give every user a UserProfile and at least one role group.'
+
+    def handle(self, *args, **options):
+        result = reconcile_user_roles()
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['profiles_created']} profiles, "
+            f"added {result['memberships_added']} users to a role group."
+        ))
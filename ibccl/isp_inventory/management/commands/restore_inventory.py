@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from isp_inventory import backups
+
+
+class Command(BaseCommand):
+    help = 'Load a backup written by backup_inventory (full first, then incrementals in order).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', help='Backup file (gzip, brotli or plain).')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes loading chunks in parallel (default 1; keep 1 on SQLite).')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Skip rebuilding counters, technician stock, search documents and rollups.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['backup'], 'rb') as fileobj:
+                loaded = backups.restore(
+                    fileobj,
+                    workers=max(1, options['workers']),
+                    rebuild=not options['no_rebuild'],
+                    progress=self.stdout.write if options['verbosity'] > 1 else None,
+                )
+        except (ValueError, OSError) as exc:
+            raise CommandError(str(exc))
+        for label, rows in loaded.items():
+            self.stdout.write(f'{label}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {sum(loaded.values())} rows in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from isp_inventory import seeding
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, materials, requests, tasks and used materials in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--materials', type=int, default=1000)
+        parser.add_argument('--technicians', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--used', type=int, default=50000, help='Used-material rows.')
+        parser.add_argument('--tasks', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365, help='History spread over this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows inserted per batch (default 5000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data.')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Skip rebuilding counters, technician stock and search documents.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = seeding.seed(
+            materials=max(1, options['materials']),
+            technicians=max(1, options['technicians']),
+            requests=options['requests'],
+            used=options['used'],
+            tasks=options['tasks'],
+            days=max(1, options['days']),
+            batch_size=max(1, options['batch_size']),
+            seed=options['seed'],
+            rebuild=not options['no_rebuild'],
+            progress=self.stdout.write,
+        )
+        summary = ', '.join(f'{name}: {n}' for name, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {summary} in {time.monotonic() - started:.1f}s '
+            f'(password for seeded users: {seeding.SEED_PASSWORD}).'
+        ))
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from isp_inventory import journal
+
+
+class Command(BaseCommand):
+    help = 'Store end-of-day stock snapshots from the movement journal (run daily).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to snapshot, YYYY-MM-DD (default: yesterday).')
+        parser.add_argument('--days', type=int, default=1,
+                            help='Number of consecutive days ending at --date to snapshot (default 1).')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                last = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        else:
+            last = timezone.localdate() - timedelta(days=1)
+
+        # Oldest first, so each snapshot builds on the previous one
+        for offset in range(max(1, options['days']) - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            rows = journal.take_snapshot(day)
+            self.stdout.write(f'{day}: {rows} materials')
+        self.stdout.write(self.style.SUCCESS('Snapshots stored.'))
@@ -0,0 +1,117 @@
+import json
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from .caching import CacheRecorder
+from .instrumentation import QueryRecorder, query_budget
+from .utils import aget_user_role, get_user_role
+
+logger = logging.getLogger('isp_inventory.sql')
+
+
+class RoleMiddleware:
+    """Attach the user's role and group names to every request.
+
+    Sets `request.role` (None for anonymous users) and
+    `request.role_groups` (a frozenset of group names), resolved once per
+    request from the role cache in `utils.get_user_role`.
+
+    Runs natively under ASGI too, where the user and role are looked up
+    with the async ORM. Either way the user is loaded once and served to
+    both `request.user` and `request.auser()`, so async views never load
+    it again and sync code never touches the database from the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _attach(self, request, user, info):
+        async def auser():
+            return user
+        request.user, request.auser = user, auser
+        request.role = info['role'] if info else None
+        request.role_groups = frozenset(info['groups']) if info else frozenset()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        user = getattr(request, 'user', None)
+        if user is None:
+            request.role, request.role_groups = None, frozenset()
+            return self.get_response(request)
+        self._attach(request, user, get_user_role(user) if user.is_authenticated else None)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not hasattr(request, 'auser'):
+            request.role, request.role_groups = None, frozenset()
+            return await self.get_response(request)
+        user = await request.auser()
+        self._attach(request, user, await aget_user_role(user) if user.is_authenticated else None)
+        return await self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """Measure the SQL behind every request.
+
+    Adds a `Server-Timing` header (db time and query count, total time)
+    and logs one JSON line per request to the `isp_inventory.sql` logger:
+    query count, SQL time, duplicate statement fingerprints and the
+    slowest statement, with the view's budget from instrumentation.py
+    (the cold one if the request missed the cache), and the request's
+    cache hits and misses per tier. Requests over budget are logged as
+    warnings.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with QueryRecorder() as recorder, CacheRecorder() as cache_recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder, cache_recorder, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        # Connections are per thread: hook the ones on the request's sync
+        # thread, where the async ORM runs its queries
+        await sync_to_async(recorder.__enter__)()
+        try:
+            with CacheRecorder() as cache_recorder:
+                response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder, cache_recorder, start)
+
+    def report(self, request, response, recorder, cache_recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match else None
+        # A request that missed the cache is held to the first-load budget
+        cold = cache_recorder.counts['miss'] + cache_recorder.counts['stale'] > 0
+        summary = recorder.summary(query_budget(view, cold=cold))
+        response['Server-Timing'] = (
+            f'db;dur={summary["db_ms"]:.2f};desc="{summary["queries"]} queries", '
+            f'total;dur={total_ms:.2f}'
+        )
+        line = dict(view=view, method=request.method, path=request.path,
+                    status=response.status_code, total_ms=round(total_ms, 2), **summary,
+                    cache=dict(cache_recorder.counts))
+        level = logging.WARNING if summary['over_budget'] else logging.INFO
+        logger.log(level, json.dumps(line))
+        return response
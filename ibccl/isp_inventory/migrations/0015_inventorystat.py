@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_stats(apps, schema_editor):
+    InventoryStat = apps.get_model('isp_inventory', 'InventoryStat')
+    User = apps.get_model('auth', 'User')
+    counts = {
+        'used_material:total': apps.get_model('isp_inventory', 'UsedMaterial').objects.count(),
+        'user:total': User.objects.count(),
+    }
+    for model_name, prefix in (('Material', 'material'), ('MaterialRequest', 'request'), ('Task', 'task')):
+        model = apps.get_model('isp_inventory', model_name)
+        total = 0
+        for row in model.objects.values('status').annotate(n=Count('id')):
+            counts[f"{prefix}:{row['status']}"] = row['n']
+            total += row['n']
+        counts[f'{prefix}:total'] = total
+    InventoryStat.objects.bulk_create([InventoryStat(key=k, value=v) for k, v in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0014_remove_material_serial_mac'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def seed_stock(apps, schema_editor):
+    MaterialRequest = apps.get_model('isp_inventory', 'MaterialRequest')
+    UsedMaterial = apps.get_model('isp_inventory', 'UsedMaterial')
+    TechnicianStock = apps.get_model('isp_inventory', 'TechnicianStock')
+    balances = {}
+    approved = MaterialRequest.objects.filter(status='Approved').values('requester_id', 'material_id').annotate(q=Sum('quantity'))
+    for row in approved:
+        key = (row['requester_id'], row['material_id'])
+        balances[key] = balances.get(key, 0) + row['q']
+    for row in UsedMaterial.objects.values('technician_id', 'material_id').annotate(q=Sum('quantity')):
+        key = (row['technician_id'], row['material_id'])
+        balances[key] = balances.get(key, 0) - row['q']
+    TechnicianStock.objects.bulk_create(
+        [TechnicianStock(technician_id=t, material_id=m, quantity=q) for (t, m), q in balances.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0015_inventorystat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnicianStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='technician_stock', to='isp_inventory.material')),
+                ('technician', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('technician', 'material')},
+            },
+        ),
+        migrations.RunPython(seed_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_journal(apps, schema_editor):
+    # Start the journal with each material's current quantity
+    Material = apps.get_model('isp_inventory', 'Material')
+    StockMovement = apps.get_model('isp_inventory', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(material_id=pk, delta=qty, quantity_after=qty, reason='opening')
+            for pk, qty in Material.objects.exclude(quantity=0).values_list('pk', 'quantity')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0016_technicianstock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('quantity_after', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening Balance'), ('create', 'Material Added'), ('adjust', 'Manual Adjustment'), ('use', 'Used'), ('approve', 'Issued on Request'), ('reject', 'Returned on Rejection'), ('return', 'Returned on Deletion')], default='adjust', max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='isp_inventory.material')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['material', 'created_at'], name='isp_invento_materia_9584fb_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='isp_inventory.material')),
+            ],
+            options={
+                'unique_together': {('day', 'material')},
+            },
+        ),
+        migrations.RunPython(open_journal, migrations.RunPython.noop),
+    ]
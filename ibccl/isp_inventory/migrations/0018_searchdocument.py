@@ -0,0 +1,102 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+TABLE = 'isp_inventory_searchdocument'
+FTS_TABLE = 'isp_inventory_search_fts'
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f"CREATE INDEX isp_inventory_search_tsv ON {TABLE} USING gin (to_tsvector('simple', body))"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX isp_inventory_search_trgm ON {TABLE} USING gin (body gin_trgm_ops)"
+        )
+    elif vendor == 'sqlite':
+        # External-content FTS5 table kept in step with the documents by triggers
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"body, content='{TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+            f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS isp_inventory_search_tsv')
+        schema_editor.execute('DROP INDEX IF EXISTS isp_inventory_search_trgm')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+# search.ENTITIES as of this migration; frozen so later changes to the
+# live index don't alter what this step builds
+ENTITIES = {
+    'material': ('Material', ('name', 'category', 'status', 'added_by', 'notes')),
+    'request': ('MaterialRequest', ('material__name', 'requester__username', 'status', 'user_note', 'notes')),
+    'task': ('Task', ('title', 'customer', 'technician__username', 'status', 'address')),
+    'used_material': ('UsedMaterial', ('material__name', 'technician__username', 'status', 'address', 'issue')),
+}
+
+
+def build_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('isp_inventory', 'SearchDocument')
+    for entity, (model_name, fields) in ENTITIES.items():
+        rows = apps.get_model('isp_inventory', model_name).objects.order_by('pk').values_list('pk', *fields)
+        last = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last)[:1000])
+            if not batch:
+                break
+            SearchDocument.objects.bulk_create([
+                SearchDocument(
+                    entity=entity, object_id=pk,
+                    body=' '.join(str(value) for value in values if value not in (None, '')),
+                )
+                for pk, *values in batch
+            ])
+            last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0017_stockmovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('entity', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
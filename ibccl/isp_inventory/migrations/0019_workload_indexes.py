@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:40
+
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0018_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['status'], name='isp_invento_status_4f0c73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['added_by'], name='isp_invento_added_b_5d9bf4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['category', 'status'], name='isp_invento_categor_1ad1e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialrequest',
+            index=models.Index(fields=['status', '-requested_at'], name='isp_invento_status_ef649c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialrequest',
+            index=models.Index(fields=['requester', 'status'], name='isp_invento_request_038df6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialrequest',
+            index=models.Index(fields=['-requested_at'], name='isp_invento_request_38d276_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialrequest',
+            index=models.Index(django.db.models.functions.datetime.TruncDate('requested_at'), name='matreq_requested_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['-created_at'], name='isp_invento_created_3ac438_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['technician', '-created_at'], name='isp_invento_technic_ffa1be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status'], name='isp_invento_status_15dc11_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usedmaterial',
+            index=models.Index(fields=['technician', '-added_at'], name='isp_invento_technic_1a7ff9_idx'),
+        ),
+    ]
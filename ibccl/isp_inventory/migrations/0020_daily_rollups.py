@@ -0,0 +1,68 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    MaterialRequest = apps.get_model('isp_inventory', 'MaterialRequest')
+    UsedMaterial = apps.get_model('isp_inventory', 'UsedMaterial')
+    DailyRequestRollup = apps.get_model('isp_inventory', 'DailyRequestRollup')
+    DailyUsageRollup = apps.get_model('isp_inventory', 'DailyUsageRollup')
+    requests = (
+        MaterialRequest.objects.annotate(day=TruncDate('requested_at')).values('day', 'material_id', 'status')
+        .annotate(n=Count('id'), q=Sum('quantity')).order_by()
+    )
+    DailyRequestRollup.objects.bulk_create([
+        DailyRequestRollup(day=row['day'], material_id=row['material_id'], status=row['status'],
+                           requests=row['n'], quantity=row['q'] or 0)
+        for row in requests
+    ], batch_size=1000)
+    usage = (
+        UsedMaterial.objects.annotate(day=TruncDate('added_at')).values('day', 'material_id')
+        .annotate(n=Count('id'), q=Sum('quantity')).order_by()
+    )
+    DailyUsageRollup.objects.bulk_create([
+        DailyUsageRollup(day=row['day'], material_id=row['material_id'], entries=row['n'], quantity=row['q'] or 0)
+        for row in usage
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0019_workload_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('requests', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_rollups', to='isp_inventory.material')),
+            ],
+            options={
+                'unique_together': {('day', 'material', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('entries', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='isp_inventory.material')),
+            ],
+            options={
+                'unique_together': {('day', 'material')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
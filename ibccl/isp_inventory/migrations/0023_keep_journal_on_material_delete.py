@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('isp_inventory', '0022_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='material_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='material',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movements', to='isp_inventory.material'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('opening', 'Opening Balance'), ('create', 'Material Added'), ('adjust', 'Manual Adjustment'), ('use', 'Used'), ('approve', 'Issued on Request'), ('reject', 'Returned on Rejection'), ('return', 'Returned on Deletion'), ('delete', 'Material Deleted')], default='adjust', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='material',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='snapshots', to='isp_inventory.material'),
+        ),
+    ]
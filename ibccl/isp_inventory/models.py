@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import TruncDate
 
 # Extend User with Role
 class UserProfile(models.Model):
@@ -34,6 +35,15 @@ class Material(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Normal')
     added_by = models.CharField(max_length=100)
     added_at = models.DateTimeField(auto_now_add=True)
+    # Row version for conditional GETs and incremental backups; bulk writes set it explicitly
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+            models.Index(fields=['added_by']),
+            models.Index(fields=['category', 'status']),
+        ]
 
     def __str__(self):
         return self.name
@@ -43,15 +53,16 @@ class Material(models.Model):
 
         `added_by` stores a username string. Prefer the User's full name
         when available, otherwise fall back to username or the raw value.
+        Lists should batch this with `utils.attach_added_by_display`.
         """
         if not self.added_by:
             return ''
+        cached = getattr(self, '_added_by_display', None)
+        if cached is not None:
+            return cached
         try:
-            user = User.objects.filter(username=self.added_by).first()
-            if user:
-                full = (user.first_name or '') + (' ' + user.last_name if user.last_name else '')
-                full = full.strip()
-                return full or user.username
+            from .utils import resolve_display_names
+            return resolve_display_names([self.added_by])[self.added_by]
         except Exception:
             pass
         return self.added_by
@@ -95,6 +106,14 @@ class Task(models.Model):
     technician = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['technician', '-created_at']),
+            models.Index(fields=['status']),
+        ]
 
     def __str__(self):
         return self.title
@@ -109,6 +128,16 @@ class MaterialRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
     admin_note = models.CharField(max_length=200, blank=True) #material quantity update note
     requested_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-requested_at']),
+            models.Index(fields=['requester', 'status']),
+            models.Index(fields=['-requested_at']),
+            # reports_view filters on requested_at__date ranges
+            models.Index(TruncDate('requested_at'), name='matreq_requested_day_idx'),
+        ]
 
     def __str__(self):
         return f"{self.requester} - {self.material.name}"  
@@ -154,6 +183,168 @@ class UsedMaterial(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
     admin_note = models.TextField(blank=True)
     added_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['technician', '-added_at'])]
+
+    def __str__(self):
+        return f"{self.technician.username} - {self.material.name}"
+
+class InventoryStat(models.Model):
+    """Pre-aggregated counter kept current by signals (see stats.py)."""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class TableVersion(models.Model):
+    """Change counter per table, behind conditional GETs (see versions.py)."""
+    table = models.CharField(max_length=30, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
+class ChangeLog(models.Model):
+    """One write to a synced row; ids double as sync tokens (see sync.py)."""
+    entity = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    # Technician the row belongs to; null for rows every role syncs (materials)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'id'])]
+
+    def __str__(self):
+        return f"{self.pk} {'-' if self.deleted else '+'}{self.entity}:{self.object_id}"
+
+
+class TechnicianStock(models.Model):
+    """On-hand balance of one material held by one technician.
+
+    Approved requests add to it and used materials take from it; kept
+    current by signals (see ledger.py).
+    """
+    technician = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='technician_stock')
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('technician', 'material')
+
+    def __str__(self):
+        return f"{self.technician.username} - {self.material.name}: {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """Append-only journal entry for one change to Material.quantity."""
+    REASON_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('create', 'Material Added'),
+        ('adjust', 'Manual Adjustment'),
+        ('use', 'Used'),
+        ('approve', 'Issued on Request'),
+        ('reject', 'Returned on Rejection'),
+        ('return', 'Returned on Deletion'),
+        ('delete', 'Material Deleted'),
+    ]
+    # History outlives the material: no constraint and no cascade, so the
+    # id stays for point-in-time queries. Nullable only so select_related
+    # uses an outer join and keeps the movements of deleted materials.
+    material = models.ForeignKey(
+        Material, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='movements',
+    )
+    # Filled in when the material is deleted (see material_label)
+    material_name = models.CharField(max_length=100, blank=True)
+    delta = models.IntegerField()
+    quantity_after = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='adjust')
+    reference = models.CharField(max_length=100, blank=True)  # e.g. "request:42"
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['material', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.material_label} {self.delta:+d} ({self.reason})"
+
+    @property
+    def material_label(self):
+        """The material's name, also once it has been deleted."""
+        try:
+            return self.material.name if self.material else self.material_name
+        except Material.DoesNotExist:
+            return self.material_name
+
+
+class StockSnapshot(models.Model):
+    """On-hand quantity of a material at the end of `day` (see journal.py)."""
+    day = models.DateField()
+    # Kept after the material is deleted, like StockMovement.material
+    material = models.ForeignKey(
+        Material, on_delete=models.DO_NOTHING, db_constraint=False, related_name='snapshots',
+    )
+    quantity = models.IntegerField()
+
+    class Meta:
+        unique_together = ('day', 'material')
+
+    def __str__(self):
+        return f"{self.day} {self.material_id}: {self.quantity}"
+
+
+class SearchDocument(models.Model):
+    """Searchable text for one row of an indexed model (see search.py).
+
+    PostgreSQL indexes `body` with tsvector and pg_trgm GIN indexes;
+    SQLite mirrors it into an FTS5 table through triggers.
+    """
+    entity = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('entity', 'object_id')
+
+    def __str__(self):
+        return f"{self.entity}:{self.object_id}"
+
+
+class DailyRequestRollup(models.Model):
+    """Requests and quantities per (day, material, status); see rollups.py."""
+    day = models.DateField()
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='request_rollups')
+    status = models.CharField(max_length=20)
+    requests = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'material', 'status')
+
+    def __str__(self):
+        return f"{self.day} {self.material_id} {self.status}: {self.requests}"
+
+
+class DailyUsageRollup(models.Model):
+    """Used-material entries and quantities per (day, material); see rollups.py."""
+    day = models.DateField()
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='usage_rollups')
+    entries = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'material')
 
     def __str__(self):
-        return f"{self.technician.username} - {self.material.name}"
\ No newline at end of file
+        return f"{self.day} {self.material_id}: {self.quantity}"
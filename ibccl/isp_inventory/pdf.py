@@ -0,0 +1,157 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import DailyUsageRollup, MaterialRequest
+from . import journal, pdfwriter, rollups, versions
+
+# The PDF lists at most this many requests; the Excel export has them all
+MAX_ROWS = 2000
+# A render still marked pending after this long is assumed to have died
+STALE_AFTER = 600
+
+_KEY = re.compile(r'^[0-9a-f]{64}$')
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _directory():
+    return getattr(settings, 'REPORT_PDF_DIR', os.path.join(settings.MEDIA_ROOT, 'reports'))
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, so every platform gets the same Django-free workers
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_PDF_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _render_done(future, executor, pending, error):
+    """Clean up after a render whose worker died before it could (see write_pdf)."""
+    global _executor
+    exc = future.exception()
+    if exc is None or os.path.exists(error):
+        return
+    pdfwriter.mark_failed(pending, error, f'{type(exc).__name__}: {exc}')
+    if isinstance(exc, BrokenProcessPool):
+        with _executor_lock:
+            # The next request starts a fresh pool
+            if _executor is executor:
+                _executor = None
+
+
+def data_version(start, end):
+    """Fingerprint of the data a report over start..end is built from.
+
+    The request rows in the range are covered by their count and newest
+    updated_at (every write and bulk path sets it, and deletes change the
+    count). The names shown with them are covered by the material and
+    user table versions. Usage only appears as totals, which are read
+    from the daily rollups.
+    """
+    requests = MaterialRequest.objects.filter(
+        requested_at__gte=journal.day_end(start - timedelta(days=1)),
+        requested_at__lt=journal.day_end(end),
+    ).aggregate(n=Count('pk'), changed=Max('updated_at'))
+    usage = DailyUsageRollup.objects.filter(day__gte=start, day__lte=end).aggregate(
+        n=Sum('entries'), q=Sum('quantity'),
+    )
+    names = versions.current((versions.MATERIAL, versions.USER))
+    return [
+        [requests['n'], requests['changed']], [usage['n'], usage['q']],
+        [names[versions.MATERIAL][0], names[versions.USER][0]],
+    ]
+
+
+def report_key(start, end):
+    """Content address of the PDF for days start..end at the current data version."""
+    payload = {'from': str(start), 'to': str(end), 'version': data_version(start, end)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def path(key, suffix='.pdf'):
+    if not _KEY.match(key):
+        raise ValueError(f'Invalid report key: {key!r}')
+    return os.path.join(_directory(), key + suffix)
+
+
+def status(key):
+    """'ready', 'rendering', 'failed' or 'missing' for the PDF `key`."""
+    if os.path.exists(path(key)):
+        return 'ready'
+    if os.path.exists(path(key, '.error')):
+        return 'failed'
+    try:
+        started = os.path.getmtime(path(key, '.pending'))
+    except FileNotFoundError:
+        return 'missing'
+    return 'rendering' if time.time() - started < STALE_AFTER else 'missing'
+
+
+def render_html(start, end):
+    """The report as HTML, built in the calling process (it needs the database)."""
+    requests = MaterialRequest.objects.filter(
+        requested_at__gte=journal.day_end(start - timedelta(days=1)),
+        requested_at__lt=journal.day_end(end),
+    ).select_related('requester', 'material').order_by('-requested_at')[:MAX_ROWS]
+    summary = rollups.summary(start, end)
+    return render_to_string('inventory/reports_pdf.html', {
+        'from_date': start,
+        'to_date': end,
+        'requests': requests,
+        'summary': summary,
+        'truncated': summary['total_requests'] > MAX_ROWS,
+        'max_rows': MAX_ROWS,
+        'generated_at': timezone.localtime(),
+    })
+
+
+def request_pdf(start, end):
+    """Make sure the PDF for start..end exists or is being rendered.
+
+    Returns (key, status). Renders run in a process pool. A `.pending`
+    marker created with O_EXCL claims each key, so identical requests
+    share one render, even when they arrive in different web workers.
+    A failed render, including one whose worker process died, leaves an
+    `.error` marker and is retried on the next request.
+    """
+    key = report_key(start, end)
+    state = status(key)
+    if state in ('ready', 'rendering'):
+        return key, state
+    os.makedirs(_directory(), exist_ok=True)
+    if state == 'failed':
+        os.unlink(path(key, '.error'))
+    pending = path(key, '.pending')
+    if os.path.exists(pending):
+        os.unlink(pending)  # stale claim from a render that died
+    try:
+        with open(pending, 'x'):
+            pass
+    except FileExistsError:
+        return key, 'rendering'
+    try:
+        html = render_html(start, end)
+        executor, error = _pool(), path(key, '.error')
+        future = executor.submit(pdfwriter.write_pdf, html, path(key), pending, error)
+        future.add_done_callback(partial(_render_done, executor=executor, pending=pending, error=error))
+    except Exception:
+        os.unlink(pending)
+        raise
+    return key, 'rendering'
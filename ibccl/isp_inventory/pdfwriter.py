@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+# Runs in the report pool's processes, which unpickle this module without
+# setting up Django: keep Django and the app's other modules out of it.
+
+
+def write_pdf(html, target, pending, error):
+    """Convert `html` to a PDF at `target`.
+
+    On failure an `error` marker holding the message replaces the
+    `pending` one; either way `pending` is gone when this returns.
+    """
+    from xhtml2pdf import pisa
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            result = pisa.CreatePDF(html, dest=output)
+        if result.err:
+            raise RuntimeError(f'xhtml2pdf reported {result.err} errors')
+        # Readers see either no file or the whole file
+        os.replace(partial, target)
+    except Exception as exc:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        mark_failed(pending, error, str(exc))
+        raise
+    finally:
+        if os.path.exists(pending):
+            os.unlink(pending)
+    return target
+
+
+def mark_failed(pending, error, message):
+    """Record a failed render: write the `error` marker, drop the `pending` claim."""
+    with open(error, 'w') as marker:
+        marker.write(message)
+    if os.path.exists(pending):
+        os.unlink(pending)
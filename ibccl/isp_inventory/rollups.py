@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyRequestRollup, DailyUsageRollup, MaterialRequest, UsedMaterial
+from . import journal
+
+
+def day_of(moment):
+    """Local calendar day of an aware datetime, as TruncDate computes it."""
+    return timezone.localdate(moment)
+
+
+def _apply(model, keys, values, changes, create):
+    """Add {key tuple: value tuple} to the rollup rows of `model`.
+
+    With `create`, all rows go in one INSERT ... ON CONFLICT upsert;
+    without it only existing rows are updated, so deletes cascading from
+    a Material never recreate its rollups.
+    """
+    changes = {key: delta for key, delta in changes.items() if any(delta)}
+    if not changes:
+        return
+    if not create:
+        for key, delta in changes.items():
+            model.objects.filter(**dict(zip(keys, key))).update(
+                **{name: F(name) + value for name, value in zip(values, delta)}
+            )
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [model._meta.get_field(name).column for name in keys + values]
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(changes))} "
+        f"ON CONFLICT ({', '.join(columns[:len(keys)])}) DO UPDATE SET "
+        + ', '.join(f'{name} = {table}.{name} + excluded.{name}' for name in values)
+    )
+    params = []
+    for key, delta in changes.items():
+        params += [connection.ops.adapt_datefield_value(key[0]), *key[1:], *delta]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def add_requests(rows, create=True):
+    """Apply (day, material_id, status, requests, quantity) deltas."""
+    changes = defaultdict(lambda: (0, 0))
+    for day, material_id, status, count, quantity in rows:
+        old = changes[(day, material_id, status)]
+        changes[(day, material_id, status)] = (old[0] + count, old[1] + quantity)
+    _apply(DailyRequestRollup, ['day', 'material', 'status'], ['requests', 'quantity'], changes, create)
+
+
+def add_usage(rows, create=True):
+    """Apply (day, material_id, entries, quantity) deltas."""
+    changes = defaultdict(lambda: (0, 0))
+    for day, material_id, count, quantity in rows:
+        old = changes[(day, material_id)]
+        changes[(day, material_id)] = (old[0] + count, old[1] + quantity)
+    _apply(DailyUsageRollup, ['day', 'material'], ['entries', 'quantity'], changes, create)
+
+
+def summary(start, end):
+    """Report totals for days start..end inclusive, read from the rollups."""
+    requests = DailyRequestRollup.objects.filter(day__gte=start, day__lte=end).aggregate(
+        total_requests=Sum('requests'),
+        approved_count=Sum('requests', filter=Q(status='Approved')),
+        pending_count=Sum('requests', filter=Q(status='Pending')),
+        total_used=Sum('quantity', filter=Q(status='Approved')),
+    )
+    usage = DailyUsageRollup.objects.filter(day__gte=start, day__lte=end).aggregate(
+        used_entries=Sum('entries'), used_quantity=Sum('quantity'),
+    )
+    return {key: value or 0 for key, value in {**requests, **usage}.items()}
+
+
+def _insert(model, rows, batch_size):
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        model.objects.bulk_create(batch)
+        total += len(batch)
+
+
+def rebuild(start=None, end=None, batch_size=1000):
+    """Recompute the rollups for days start..end inclusive (all days if omitted).
+
+    Returns the number of rollup rows written.
+    """
+    requests, usage = MaterialRequest.objects.all(), UsedMaterial.objects.all()
+    request_rollups, usage_rollups = DailyRequestRollup.objects.all(), DailyUsageRollup.objects.all()
+    if start:
+        since = journal.day_end(start - timedelta(days=1))
+        requests, usage = requests.filter(requested_at__gte=since), usage.filter(added_at__gte=since)
+        request_rollups, usage_rollups = request_rollups.filter(day__gte=start), usage_rollups.filter(day__gte=start)
+    if end:
+        until = journal.day_end(end)
+        requests, usage = requests.filter(requested_at__lt=until), usage.filter(added_at__lt=until)
+        request_rollups, usage_rollups = request_rollups.filter(day__lte=end), usage_rollups.filter(day__lte=end)
+
+    request_rows = (
+        requests.annotate(day=TruncDate('requested_at')).values('day', 'material_id', 'status')
+        .annotate(n=Count('id'), q=Sum('quantity')).order_by()
+    )
+    usage_rows = (
+        usage.annotate(day=TruncDate('added_at')).values('day', 'material_id')
+        .annotate(n=Count('id'), q=Sum('quantity')).order_by()
+    )
+    with transaction.atomic():
+        request_rollups.delete()
+        usage_rollups.delete()
+        return _insert(DailyRequestRollup, (
+            DailyRequestRollup(day=row['day'], material_id=row['material_id'], status=row['status'],
+                               requests=row['n'], quantity=row['q'] or 0)
+            for row in request_rows.iterator(chunk_size=batch_size)
+        ), batch_size) + _insert(DailyUsageRollup, (
+            DailyUsageRollup(day=row['day'], material_id=row['material_id'], entries=row['n'], quantity=row['q'] or 0)
+            for row in usage_rows.iterator(chunk_size=batch_size)
+        ), batch_size)
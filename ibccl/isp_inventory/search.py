@@ -0,0 +1,167 @@
+import re
+from django.apps import apps
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Func, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+
+# Indexed entities: name -> (model, fields joined into the search document).
+# Related names are included so e.g. a request is found by its material.
+ENTITIES = {
+    'material': ('Material', ('name', 'category', 'status', 'added_by', 'notes')),
+    'request': ('MaterialRequest', ('material__name', 'requester__username', 'status', 'user_note', 'notes')),
+    'task': ('Task', ('title', 'customer', 'technician__username', 'status', 'address')),
+    'used_material': ('UsedMaterial', ('material__name', 'technician__username', 'status', 'address', 'issue')),
+}
+
+# Documents that embed another model's text: model -> [(entity, foreign key)]
+DEPENDENTS = {
+    'Material': [('request', 'material'), ('used_material', 'material')],
+    'User': [('request', 'requester'), ('task', 'technician'), ('used_material', 'technician')],
+}
+
+# Ids search() returns by default; filter_queryset is not limited
+SEARCH_LIMIT = 500
+MAX_TERMS = 8
+FTS_TABLE = 'isp_inventory_search_fts'
+
+_fts_available = None
+
+
+def _model(name):
+    return apps.get_model('isp_inventory', name)
+
+
+def _body(values):
+    return ' '.join(str(value) for value in values if value not in (None, ''))
+
+
+def terms(query):
+    """Split a user query into lower-case word terms (each prefix-matched)."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def index(entity, ids):
+    """(Re)build the search documents of `entity` rows `ids` in one upsert."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    model_name, fields = ENTITIES[entity]
+    SearchDocument = _model('SearchDocument')
+    docs = [
+        SearchDocument(entity=entity, object_id=pk, body=_body(values))
+        for pk, *values in _model(model_name).objects.filter(pk__in=ids).values_list('pk', *fields)
+    ]
+    SearchDocument.objects.bulk_create(
+        docs, batch_size=500, update_conflicts=True,
+        unique_fields=['entity', 'object_id'], update_fields=['body', 'updated_at'],
+    )
+    return len(docs)
+
+
+def remove(entity, ids):
+    _model('SearchDocument').objects.filter(entity=entity, object_id__in=list(ids)).delete()
+
+
+def index_dependents(model_name, pk):
+    """Refresh documents that embed text from `model_name` row `pk`."""
+    for entity, field in DEPENDENTS.get(model_name, []):
+        model = _model(ENTITIES[entity][0])
+        index(entity, model.objects.filter(**{f'{field}_id': pk}).values_list('pk', flat=True))
+
+
+def rebuild(batch_size=1000):
+    """Replace every search document, reading each table in keyset batches."""
+    SearchDocument = _model('SearchDocument')
+    SearchDocument.objects.all().delete()
+    total = 0
+    for entity, (model_name, _) in ENTITIES.items():
+        qs = _model(model_name).objects.order_by('pk').values_list('pk', flat=True)
+        last = 0
+        while True:
+            ids = list(qs.filter(pk__gt=last)[:batch_size])
+            if not ids:
+                break
+            total += index(entity, ids)
+            last = ids[-1]
+    return total
+
+
+def fts_available():
+    """True when the SQLite FTS5 mirror table exists (checked once)."""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def _matches(entity, query):
+    """(documents matching `query`, their rank expression or None).
+
+    Every term must match as a word prefix. On PostgreSQL, documents whose
+    text is merely similar to the query (pg_trgm word similarity) also
+    match, which catches typos; rank combines ts_rank and similarity. On
+    SQLite the FTS5 table is ranked with bm25. Other backends fall back to
+    unranked substring matching. Higher ranks are better matches.
+    """
+    words = terms(query)
+    docs = _model('SearchDocument').objects.filter(entity=entity)
+    if not words:
+        return docs.none(), None
+    if connection.vendor == 'postgresql':
+        text = ' '.join(words)
+        vector = Func(F('body'), template="to_tsvector('simple', %(expressions)s)")
+        tsquery = Func(
+            Value(' & '.join(f'{word}:*' for word in words)), template="to_tsquery('simple', %(expressions)s)",
+        )
+        # Written as operators, not function calls, so the GIN indexes apply
+        matched = Func(vector, tsquery, template='%(expressions)s', arg_joiner=' @@ ', output_field=BooleanField())
+        similar = Func(Value(text), F('body'), template='%(expressions)s', arg_joiner=' <%% ',
+                       output_field=BooleanField())
+        rank = (
+            Func(vector, tsquery, function='ts_rank', output_field=FloatField())
+            + Func(Value(text), F('body'), function='word_similarity', output_field=FloatField())
+        )
+        return docs.filter(matched | similar), rank
+    if connection.vendor == 'sqlite' and fts_available():
+        match = ' '.join(f'"{word}"*' for word in words)
+        matched = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        # bm25 is lower for better matches; it needs the MATCH, so it is
+        # looked up per document
+        rank = Func(
+            Value(match), F('id'), arg_joiner=' AND rowid = ', output_field=FloatField(),
+            template=f'(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %(expressions)s)',
+        )
+        return docs.filter(id__in=matched), rank
+    for word in words:
+        docs = docs.filter(body__icontains=word)
+    return docs, None
+
+
+def search(entity, query, limit=SEARCH_LIMIT):
+    """Return ids of the best `limit` rows of `entity` matching `query`.
+
+    For top-N lookups; list pages filter with filter_queryset, which is
+    not limited.
+    """
+    docs, rank = _matches(entity, query)
+    if rank is not None:
+        docs = docs.annotate(rank=rank).order_by('-rank', '-object_id')
+    else:
+        docs = docs.order_by('-object_id')
+    return list(docs.values_list('object_id', flat=True)[:limit])
+
+
+def filter_queryset(qs, entity, query, ranked=True):
+    """Restrict `qs` to every row matching `query`, best match first if `ranked`.
+
+    The match is a subquery on the search documents, so counts and pages
+    cover all matches. Ranked querysets are annotated with `search_rank`.
+    """
+    docs, rank = _matches(entity, query)
+    qs = qs.filter(pk__in=docs.values('object_id'))
+    if not ranked:
+        return qs
+    if rank is None:
+        return qs.order_by('-pk')
+    ranks = docs.filter(object_id=OuterRef('pk')).annotate(rank=rank).values('rank')[:1]
+    return qs.annotate(search_rank=Subquery(ranks, output_field=FloatField())).order_by('-search_rank', '-pk')
@@ -0,0 +1,167 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+from .models import Material, MaterialRequest, Task, UsedMaterial, UserProfile, StockMovement
+from .utils import ensure_role_groups
+from . import stats, ledger, search, rollups, versions
+
+SEED_PASSWORD = 'seed-pass'
+CUSTOMERS = ['Rahman', 'Hossain', 'Akter', 'Islam', 'Ahmed', 'Khan', 'Chowdhury', 'Das', 'Roy', 'Sarker']
+AREAS = ['Mirpur', 'Uttara', 'Dhanmondi', 'Gulshan', 'Banani', 'Mohammadpur', 'Badda', 'Rampura']
+ITEMS = ['ONU', 'Router', 'Fiber Patch Cord', 'Splitter', 'Dish LNB', 'Coaxial Cable', 'Switch', 'Media Converter']
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk inserts keep their own values for auto_now(_add) fields."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_insert(model, rows, batch_size, progress=None, label=None):
+    """bulk_create rows from an iterator `batch_size` at a time; returns the count."""
+    rows = iter(rows)
+    label = label or model._meta.verbose_name_plural
+    total = 0
+    started = time.monotonic()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        total += len(batch)
+        if progress:
+            elapsed = time.monotonic() - started
+            progress(f'{label}: {total} rows ({total / elapsed if elapsed else 0:.0f} rows/sec)')
+    return total
+
+
+def _status(quantity, min_stock_level):
+    # Same rules as Material.save()
+    if quantity <= 0:
+        return 'Out of Stock'
+    if quantity < min_stock_level:
+        return 'Low Stock'
+    return 'Normal'
+
+
+def seed_users(technicians, storekeepers=2, batch_size=1000, progress=None):
+    """Create role users with profiles and group memberships in bulk.
+
+    Usernames continue from the highest existing user id, so repeated
+    runs add users. Returns {'admin': [...], 'storekeeper': [...],
+    'technician': [...]} of the new user ids.
+    """
+    groups = ensure_role_groups()
+    start = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    password = make_password(SEED_PASSWORD)
+    plan = [('Admin', 1), ('Storekeeper', storekeepers), ('Technician', technicians)]
+    names = []
+    for role, count in plan:
+        names += [(f'{role.lower()}{start + len(names) + i:06d}', role) for i in range(count)]
+    bulk_insert(User, (User(username=name, password=password) for name, _ in names), batch_size, progress, 'users')
+
+    ids = dict(User.objects.filter(username__in=[name for name, _ in names]).values_list('username', 'pk'))
+    bulk_insert(UserProfile, (UserProfile(user_id=ids[name], role=role) for name, role in names), batch_size)
+    Membership = User.groups.through
+    bulk_insert(Membership, (Membership(user_id=ids[name], group_id=groups[role].pk) for name, role in names), batch_size)
+    result = {'admin': [], 'storekeeper': [], 'technician': []}
+    for name, role in names:
+        result[role.lower()].append(ids[name])
+    return result
+
+
+def seed(materials=1000, technicians=50, requests=20000, used=50000, tasks=5000, days=365,
+         batch_size=5000, seed=0, rebuild=True, progress=None):
+    """Generate a realistic inventory in bulk at the given scale.
+
+    Materials get random stock levels, requests and used materials are
+    spread over the last `days` days with an Approved/Pending/Rejected
+    mix, and tasks are spread across technicians. Rows are streamed in
+    `batch_size` chunks so memory stays flat at millions of rows. With
+    `rebuild`, the signal-maintained tables (counters, technician
+    ledger, search documents, report rollups) are rebuilt afterwards.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    span = days * 86400
+
+    def when():
+        return now - timedelta(seconds=rng.randrange(span))
+
+    users = seed_users(technicians, batch_size=batch_size, progress=progress)
+    tech_ids = users['technician']
+    storekeeper = User.objects.filter(pk__in=users['storekeeper']).values_list('username', flat=True).first()
+
+    offset = Material.objects.count()
+
+    def material_rows():
+        for i in range(materials):
+            quantity = rng.choice((0, rng.randint(1, 9), rng.randint(10, 500), rng.randint(10, 500)))
+            yield Material(
+                name=f'{rng.choice(ITEMS)} {offset + i:07d}', category=rng.choice(('Internet', 'Dish')),
+                quantity=quantity, min_stock_level=10, status=_status(quantity, 10), added_by=storekeeper,
+            )
+
+    bulk_insert(Material, material_rows(), batch_size, progress)
+    material_ids = list(Material.objects.order_by('-pk').values_list('pk', flat=True)[:materials])
+    bulk_insert(StockMovement, (
+        StockMovement(material_id=pk, delta=qty, quantity_after=qty, reason='opening')
+        for pk, qty in Material.objects.filter(pk__in=material_ids).exclude(quantity=0).values_list('pk', 'quantity')
+    ), batch_size)
+
+    def request_rows():
+        for i in range(requests):
+            yield MaterialRequest(
+                material_id=rng.choice(material_ids), requester_id=rng.choice(tech_ids),
+                quantity=rng.randint(1, 10), status=rng.choices(('Approved', 'Pending', 'Rejected'), (60, 25, 15))[0],
+                user_note=f'{rng.choice(AREAS)} connection {i}', requested_at=when(),
+            )
+
+    def used_rows():
+        for i in range(used):
+            yield UsedMaterial(
+                technician_id=rng.choice(tech_ids), material_id=rng.choice(material_ids), quantity=rng.randint(1, 3),
+                address=f'House {rng.randint(1, 200)}, {rng.choice(AREAS)}', issue='New connection',
+                status='Accepted', added_at=when(),
+            )
+
+    def task_rows():
+        for i in range(tasks):
+            yield Task(
+                title=f'Install #{i}', customer=f'{rng.choice(CUSTOMERS)} {i}', address=rng.choice(AREAS),
+                technician_id=rng.choice(tech_ids), status=rng.choice(('Pending', 'In Progress', 'Completed')),
+                created_at=when(),
+            )
+
+    with explicit_timestamps(
+        MaterialRequest._meta.get_field('requested_at'),
+        UsedMaterial._meta.get_field('added_at'),
+        Task._meta.get_field('created_at'),
+    ):
+        counts = {
+            'users': sum(len(ids) for ids in users.values()),
+            'materials': materials,
+            'requests': bulk_insert(MaterialRequest, request_rows(), batch_size, progress),
+            'used_materials': bulk_insert(UsedMaterial, used_rows(), batch_size, progress),
+            'tasks': bulk_insert(Task, task_rows(), batch_size, progress),
+        }
+
+    if rebuild:
+        stats.rebuild()
+        ledger.rebuild(batch_size=batch_size)
+        search.rebuild(batch_size=batch_size)
+        rollups.rebuild(batch_size=batch_size)
+    versions.bump(*versions.TABLES)
+    return counts
@@ -1,14 +1,355 @@
-from django.db.models.signals import post_save
-from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed
+from django.contrib.auth.models import User, Group
+from django.db import transaction
 from django.dispatch import receiver
-from .utils import ensure_userprofile
+from .models import Material, MaterialRequest, Task, UsedMaterial, UserProfile
+from .utils import (
+    ensure_userprofile, invalidate_display_names, invalidate_user_roles, reconcile_user_roles, role_cache_tag,
+)
+from . import caching, stats, ledger, journal, search, rollups, versions, sync
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
+        # A role cached under a reused pk (SQLite reuses them after a
+        # rollback) can't be a committed user's: drop it now
+        caching.invalidate(role_cache_tag(instance.pk))
         try:
             ensure_userprofile(instance)
         except Exception:
             # Avoid raising during user creation if profile can't be created
             pass
+        # Once the creating transaction commits (and any chosen groups are
+        # set), put users left without a role group into their role's group
+        transaction.on_commit(lambda: reconcile_user_roles([instance.pk]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_display_names(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which never affects the display name
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_display_names()
+
+
+# Role cache: expire a user's cached role whenever profile or groups change
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def clear_role_on_profile_change(sender, instance, **kwargs):
+    invalidate_user_roles([instance.user_id])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def clear_role_on_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_roles([instance.pk])
+    elif action == 'pre_clear':
+        # group.user_set.clear(): members are gone by post_clear
+        instance._role_member_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_user_roles(getattr(instance, '_role_member_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_roles(pk_set or [])
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def clear_role_on_group_change(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_user_roles(list(instance.user_set.values_list('pk', flat=True)))
+
+
+# Previous field values, read once per save for the handlers below
+
+TRACKED_FIELDS = {
+    Material: ('status', 'quantity', 'name'),
+    MaterialRequest: ('status', 'quantity', 'material_id', 'requester_id'),
+    Task: ('status', 'technician_id'),
+    UsedMaterial: ('quantity', 'material_id', 'technician_id'),
+}
+
+
+@receiver(pre_save, sender=Material)
+@receiver(pre_save, sender=MaterialRequest)
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=UsedMaterial)
+def remember_old_values(sender, instance, raw=False, **kwargs):
+    instance._old_values = None
+    if raw or instance.pk is None:
+        return
+    instance._old_values = sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS[sender]).first()
+
+
+# Inventory statistics: keep the summary counters in step with writes
+
+STATUS_COUNTERS = {
+    Material: (stats.material_key, stats.MATERIAL_TOTAL),
+    MaterialRequest: (stats.request_key, stats.REQUEST_TOTAL),
+    Task: (stats.task_key, stats.TASK_TOTAL),
+}
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=MaterialRequest)
+@receiver(post_save, sender=Task)
+def count_status_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    key_func, total_key = STATUS_COUNTERS[sender]
+    old_status = (getattr(instance, '_old_values', None) or {}).get('status')
+    if created:
+        stats.bump(total_key, 1)
+        stats.bump(key_func(instance.status), 1)
+    elif old_status is not None and old_status != instance.status:
+        stats.move(key_func(old_status), key_func(instance.status))
+
+
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=MaterialRequest)
+@receiver(post_delete, sender=Task)
+def count_status_on_delete(sender, instance, **kwargs):
+    key_func, total_key = STATUS_COUNTERS[sender]
+    stats.bump(total_key, -1)
+    stats.bump(key_func(instance.status), -1)
+
+
+@receiver(post_save, sender=UsedMaterial)
+def count_used_material_on_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(stats.USED_MATERIAL_TOTAL, 1)
+
+
+@receiver(post_delete, sender=UsedMaterial)
+def count_used_material_on_delete(sender, instance, **kwargs):
+    stats.bump(stats.USED_MATERIAL_TOTAL, -1)
+
+
+@receiver(post_save, sender=User)
+def count_user_on_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(stats.USER_TOTAL, 1)
+
+
+@receiver(post_delete, sender=User)
+def count_user_on_delete(sender, instance, **kwargs):
+    stats.bump(stats.USER_TOTAL, -1)
+
+
+# Technician stock ledger: approved requests add, used materials subtract
+
+def _request_stock(values):
+    """(technician_id, material_id, quantity) a request contributes, if any."""
+    if values and values['status'] == 'Approved':
+        return values['requester_id'], values['material_id'], values['quantity']
+    return None
+
+
+@receiver(post_save, sender=MaterialRequest)
+def update_stock_on_request_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = _request_stock(getattr(instance, '_old_values', None))
+    new = _request_stock({
+        'status': instance.status, 'requester_id': instance.requester_id,
+        'material_id': instance.material_id, 'quantity': instance.quantity,
+    })
+    if old == new:
+        return
+    if old:
+        ledger.adjust(old[0], old[1], -old[2])
+    if new:
+        ledger.adjust(new[0], new[1], new[2])
+
+
+@receiver(post_delete, sender=MaterialRequest)
+def update_stock_on_request_delete(sender, instance, **kwargs):
+    if instance.status == 'Approved':
+        ledger.adjust(instance.requester_id, instance.material_id, -instance.quantity, create=False)
+
+
+@receiver(post_save, sender=UsedMaterial)
+def update_stock_on_used_material_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_values', None)
+    if old and (old['technician_id'], old['material_id'], old['quantity']) == (
+            instance.technician_id, instance.material_id, instance.quantity):
+        return
+    if old:
+        ledger.adjust(old['technician_id'], old['material_id'], old['quantity'])
+    ledger.adjust(instance.technician_id, instance.material_id, -instance.quantity)
+
+
+@receiver(post_delete, sender=UsedMaterial)
+def update_stock_on_used_material_delete(sender, instance, **kwargs):
+    ledger.adjust(instance.technician_id, instance.material_id, instance.quantity, create=False)
+
+
+# Stock movement journal: every saved change to Material.quantity
+
+@receiver(post_save, sender=Material)
+def journal_quantity_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_values', None)
+    old_quantity = old['quantity'] if old else 0
+    context = getattr(instance, '_movement', None) or {'reason': 'create' if created else 'adjust'}
+    instance._movement = None
+    journal.record(instance.pk, (instance.quantity or 0) - (old_quantity or 0), instance.quantity, **context)
+
+
+@receiver(post_delete, sender=Material)
+def journal_material_delete(sender, instance, **kwargs):
+    journal.close(instance)
+
+
+# Daily rollups for reports: move each request/usage between its buckets
+
+@receiver(post_save, sender=MaterialRequest)
+def rollup_request_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    day = rollups.day_of(instance.requested_at)
+    rows = [(day, instance.material_id, instance.status, 1, instance.quantity)]
+    old = getattr(instance, '_old_values', None)
+    if old:
+        rows.append((day, old['material_id'], old['status'], -1, -old['quantity']))
+    rollups.add_requests(rows)
+
+
+@receiver(post_delete, sender=MaterialRequest)
+def rollup_request_on_delete(sender, instance, **kwargs):
+    rollups.add_requests(
+        [(rollups.day_of(instance.requested_at), instance.material_id, instance.status, -1, -instance.quantity)],
+        create=False,
+    )
+
+
+@receiver(post_save, sender=UsedMaterial)
+def rollup_usage_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    day = rollups.day_of(instance.added_at)
+    rows = [(day, instance.material_id, 1, instance.quantity)]
+    old = getattr(instance, '_old_values', None)
+    if old:
+        rows.append((day, old['material_id'], -1, -old['quantity']))
+    rollups.add_usage(rows)
+
+
+@receiver(post_delete, sender=UsedMaterial)
+def rollup_usage_on_delete(sender, instance, **kwargs):
+    rollups.add_usage(
+        [(rollups.day_of(instance.added_at), instance.material_id, -1, -instance.quantity)], create=False,
+    )
+
+
+# Search documents: re-index rows on write, and rows that embed their text
+
+SEARCH_ENTITIES = {
+    Material: 'material',
+    MaterialRequest: 'request',
+    Task: 'task',
+    UsedMaterial: 'used_material',
+}
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=MaterialRequest)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=UsedMaterial)
+def index_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.index(SEARCH_ENTITIES[sender], [instance.pk])
+    old = getattr(instance, '_old_values', None)
+    if sender is Material and old and old['name'] != instance.name:
+        search.index_dependents('Material', instance.pk)
+
+
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=MaterialRequest)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=UsedMaterial)
+def index_on_delete(sender, instance, **kwargs):
+    search.remove(SEARCH_ENTITIES[sender], [instance.pk])
+
+
+# Change counters behind conditional GETs (see versions.py)
+
+VERSIONED_TABLES = {
+    Material: versions.MATERIAL,
+    MaterialRequest: versions.REQUEST,
+    Task: versions.TASK,
+    UsedMaterial: versions.USED_MATERIAL,
+    User: versions.USER,
+    UserProfile: versions.USER,
+}
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=MaterialRequest)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=UsedMaterial)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=MaterialRequest)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=UsedMaterial)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=UserProfile)
+def bump_table_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no page shows
+    if raw or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    versions.bump(VERSIONED_TABLES[sender])
+
+
+# Delta-sync change log: one entry per write, tombstones for deletes and
+# for rows moved away from a technician
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=MaterialRequest)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=UsedMaterial)
+def log_change_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    entity = SEARCH_ENTITIES[sender]
+    owner = sync.owner_of(entity, instance)
+    rows = [(entity, instance.pk, owner, False)]
+    field = sync.ENTITIES[entity][3]
+    old = getattr(instance, '_old_values', None)
+    if field and old and old[field] != owner:
+        rows.insert(0, (entity, instance.pk, old[field], True))
+    sync.record_many(rows)
+
+
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=MaterialRequest)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=UsedMaterial)
+def log_change_on_delete(sender, instance, **kwargs):
+    entity = SEARCH_ENTITIES[sender]
+    sync.record(entity, instance.pk, sync.owner_of(entity, instance), deleted=True)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._old_username = None
+    if raw or instance.pk is None or (update_fields and 'username' not in update_fields):
+        return
+    instance._old_username = sender.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def index_on_username_change(sender, instance, created, raw=False, **kwargs):
+    old = getattr(instance, '_old_username', None)
+    if not raw and old and old != instance.username:
+        search.index_dependents('User', instance.pk)
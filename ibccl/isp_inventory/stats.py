@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import InventoryStat, Material, MaterialRequest, Task, UsedMaterial
+
+# Counter keys are "<entity>:<status>" plus "<entity>:total".
+MATERIAL_TOTAL = 'material:total'
+REQUEST_TOTAL = 'request:total'
+TASK_TOTAL = 'task:total'
+USED_MATERIAL_TOTAL = 'used_material:total'
+USER_TOTAL = 'user:total'
+
+
+def material_key(status):
+    return f'material:{status}'
+
+
+def request_key(status):
+    return f'request:{status}'
+
+
+def task_key(status):
+    return f'task:{status}'
+
+
+def bump(key, delta):
+    """Atomically add `delta` to the counter `key`, creating it if missing."""
+    if not delta:
+        return
+    now = timezone.now()
+    updated = InventoryStat.objects.filter(key=key).update(value=F('value') + delta, updated_at=now)
+    if updated == 0:
+        _, created = InventoryStat.objects.get_or_create(key=key, defaults={'value': delta})
+        if not created:
+            InventoryStat.objects.filter(key=key).update(value=F('value') + delta, updated_at=now)
+
+
+def move(old_key, new_key):
+    """Move one unit from `old_key` to `new_key` (status transition)."""
+    if old_key == new_key:
+        return
+    if old_key:
+        bump(old_key, -1)
+    if new_key:
+        bump(new_key, 1)
+
+
+def get_counts():
+    """Return every counter as a dict in a single query.
+
+    Missing keys read as 0 via `dict.get`; values are clamped at 0 so a
+    drifted counter never shows a negative number before a rebuild.
+    """
+    return {key: max(value, 0) for key, value in InventoryStat.objects.values_list('key', 'value')}
+
+
+async def aget_counts():
+    """Async get_counts()."""
+    return {key: max(value, 0) async for key, value in InventoryStat.objects.values_list('key', 'value')}
+
+
+def compute_counts():
+    """Recompute every counter from the source tables."""
+    counts = {
+        MATERIAL_TOTAL: 0,
+        REQUEST_TOTAL: 0,
+        TASK_TOTAL: 0,
+        USED_MATERIAL_TOTAL: UsedMaterial.objects.count(),
+        USER_TOTAL: User.objects.count(),
+    }
+    for model, key_func, total_key in (
+        (Material, material_key, MATERIAL_TOTAL),
+        (MaterialRequest, request_key, REQUEST_TOTAL),
+        (Task, task_key, TASK_TOTAL),
+    ):
+        for status, _ in model.STATUS_CHOICES:
+            counts[key_func(status)] = 0
+        for row in model.objects.values('status').annotate(n=Count('id')):
+            counts[key_func(row['status'])] = row['n']
+            counts[total_key] += row['n']
+    return counts
+
+
+def rebuild():
+    """Replace the summary table with freshly computed counters."""
+    counts = compute_counts()
+    with transaction.atomic():
+        InventoryStat.objects.all().delete()
+        InventoryStat.objects.bulk_create(
+            [InventoryStat(key=key, value=value) for key, value in counts.items()]
+        )
+    return counts
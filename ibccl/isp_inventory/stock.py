@@ -0,0 +1,129 @@
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Material
+from . import stats, journal, search, sync, versions
+
+
+class InsufficientStock(Exception):
+    """Raised when a decrement would take a material below zero."""
+
+    def __init__(self, shortages):
+        # shortages: list of (material name, available, requested)
+        self.shortages = shortages
+        super().__init__('; '.join(
+            f"Insufficient stock for {name}. Available: {available}, Requested: {requested}"
+            for name, available, requested in shortages
+        ))
+
+
+def _status_sql(new_quantity):
+    """SQL CASE mirroring Material.save()'s status rules for `new_quantity`."""
+    return (
+        f"CASE WHEN {new_quantity} <= 0 THEN 'Out of Stock' "
+        f"WHEN {new_quantity} < COALESCE(min_stock_level, 0) THEN 'Low Stock' "
+        f"WHEN status IN ('Reserved', 'Deprecated') THEN status "
+        f"ELSE 'Normal' END"
+    )
+
+
+def _update_sql(deltas):
+    """Build the single UPDATE ... RETURNING for {material_id: delta}.
+
+    Rows are returned as (id, name, quantity, status, old_status). On
+    PostgreSQL the old status comes from a CTE that locks the rows in
+    primary-key order; other backends return NULL for it.
+    """
+    table = connection.ops.quote_name(Material._meta.db_table)
+    ids = sorted(deltas)
+    delta_sql = 'CASE id ' + ' '.join('WHEN %s THEN %s' for _ in ids) + ' END'
+    delta_params = [value for pk in ids for value in (pk, deltas[pk])]
+    in_sql = ', '.join(['%s'] * len(ids))
+    new_quantity = f'(quantity + {delta_sql})'
+    # auto_now does not apply to raw SQL
+    set_sql = f"quantity = {new_quantity}, status = {_status_sql(new_quantity)}, updated_at = %s"
+    # Decrements may not go below zero; increments always apply
+    where_sql = f"id IN ({in_sql}) AND ({delta_sql} >= 0 OR {new_quantity} >= 0)"
+    # new_quantity appears three times in SET and once in WHERE
+    params = delta_params * 3 + [timezone.now()] + ids + delta_params * 2
+
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"WITH old AS (SELECT id AS old_id, status AS old_status FROM {table} "
+            f"WHERE id IN ({in_sql}) ORDER BY id FOR UPDATE) "
+            f"UPDATE {table} SET {set_sql} FROM old "
+            f"WHERE id = old.old_id AND {where_sql} "
+            f"RETURNING id, name, quantity, status, old.old_status"
+        )
+        return sql, ids + params
+    sql = f"UPDATE {table} SET {set_sql} WHERE {where_sql} RETURNING id, name, quantity, status, NULL"
+    return sql, params
+
+
+def adjust_many(changes, reason='adjust', user=None, reference=''):
+    """Apply many (material_id, delta) changes in a single UPDATE statement.
+
+    Deltas for the same material are summed. Quantity and status are
+    updated together and the new rows come back via RETURNING; status
+    counters and the movement journal are updated in the same
+    transaction, as are search documents whose status changed. Raises
+    InsufficientStock (and changes nothing) if any decrement would take
+    a material below zero, and ValueError for a `reason` outside
+    StockMovement.REASON_CHOICES.
+
+    Returns {material_id: {'name', 'quantity', 'status'}}.
+    """
+    journal.check_reason(reason)
+    deltas = defaultdict(int)
+    for material_id, delta in changes:
+        deltas[int(material_id)] += delta
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    with transaction.atomic():
+        old_status = {}
+        if connection.vendor != 'postgresql':
+            old_status = dict(
+                Material.objects.select_for_update().filter(pk__in=deltas).order_by('pk').values_list('pk', 'status')
+            )
+        sql, params = _update_sql(deltas)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        result = {}
+        status_changed = []
+        counters = Counter()
+        for pk, name, quantity, status, previous in rows:
+            result[pk] = {'name': name, 'quantity': quantity, 'status': status}
+            previous = previous or old_status.get(pk)
+            if previous and previous != status:
+                counters[stats.material_key(previous)] -= 1
+                counters[stats.material_key(status)] += 1
+                status_changed.append(pk)
+        for key, delta in counters.items():
+            stats.bump(key, delta)
+        journal.record_many(
+            [(pk, deltas[pk], row['quantity']) for pk, row in result.items()], reason, user, reference,
+        )
+        # Status is part of the material's search document
+        search.index('material', status_changed)
+        sync.record_many([('material', pk, None, False) for pk in result])
+        versions.bump(versions.MATERIAL)
+
+        if len(result) != len(deltas):
+            missing = [pk for pk in deltas if pk not in result]
+            shortages = [
+                (name, quantity, -deltas[pk])
+                for pk, name, quantity in Material.objects.filter(pk__in=missing).values_list('pk', 'name', 'quantity')
+            ]
+            if not shortages:
+                raise Material.DoesNotExist(f"Material not found: {', '.join(map(str, missing))}")
+            raise InsufficientStock(shortages)
+    return result
+
+
+def adjust(material_id, delta, reason='adjust', user=None, reference=''):
+    """Change one material's quantity by `delta`; see adjust_many()."""
+    return adjust_many([(material_id, delta)], reason, user, reference).get(int(material_id))
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import ChangeLog, Material, MaterialRequest, Task, UsedMaterial
+from .Serializer import MaterialSerializer, MaterialRequestSerializer, TaskSerializer, UsedMaterialSerializer
+
+# entity -> (model, serializer, select_related, owner field or None when every role syncs it)
+ENTITIES = {
+    'material': (Material, MaterialSerializer, (), None),
+    'request': (MaterialRequest, MaterialRequestSerializer, ('material', 'requester'), 'requester_id'),
+    'task': (Task, TaskSerializer, ('technician',), 'technician_id'),
+    'used_material': (UsedMaterial, UsedMaterialSerializer, ('technician', 'material'), 'technician_id'),
+}
+# Ids are handed out at insert but become visible at commit, so a fresh
+# entry may still have an uncommitted neighbour below it. Feeds stop
+# short of entries younger than this; writes to synced tables commit
+# well within it.
+SETTLE = timedelta(seconds=5)
+PAGE_SIZE = 500
+
+
+def owner_of(entity, instance):
+    field = ENTITIES[entity][3]
+    return getattr(instance, field) if field else None
+
+
+def record_many(rows):
+    """Log (entity, object_id, owner_id, deleted) writes in the caller's transaction."""
+    ChangeLog.objects.bulk_create([
+        ChangeLog(entity=entity, object_id=object_id, owner_id=owner_id, deleted=deleted)
+        for entity, object_id, owner_id, deleted in rows
+    ])
+
+
+def record(entity, object_id, owner_id=None, deleted=False):
+    record_many([(entity, object_id, owner_id, deleted)])
+
+
+def _stamp(created_at):
+    return int(created_at.timestamp() * 1_000_000)
+
+
+def _token(entry_id, created_at):
+    # The entry's id and timestamp: an id alone could be reissued after a restore
+    return f'{entry_id}.{_stamp(created_at)}' if entry_id else '0'
+
+
+def _parse(token):
+    """(entry id, microsecond stamp) from a token; ValueError if malformed."""
+    entry_id, _, stamp = token.partition('.')
+    entry_id, stamp = int(entry_id), int(stamp or 0)
+    if entry_id < 0 or (entry_id == 0) != (stamp == 0):
+        raise ValueError(token)
+    return entry_id, stamp
+
+
+def _valid(entry_id, stamp):
+    """Whether the log still holds every entry after the token's."""
+    if entry_id == 0:
+        # Issued before any entry settled: valid until the first one is pruned
+        return ChangeLog.objects.order_by('id').values_list('id', flat=True).first() in (None, 1)
+    created_at = ChangeLog.objects.filter(id=entry_id).values_list('created_at', flat=True).first()
+    return created_at is not None and _stamp(created_at) == stamp
+
+
+def changes(user, role, token=None, limit=PAGE_SIZE):
+    """The rows `user` syncs that changed after `token`.
+
+    Returns {'token', 'more', 'reset', 'changes': {entity: [row]},
+    'deleted': {entity: [id]}}. Technicians get materials plus their own
+    requests, tasks and used materials; a row moved to another
+    technician arrives as a tombstone. Each row appears once, in its
+    current state. Pass `token` back while `more` is set.
+
+    `reset` asks the client to reload everything through the list API,
+    then sync from the returned token: sent when there is no token yet,
+    and when the token's entry is no longer in the log (pruned, or lost
+    to a restore). Raises ValueError for a malformed token.
+    """
+    since = _parse(token) if token else None
+    # Settled entries: nothing below the horizon can still be uncommitted
+    horizon = (
+        ChangeLog.objects.filter(created_at__lt=timezone.now() - SETTLE)
+        .order_by('-id').values_list('id', 'created_at').first()
+    ) or (0, None)
+    if since is None or not _valid(*since):
+        return {'token': _token(*horizon), 'more': False, 'reset': True, 'changes': {}, 'deleted': {}}
+    since = since[0]
+
+    staff = role in ['Admin', 'Storekeeper']
+    entries = ChangeLog.objects.filter(id__gt=since, id__lte=horizon[0])
+    if not staff:
+        entries = entries.filter(Q(owner=user) | Q(owner__isnull=True))
+    entries = list(entries.order_by('id').values_list('id', 'created_at', 'entity', 'object_id', 'deleted')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}  # (entity, object_id) -> deleted, for the last entry of each row
+    for _, _, entity, object_id, deleted in entries:
+        latest[entity, object_id] = deleted
+    upserts, deleted = defaultdict(list), defaultdict(list)
+    for (entity, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else upserts)[entity].append(object_id)
+
+    result = {}
+    for entity, ids in upserts.items():
+        model, serializer, related, owner_field = ENTITIES[entity]
+        rows = model.objects.filter(pk__in=ids)
+        if related:
+            rows = rows.select_related(*related)
+        if owner_field and not staff:
+            rows = rows.filter(**{owner_field: user.pk})
+        result[entity] = serializer(rows.order_by('pk'), many=True).data
+        # Gone (or moved away) since it was logged: the next entry will say so
+        found = {row['id'] for row in result[entity]}
+        deleted[entity] += [pk for pk in ids if pk not in found]
+
+    if more:
+        token = _token(*entries[-1][:2])
+    elif horizon[0] > since:
+        token = _token(*horizon)
+    return {
+        'token': token,
+        'more': more,
+        'reset': False,
+        'changes': result,
+        'deleted': {entity: sorted(ids) for entity, ids in deleted.items()},
+    }
+
+
+def clear():
+    """Empty the log, so every client's next sync is a reset (after a restore)."""
+    ChangeLog.objects.all().delete()
+
+
+def prune(days=30):
+    """Delete log entries older than `days`; clients further behind get a reset."""
+    return ChangeLog.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
@@ -1,3 +1,1671 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from importlib import import_module
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest import mock, skipUnless
+from django.apps import apps as django_apps
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from .models import (
+    Material, MaterialRequest, Task, UsedMaterial, UserProfile, StockMovement, StockSnapshot, TechnicianStock, Vendor,
+    DailyRequestRollup, DailyUsageRollup, ChangeLog, InventoryStat, SearchDocument,
+)
+from .instrumentation import COLD_QUERY_BUDGETS, QUERY_BUDGETS, QueryRecorder, query_budget
+from .utils import (
+    ROLE_INVALIDATE_ALL_OVER, ensure_role_groups, get_user_role, invalidate_display_names, invalidate_user_roles,
+    reconcile_user_roles, role_cache_key,
+)
+from .approvals import bulk_process_requests
+from . import backups, benchmark, caching, fragments, journal, ledger, pdf, pdfwriter, rollups, search, seeding, stats, stock, sync
 
-# Create your tests here.
+
+def seed_workload(materials=150, requests=1500, tasks=300, used=600, days=90, users=None):
+    """Bulk-insert a realistic spread of rows for plan and budget tests.
+
+    Returns {'admin', 'storekeeper', 'technicians'}; pass it back as
+    `users` to add more rows for the same accounts. Rows are inserted
+    with bulk_create, which skips signals, so the summary counters,
+    technician balances, search documents and report rollups are
+    rebuilt explicitly.
+    """
+    if users is None:
+        groups = ensure_role_groups()
+        created = {}
+        for username, role in (('admin', 'Admin'), ('storekeeper', 'Storekeeper'),
+                               ('tech1', 'Technician'), ('tech2', 'Technician'), ('tech3', 'Technician')):
+            user = User.objects.create_user(username, password='pass')
+            UserProfile.objects.filter(user=user).update(role=role)
+            user.groups.set([groups[role]])
+            created[username] = user
+        users = {
+            'admin': created['admin'], 'storekeeper': created['storekeeper'],
+            'technicians': [created['tech1'], created['tech2'], created['tech3']],
+        }
+    technicians = users['technicians']
+    offset = Material.objects.count()
+
+    mats = Material.objects.bulk_create([
+        Material(
+            name=f'Material {offset + i:04d}', category=('Internet', 'Dish')[i % 2],
+            quantity=(i * 7) % 60, min_stock_level=10,
+            status=('Normal', 'Low Stock', 'Out of Stock')[i % 3],
+            added_by=('storekeeper', 'admin', 'tech1')[i % 3],
+        )
+        for i in range(materials)
+    ])
+    now = timezone.now()
+    reqs = MaterialRequest.objects.bulk_create([
+        MaterialRequest(
+            material=mats[i % materials], requester=technicians[i % 3], quantity=1 + i % 5,
+            status=('Pending', 'Approved', 'Rejected')[i % 3], user_note=f'Job {i}',
+        )
+        for i in range(requests)
+    ])
+    # auto_now_add ignores explicit values, so spread the history afterwards
+    for i, req in enumerate(reqs):
+        req.requested_at = now - timedelta(days=i % days, hours=i % 24)
+    MaterialRequest.objects.bulk_update(reqs, ['requested_at'], batch_size=500)
+    Task.objects.bulk_create([
+        Task(title=f'Install {i}', customer=f'Customer {i}', address=f'Road {i}',
+             technician=technicians[i % 3], status=('Pending', 'In Progress', 'Completed')[i % 3])
+        for i in range(tasks)
+    ])
+    UsedMaterial.objects.bulk_create([
+        UsedMaterial(technician=technicians[i % 3], material=mats[i % materials], quantity=1, address=f'Road {i}')
+        for i in range(used)
+    ])
+    StockMovement.objects.bulk_create([
+        StockMovement(material=mats[i % materials], delta=-1, quantity_after=i % 60, reason='use')
+        for i in range(requests)
+    ])
+    stats.rebuild()
+    ledger.rebuild()
+    search.rebuild()
+    rollups.rebuild()
+    return users
+
+
+class DerivedStateMixin:
+    """For paths that keep the derived tables in step by hand, without signals."""
+
+    def derived_state(self):
+        return {
+            'counts': {key: value for key, value in InventoryStat.objects.values_list('key', 'value') if value},
+            'balances': {
+                (t, m): q for t, m, q in TechnicianStock.objects.values_list('technician_id', 'material_id', 'quantity')
+                if q
+            },
+            'request_rollups': sorted(
+                DailyRequestRollup.objects.exclude(requests=0)
+                .values_list('day', 'material_id', 'status', 'requests', 'quantity')
+            ),
+            'usage_rollups': sorted(
+                DailyUsageRollup.objects.exclude(entries=0).values_list('day', 'material_id', 'entries', 'quantity')
+            ),
+            'search': sorted(SearchDocument.objects.values_list('entity', 'object_id', 'body')),
+        }
+
+    def assertMatchesRebuild(self):
+        """Counters, balances, rollups and search documents equal a fresh rebuild."""
+        incremental = self.derived_state()
+        self.assertEqual(incremental['counts'], {k: v for k, v in stats.compute_counts().items() if v})
+        self.assertEqual(incremental['balances'], {k: v for k, v in ledger.compute_balances().items() if v})
+        rollups.rebuild()
+        search.rebuild()
+        self.assertEqual(incremental, self.derived_state())
+
+
+class SettingsPageTests(TestCase):
+    def setUp(self):
+        groups = ensure_role_groups()
+        self.admin = User.objects.create_user('admin', password='pass')
+        UserProfile.objects.filter(user=self.admin).update(role='Admin')
+        self.admin.groups.set([groups['Admin']])
+        self.client.force_login(self.admin)
+
+    def add_users(self, count):
+        groups = ensure_role_groups()
+        for i in range(User.objects.count(), User.objects.count() + count):
+            user = User.objects.create_user(f'user{i}')
+            user.groups.set([groups['Technician']])
+
+    def test_queries_do_not_grow_with_users(self):
+        self.add_users(2)
+        self.client.get(reverse('settings'))
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(reverse('settings'))
+        self.assertContains(response, 'Groups: Technician')
+        self.add_users(20)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('settings'))
+        self.assertContains(response, 'Groups: Technician', count=22)
+        self.assertEqual(len(many), len(few))
+
+    def test_reconcile_on_demand(self):
+        stray = User.objects.create_user('stray')
+        UserProfile.objects.filter(user=stray).delete()
+        stray.groups.clear()
+        response = self.client.get(reverse('settings'))
+        self.assertContains(response, 'name="action" value="reconcile_roles"')
+
+        response = self.client.post(reverse('settings'), {'action': 'reconcile_roles'}, follow=True)
+        self.assertContains(response, 'Roles reconciled: 1 profiles created, 1 users added to a role group.')
+        self.assertEqual(UserProfile.objects.get(user=stray).role, 'Technician')
+        self.assertEqual(list(stray.groups.values_list('name', flat=True)), ['Technician'])
+
+
+class StatsTests(DerivedStateMixin, TestCase):
+    """Signal-maintained status counters always equal a rebuild."""
+
+    def setUp(self):
+        self.tech = User.objects.create_user('tech', password='pass')
+        self.cable = Material.objects.create(name='Cable', category='Internet', quantity=20, min_stock_level=5)
+
+    def assertCountsMatch(self):
+        self.assertMatchesRebuild()
+        incremental = {key: value for key, value in stats.get_counts().items() if value}
+        stats.rebuild()
+        self.assertEqual(incremental, {key: value for key, value in stats.get_counts().items() if value})
+
+    def test_counters_follow_saves_and_deletes(self):
+        onu = Material.objects.create(name='ONU', category='Internet', quantity=2, min_stock_level=5)
+        self.assertEqual(onu.status, 'Low Stock')
+        for quantity in (0, 8, 3):
+            onu.quantity = quantity
+            onu.save()
+            self.assertCountsMatch()
+
+        req = MaterialRequest.objects.create(material=self.cable, requester=self.tech, quantity=2)
+        self.assertCountsMatch()
+        for status in ('Approved', 'Rejected', 'Pending'):
+            req.status = status
+            req.save()
+            self.assertCountsMatch()
+
+        task = Task.objects.create(title='Install', customer='Acme', address='Main St', technician=self.tech)
+        for status in ('In Progress', 'Completed'):
+            task.status = status
+            task.save()
+            self.assertCountsMatch()
+
+        used = UsedMaterial.objects.create(technician=self.tech, material=onu, quantity=1)
+        used.status = 'Accepted'
+        used.save()
+        self.assertCountsMatch()
+
+        for obj in (task, req, used):
+            obj.delete()
+            self.assertCountsMatch()
+        # Cascades count each deleted request and usage too
+        MaterialRequest.objects.create(material=onu, requester=self.tech, quantity=1, status='Approved')
+        UsedMaterial.objects.create(technician=self.tech, material=onu, quantity=1)
+        onu.delete()
+        self.assertCountsMatch()
+        self.assertEqual(stats.get_counts()[stats.MATERIAL_TOTAL], 1)
+
+
+class LedgerTests(TestCase):
+    """Signal-maintained technician balances always equal compute_balances()."""
+
+    def setUp(self):
+        self.tech = User.objects.create_user('tech', password='pass')
+        self.other = User.objects.create_user('other', password='pass')
+        self.cable = Material.objects.create(name='Cable', category='Internet', quantity=100)
+        self.onu = Material.objects.create(name='ONU', category='Internet', quantity=100)
+
+    def assertBalancesMatch(self):
+        stored = {
+            (t, m): q for t, m, q in TechnicianStock.objects.values_list('technician_id', 'material_id', 'quantity')
+            if q
+        }
+        self.assertEqual(stored, {key: q for key, q in ledger.compute_balances().items() if q})
+
+    def test_request_approve_reject_delete(self):
+        req = MaterialRequest.objects.create(material=self.cable, requester=self.tech, quantity=4)
+        self.assertEqual(ledger.balance(self.tech, self.cable), 0)
+        req.status = 'Approved'
+        req.save()
+        self.assertEqual(ledger.balance(self.tech, self.cable), 4)
+        self.assertBalancesMatch()
+
+        req.quantity = 6
+        req.save()
+        self.assertEqual(ledger.balance(self.tech, self.cable), 6)
+        req.requester, req.material = self.other, self.onu
+        req.save()
+        self.assertEqual((ledger.balance(self.tech, self.cable), ledger.balance(self.other, self.onu)), (0, 6))
+        self.assertBalancesMatch()
+
+        req.status = 'Rejected'
+        req.save()
+        self.assertEqual(ledger.balance(self.other, self.onu), 0)
+        self.assertBalancesMatch()
+
+        req.status = 'Approved'
+        req.save()
+        req.delete()
+        self.assertEqual(ledger.balance(self.other, self.onu), 0)
+        self.assertBalancesMatch()
+
+    def test_used_material_edits(self):
+        for material in (self.cable, self.onu):
+            MaterialRequest.objects.create(material=material, requester=self.tech, quantity=5, status='Approved')
+        used = UsedMaterial.objects.create(technician=self.tech, material=self.cable, quantity=2, address='Road 1')
+        self.assertEqual(ledger.balance(self.tech, self.cable), 3)
+
+        used.quantity = 3
+        used.save()
+        self.assertEqual(ledger.balance(self.tech, self.cable), 2)
+        used.material = self.onu
+        used.save()
+        self.assertEqual((ledger.balance(self.tech, self.cable), ledger.balance(self.tech, self.onu)), (5, 2))
+        used.technician = self.other
+        used.save()
+        self.assertEqual((ledger.balance(self.tech, self.onu), ledger.balance(self.other, self.onu)), (5, -3))
+        self.assertBalancesMatch()
+
+        used.delete()
+        self.assertEqual(ledger.balance(self.other, self.onu), 0)
+        self.assertBalancesMatch()
+
+        # Cascading deletes never re-create balance rows
+        self.onu.delete()
+        self.assertFalse(TechnicianStock.objects.filter(material_id=self.onu.pk).exists())
+        self.assertBalancesMatch()
+
+    def test_adjust_many_upserts(self):
+        ledger.adjust_many({(self.tech.pk, self.cable.pk): 3, (self.tech.pk, self.onu.pk): 0, (None, self.onu.pk): 2})
+        self.assertEqual(
+            list(TechnicianStock.objects.values_list('technician_id', 'material_id', 'quantity')),
+            [(self.tech.pk, self.cable.pk, 3)],
+        )
+        ledger.adjust_many({(self.tech.pk, self.cable.pk): -1, (self.other.pk, self.onu.pk): 4})
+        self.assertEqual((ledger.balance(self.tech, self.cable), ledger.balance(self.other, self.onu)), (2, 4))
+        self.assertEqual(ledger.total(self.tech), 2)
+        self.assertEqual(TechnicianStock.objects.count(), 2)
+
+
+class JournalTests(TestCase):
+    def test_history_survives_material_delete(self):
+        cable = Material.objects.create(name='Cable', category='Internet', quantity=10)
+        before_adjust = timezone.now()
+        stock.adjust(cable.pk, 5, 'adjust')
+        journal.take_snapshot(timezone.localdate())
+        before_delete = timezone.now()
+        pk = cable.pk
+        cable.delete()
+
+        self.assertEqual(journal.inventory_at(before_adjust), {pk: 10})
+        self.assertEqual(journal.inventory_at(before_delete), {pk: 15})
+        self.assertEqual(journal.inventory_at(timezone.now()), {pk: 0})
+        self.assertEqual(StockSnapshot.objects.get(material_id=pk).quantity, 15)
+        movements = StockMovement.objects.filter(material_id=pk).order_by('pk')
+        self.assertEqual(
+            [(m.reason, m.delta, m.quantity_after, m.material_label) for m in movements],
+            [('create', 10, 10, 'Cable'), ('adjust', 5, 15, 'Cable'), ('delete', -15, 0, 'Cable')],
+        )
+        # Report lists join the material and still show its movements
+        self.assertEqual(
+            [m.material_label for m in StockMovement.objects.select_related('material').order_by('pk')],
+            ['Cable'] * 3,
+        )
+        # A snapshot taken after the delete has no row for it
+        journal.take_snapshot(timezone.localdate() + timedelta(days=1))
+        self.assertFalse(StockSnapshot.objects.filter(day=timezone.localdate() + timedelta(days=1)).exists())
+
+
+class BulkApprovalTests(DerivedStateMixin, TestCase):
+    def setUp(self):
+        self.tech = User.objects.create_user('tech', password='pass')
+        self.other = User.objects.create_user('other', password='pass')
+        self.admin = User.objects.create_user('admin', password='pass')
+        self.cable = Material.objects.create(name='Cable', category='Internet', quantity=10, min_stock_level=3)
+        self.onu = Material.objects.create(name='ONU', category='Internet', quantity=3, min_stock_level=1)
+        self.reqs = [
+            MaterialRequest.objects.create(material=material, requester=requester, quantity=quantity)
+            for material, requester, quantity in (
+                (self.cable, self.tech, 4), (self.cable, self.other, 5), (self.cable, self.tech, 4),
+                (self.onu, self.other, 2), (self.onu, self.tech, 5),
+            )
+        ]
+
+    def process(self, indexes, action, **kwargs):
+        ids = [self.reqs[i].pk for i in indexes]
+        return {row['id']: row for row in bulk_process_requests(ids, action, self.admin, **kwargs)}
+
+    def test_approve_leaves_short_requests_pending(self):
+        results = self.process(range(5), 'approve', note='Batch')
+        self.assertEqual(
+            [results[req.pk]['result'] for req in self.reqs], ['approved', 'approved', 'failed', 'approved', 'failed'],
+        )
+        self.assertIn('Available: 1, Requested: 4', results[self.reqs[2].pk]['reason'])
+        self.assertEqual(
+            list(MaterialRequest.objects.order_by('pk').values_list('status', 'admin_note')),
+            [('Approved', 'Batch'), ('Approved', 'Batch'), ('Pending', ''), ('Approved', 'Batch'), ('Pending', '')],
+        )
+        self.cable.refresh_from_db()
+        self.onu.refresh_from_db()
+        self.assertEqual((self.cable.quantity, self.cable.status), (1, 'Low Stock'))
+        self.assertEqual((self.onu.quantity, self.onu.status), (1, 'Normal'))
+        self.assertEqual(ledger.balance(self.tech, self.cable), 4)
+        self.assertEqual(ledger.balance(self.other, self.onu), 2)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(reason='approve').values_list('material_id', 'delta', 'quantity_after')),
+            sorted([(self.cable.pk, -9, 1), (self.onu.pk, -2, 1)]),
+        )
+        self.assertMatchesRebuild()
+
+        # Already approved requests are skipped; unknown ids fail
+        results = self.process([0], 'approve')
+        self.assertEqual(results[self.reqs[0].pk]['result'], 'skipped')
+        missing = bulk_process_requests([10 ** 6], 'approve')
+        self.assertEqual((missing[0]['result'], missing[0]['reason']), ('failed', 'Request not found.'))
+
+    def test_partial_fills_use_what_is_left(self):
+        results = self.process(range(5), 'approve', allow_partial=True)
+        self.assertEqual(
+            [(results[req.pk]['result'], results[req.pk]['quantity']) for req in self.reqs],
+            [('approved', 4), ('approved', 5), ('partial', 1), ('approved', 2), ('partial', 1)],
+        )
+        self.assertEqual(MaterialRequest.objects.get(pk=self.reqs[2].pk).quantity, 1)
+        self.cable.refresh_from_db()
+        self.onu.refresh_from_db()
+        self.assertEqual((self.cable.quantity, self.cable.status), (0, 'Out of Stock'))
+        self.assertEqual((self.onu.quantity, self.onu.status), (0, 'Out of Stock'))
+        self.assertEqual(ledger.balance(self.tech, self.cable), 5)
+        self.assertMatchesRebuild()
+
+    def test_reject_returns_approved_stock(self):
+        self.process([0, 3], 'approve')
+        results = self.process([0, 1, 3], 'reject', note='Cancelled')
+        self.assertEqual([results[self.reqs[i].pk]['result'] for i in (0, 1, 3)], ['rejected'] * 3)
+        self.assertEqual(results[self.reqs[0].pk]['reason'], '4 units returned to Cable.')
+        self.assertEqual(results[self.reqs[1].pk]['reason'], '')
+        self.cable.refresh_from_db()
+        self.onu.refresh_from_db()
+        self.assertEqual((self.cable.quantity, self.onu.quantity), (10, 3))
+        self.assertEqual(ledger.balance(self.tech, self.cable), 0)
+        self.assertEqual(stats.get_counts()[stats.request_key('Rejected')], 3)
+        self.assertMatchesRebuild()
+
+        results = self.process([0], 'reject')
+        self.assertEqual(results[self.reqs[0].pk]['result'], 'skipped')
+        with self.assertRaises(ValueError):
+            bulk_process_requests([self.reqs[0].pk], 'archive')
+
+
+class StockUpdateTests(DerivedStateMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('storekeeper', password='pass')
+        self.cable = Material.objects.create(name='Cable', category='Internet', quantity=10, min_stock_level=5)
+        self.onu = Material.objects.create(name='ONU', category='Internet', quantity=2, min_stock_level=1)
+
+    def test_batch_moves_quantity_status_journal_and_counters(self):
+        result = stock.adjust_many(
+            [(self.cable.pk, -3), (self.onu.pk, -2), (self.cable.pk, -3)], 'use', self.user, 'JOB-7',
+        )
+        self.assertEqual(result, {
+            self.cable.pk: {'name': 'Cable', 'quantity': 4, 'status': 'Low Stock'},
+            self.onu.pk: {'name': 'ONU', 'quantity': 0, 'status': 'Out of Stock'},
+        })
+        self.cable.refresh_from_db()
+        self.assertEqual((self.cable.quantity, self.cable.status), (4, 'Low Stock'))
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(reason='use').values_list('material_id', 'delta', 'quantity_after', 'user', 'reference')),
+            sorted([(self.cable.pk, -6, 4, self.user.pk, 'JOB-7'), (self.onu.pk, -2, 0, self.user.pk, 'JOB-7')]),
+        )
+        counts = stats.get_counts()
+        self.assertEqual(counts[stats.material_key('Normal')], 0)
+        self.assertEqual((counts[stats.material_key('Low Stock')], counts[stats.material_key('Out of Stock')]), (1, 1))
+        self.assertEqual(search.search('material', 'cable low'), [self.cable.pk])
+        self.assertMatchesRebuild()
+
+    def test_unknown_reason_changes_nothing(self):
+        with self.assertRaises(ValueError):
+            stock.adjust_many([(self.cable.pk, -3)], 'issue')
+        with self.assertRaises(ValueError):
+            journal.record_many([(self.cable.pk, -3, 7)], 'issue')
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.quantity, 10)
+        self.assertFalse(StockMovement.objects.exclude(reason='create').exists())
+
+    def test_shortage_changes_nothing(self):
+        before = (
+            list(Material.objects.order_by('pk').values_list('quantity', 'status', 'updated_at')),
+            StockMovement.objects.count(), stats.get_counts(),
+        )
+        with self.assertRaises(stock.InsufficientStock) as raised:
+            stock.adjust_many([(self.cable.pk, -4), (self.onu.pk, -3)])
+        self.assertEqual(raised.exception.shortages, [('ONU', 2, 3)])
+        after = (
+            list(Material.objects.order_by('pk').values_list('quantity', 'status', 'updated_at')),
+            StockMovement.objects.count(), stats.get_counts(),
+        )
+        self.assertEqual(after, before)
+        with self.assertRaises(Material.DoesNotExist):
+            stock.adjust(10 ** 6, 1)
+
+    def test_status_follows_material_save(self):
+        # (status before, quantity before, min stock level, delta)
+        cases = [
+            ('Normal', 10, 5, -6), ('Normal', 10, 5, -10), ('Low Stock', 3, 5, 2), ('Out of Stock', 0, 5, 1),
+            ('Out of Stock', 0, 5, 9), ('Reserved', 10, 5, -1), ('Reserved', 10, 5, -6), ('Reserved', 10, 5, -10),
+            ('Deprecated', 8, 5, 4), ('Normal', 4, 0, -4), ('Low Stock', 1, 2, 1),
+        ]
+        for i, (status, quantity, level, delta) in enumerate(cases):
+            with self.subTest(status=status, quantity=quantity, level=level, delta=delta):
+                updated, saved = [
+                    Material.objects.create(name=f'{kind} {i}', quantity=quantity, min_stock_level=level)
+                    for kind in ('Updated', 'Saved')
+                ]
+                # Set the starting status as stored, past save()'s rules
+                Material.objects.filter(pk__in=[updated.pk, saved.pk]).update(status=status)
+                stock.adjust(updated.pk, delta)
+                saved.refresh_from_db()
+                saved.quantity += delta
+                saved.save()
+                updated.refresh_from_db()
+                self.assertEqual(updated.status, saved.status)
+
+
+class SearchTests(TestCase):
+    """Prefix matching, ranking and index upkeep of search.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=search.SEARCH_LIMIT + 20, requests=0, tasks=0, used=0)
+        cls.splitter = Material.objects.create(
+            name='Fibre splitter 1x8', category='Internet', quantity=4, min_stock_level=2, notes='PLC cassette',
+        )
+
+    def test_terms_match_as_word_prefixes(self):
+        self.assertEqual(search.search('material', 'split'), [self.splitter.pk])
+        self.assertEqual(search.search('material', 'fib SPLIT cass'), [self.splitter.pk])
+        self.assertEqual(search.search('material', 'splitter coax'), [])
+        self.assertEqual(search.search('material', '  '), [])
+
+    def test_list_searches_cover_every_match(self):
+        matches = Material.objects.filter(name__startswith='Material').count()
+        self.assertGreater(matches, search.SEARCH_LIMIT)
+        self.assertEqual(len(search.search('material', 'material')), search.SEARCH_LIMIT)
+        qs = search.filter_queryset(Material.objects.all(), 'material', 'material')
+        self.assertEqual(qs.count(), matches)
+        self.assertTrue(all(row.search_rank is not None for row in qs[:5]))
+        # Keyset pages of a searched modal reach past the first SEARCH_LIMIT ids
+        oldest = list(Material.objects.order_by('pk').values_list('pk', flat=True)[:10])
+        self.client.force_login(self.users['admin'])
+        response = self.client.get(
+            reverse('dashboard_modal', args=['materials']), {'search': 'material', 'before': oldest[-1]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['html'].count('<tr'), 9)
+
+    def test_best_match_first(self):
+        cable = Material.objects.create(name='Splitter splitter', category='Dish', quantity=1, min_stock_level=1)
+        ranked = search.filter_queryset(Material.objects.all(), 'material', 'splitter')
+        self.assertEqual(list(ranked), [cable, self.splitter])
+        self.assertEqual(search.search('material', 'splitter'), [cable.pk, self.splitter.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram similarity needs pg_trgm')
+    def test_typos_match_by_similarity(self):
+        self.assertEqual(search.search('material', 'spliter'), [self.splitter.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        tech = self.users['technicians'][0]
+        req = MaterialRequest.objects.create(material=self.splitter, requester=tech, quantity=1)
+        self.assertEqual(search.search('request', 'fibre'), [req.pk])
+
+        self.splitter.name = 'Optical divider'
+        self.splitter.save()
+        self.assertEqual(search.search('material', 'splitter'), [])
+        self.assertEqual(search.search('material', 'optical'), [self.splitter.pk])
+        # Documents embedding the material's name are refreshed too
+        self.assertEqual(search.search('request', 'optical'), [req.pk])
+
+        tech.username = 'field_lead'
+        tech.save()
+        self.assertEqual(search.search('request', 'field_lead'), [req.pk])
+
+        pk = self.splitter.pk
+        self.splitter.delete()
+        self.assertEqual(search.search('material', 'optical'), [])
+        self.assertFalse(SearchDocument.objects.filter(entity='material', object_id=pk).exists())
+
+    def test_substring_fallback_without_fts(self):
+        with mock.patch.object(search, 'fts_available', return_value=False), \
+                mock.patch.object(connection, 'vendor', 'other'):
+            self.assertEqual(search.search('material', 'litter cass'), [self.splitter.pk])
+            qs = search.filter_queryset(Material.objects.all(), 'material', 'material')
+            self.assertEqual(qs.count(), Material.objects.filter(name__startswith='Material').count())
+            self.assertEqual(qs.first().pk, Material.objects.filter(name__startswith='Material').latest('pk').pk)
+
+    def test_migration_builds_the_same_documents(self):
+        migration = import_module('isp_inventory.migrations.0018_searchdocument')
+        seed_workload(materials=2, requests=10, tasks=5, used=5, users=self.users)
+        documents = SearchDocument.objects.order_by('entity', 'object_id').values_list('entity', 'object_id', 'body')
+        search.rebuild()
+        expected = list(documents)
+        SearchDocument.objects.all().delete()
+        migration.build_documents(django_apps, None)
+        self.assertEqual(list(documents), expected)
+
+
+# Tables large enough that a filtered query must never read them in full
+HOT_TABLES = {
+    model._meta.db_table
+    for model in (Material, MaterialRequest, Task, UsedMaterial, StockMovement, TechnicianStock)
+}
+
+
+def full_scans(sql):
+    """Return the hot tables that the plan for `sql` reads with a full scan.
+
+    Only statements with a WHERE clause are checked: listing a whole
+    table is a full scan by design. On PostgreSQL sequential scans are
+    disabled for the check, so a Seq Scan in the plan means no index
+    could serve the query at all.
+    """
+    if ' WHERE ' not in sql or not sql.lstrip().upper().startswith('SELECT'):
+        return set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql)
+            plan = [row[0] for row in cursor.fetchall()]
+            pattern = re.compile(r'Seq Scan on "?(\w+)"?')
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+            # "SCAN table" without "USING (COVERING) INDEX" reads every row
+            pattern = re.compile(r'^SCAN "?(\w+)"?(?: AS \w+)?$')
+    # Subqueries alias their tables ("FROM table U0"); map aliases back
+    aliases = {alias: table for table, alias in re.findall(r'(?:FROM|JOIN) "?(\w+)"? (?:AS )?"?(\w+)"?', sql)}
+    scanned = {match.group(1) for line in plan for match in [pattern.search(line.strip())] if match}
+    return {aliases.get(name, name) for name in scanned} & HOT_TABLES
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN every query behind each page so a dropped index shows up as a full scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload()
+
+    def assertIndexedQueries(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertIn(response.status_code, (200, 302), url)
+        for query in ctx.captured_queries:
+            scans = full_scans(query['sql'])
+            self.assertFalse(scans, f"{url} scans {', '.join(sorted(scans))}:\n{query['sql']}")
+
+    def test_admin_pages(self):
+        admin = self.users['admin']
+        today = timezone.now().date()
+        for url in (
+            reverse('dashboard'),
+            reverse('materials') + '?stock_status=low&category=Internet',
+            reverse('requests'),
+            reverse('requests') + '?search=material 0001',
+            reverse('tasks'),
+            reverse('reports') + f'?from_date={today - timedelta(days=7)}&to_date={today}',
+            reverse('settings'),
+            reverse('dashboard_modal', args=['requests']),
+            reverse('dashboard_modal', args=['tasks']) + '?search=install',
+            reverse('inventory_at'),
+        ):
+            with self.subTest(url=url):
+                self.assertIndexedQueries(admin, url)
+
+    def test_storekeeper_pages(self):
+        for url in (reverse('materials'), reverse('materials') + '?search=material', reverse('requests')):
+            with self.subTest(url=url):
+                self.assertIndexedQueries(self.users['storekeeper'], url)
+
+    def test_technician_pages(self):
+        tech = self.users['technicians'][0]
+        for url in (
+            reverse('dashboard'),
+            reverse('materials'),
+            reverse('tasks'),
+            reverse('used_materials'),
+            reverse('used_materials') + '?search=road',
+            reverse('technician_stock'),
+            reverse('dashboard_modal', args=['materials']),
+            reverse('dashboard_modal', args=['advance']),
+        ):
+            with self.subTest(url=url):
+                self.assertIndexedQueries(tech, url)
+
+    def test_report_date_range_uses_expression_index(self):
+        today = timezone.now().date()
+        qs = MaterialRequest.objects.filter(
+            requested_at__date__gte=today - timedelta(days=7), requested_at__date__lte=today,
+        )
+        # Explain the statement as sent (parameters inlined, as client-side
+        # binding does on PostgreSQL) so the TruncDate expression can match
+        with CaptureQueriesContext(connection) as ctx:
+            qs.count()
+        sql = ctx.captured_queries[-1]['sql']
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('matreq_requested_day_idx', plan)
+
+
+class RollupTests(TestCase):
+    """Signal-maintained daily rollups always equal a fresh rebuild."""
+
+    def snapshot(self):
+        return (
+            sorted(DailyRequestRollup.objects.exclude(requests=0).values_list('day', 'material_id', 'status', 'requests', 'quantity')),
+            sorted(DailyUsageRollup.objects.exclude(entries=0).values_list('day', 'material_id', 'entries', 'quantity')),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_incremental_updates_match_rebuild(self):
+        tech = User.objects.create_user('tech', password='pass')
+        cable = Material.objects.create(name='Cable', quantity=100)
+        onu = Material.objects.create(name='ONU', quantity=100)
+        reqs = [MaterialRequest.objects.create(material=cable, requester=tech, quantity=n) for n in (1, 2, 3, 4)]
+        used = UsedMaterial.objects.create(technician=tech, material=onu, quantity=2, address='Road 1')
+        self.assertMatchesRebuild()
+
+        bulk_process_requests([reqs[0].pk, reqs[1].pk], 'approve')
+        bulk_process_requests([reqs[2].pk], 'reject')
+        reqs[3].material, reqs[3].quantity = onu, 6
+        reqs[3].save()
+        used.quantity = 5
+        used.save()
+        self.assertMatchesRebuild()
+
+        MaterialRequest.objects.get(pk=reqs[0].pk).delete()
+        used.delete()
+        self.assertMatchesRebuild()
+
+        today = timezone.localdate()
+        summary = rollups.summary(today, today)
+        self.assertEqual(summary['total_requests'], 3)
+        self.assertEqual(summary['approved_count'], 1)
+        self.assertEqual(summary['pending_count'], 1)
+        self.assertEqual(summary['total_used'], 2)
+        self.assertEqual(rollups.summary(today - timedelta(days=30), today - timedelta(days=1))['total_requests'], 0)
+
+        # A material delete cascades through its requests without recreating rollups
+        onu.delete()
+        self.assertFalse(DailyRequestRollup.objects.filter(material_id=onu.pk).exists())
+
+    def test_rebuild_range_leaves_other_days(self):
+        seed_workload(materials=10, requests=90, tasks=0, used=0, days=30)
+        today = timezone.localdate()
+        before = self.snapshot()
+        DailyRequestRollup.objects.all().update(requests=0)
+        call_command('rebuild_rollups', '--from', str(today - timedelta(days=6)), '--to', str(today), stdout=StringIO())
+        kept = DailyRequestRollup.objects.exclude(requests=0)
+        self.assertTrue(kept.exists())
+        self.assertFalse(kept.filter(day__lt=today - timedelta(days=6)).exists())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=10, requests=50, tasks=0, used=20, days=10)
+
+    def export(self, **params):
+        self.client.force_login(self.users['admin'])
+        today = timezone.localdate()
+        params = {'from_date': str(today - timedelta(days=30)), 'to_date': str(today), **params}
+        return self.client.get(reverse('reports_export'), params)
+
+    def test_csv_streams_every_row_in_range(self):
+        response = self.export(format='csv', type='requests')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['ID', 'Requested At', 'Technician'])
+        self.assertEqual(len(lines) - 1, MaterialRequest.objects.count())
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        response = self.export(format='csv', type='requests', from_date=str(yesterday), to_date=str(yesterday))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines) - 1, rollups.summary(yesterday, yesterday)['total_requests'])
+
+    def test_xlsx_has_a_sheet_per_table(self):
+        response = self.export(format='xlsx')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Material Requests', 'Used Materials', 'Stock Movements'])
+        self.assertEqual(workbook['Material Requests'].max_row - 1, MaterialRequest.objects.count())
+        self.assertEqual(workbook['Used Materials'].max_row - 1, UsedMaterial.objects.count())
+        self.assertEqual(workbook['Stock Movements'].max_row - 1, StockMovement.objects.count())
+
+    def test_movements_csv_names_deleted_materials(self):
+        material = Material.objects.create(name='Spare Splitter', category='Internet', quantity=4)
+        material.delete()
+        response = self.export(format='csv', type='movements')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[2:4], ['Material', 'Change'])
+        self.assertEqual(len(lines) - 1, StockMovement.objects.count())
+        self.assertEqual(lines[-1].split(',')[2:5], ['Spare Splitter', '-4', '0'])
+
+    def test_technicians_cannot_export(self):
+        self.client.force_login(self.users['technicians'][0])
+        self.assertEqual(self.client.get(reverse('reports_export')).status_code, 403)
+
+
+def kill_worker(*args):
+    """Stands in for pdfwriter.write_pdf: the pool process dies mid-render."""
+    os._exit(1)
+
+
+@contextmanager
+def pdf_directory():
+    """Render PDF reports into a throwaway directory."""
+    # Renders finishing after the test may still write into it
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+        with override_settings(REPORT_PDF_DIR=directory, REPORT_PDF_WORKERS=1):
+            yield directory
+
+
+class PdfReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=5, requests=30, tasks=0, used=10, days=10)
+
+    def setUp(self):
+        self.enterContext(pdf_directory())
+        self.client.force_login(self.users['admin'])
+        self.url = reverse('reports_pdf') + f'?from_date={timezone.localdate() - timedelta(days=7)}'
+
+    def wait_for(self, url):
+        for _ in range(300):
+            response = self.client.get(url)
+            if response.status_code != 202:
+                return response
+            time.sleep(0.1)
+        self.fail(f'{url} still rendering')
+
+    def test_render_once_then_serve_from_disk(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        file_url = response.json()['url']
+        self.assertEqual(response['Location'], file_url)
+        # A second request while rendering shares the same render
+        self.assertEqual(self.client.get(self.url).json()['url'], file_url)
+
+        response = self.wait_for(file_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with mock.patch.object(pdf, 'render_html') as render:
+            self.assertRedirects(self.client.get(self.url), file_url, fetch_redirect_response=False)
+        render.assert_not_called()
+
+    def test_a_dead_worker_fails_the_render_and_the_pool_recovers(self):
+        key = pdf.report_key(timezone.localdate() - timedelta(days=7), timezone.localdate())
+        with mock.patch.object(pdfwriter, 'write_pdf', kill_worker):
+            self.assertEqual(self.client.get(self.url).status_code, 202)
+            for _ in range(300):
+                if pdf.status(key) != 'rendering':
+                    break
+                time.sleep(0.1)
+        self.assertEqual(pdf.status(key), 'failed')
+        self.assertFalse(os.path.exists(pdf.path(key, '.pending')))
+        with open(pdf.path(key, '.error')) as marker:
+            self.assertIn('BrokenProcessPool', marker.read())
+        self.assertIsNone(pdf._executor)
+
+        # The next request retries in a new pool
+        response = self.wait_for(self.client.get(self.url).json()['url'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_data_gets_a_new_key(self):
+        today = timezone.localdate()
+        recent, older = (today - timedelta(days=7), today), (today - timedelta(days=30), today - timedelta(days=20))
+        before = pdf.report_key(*recent), pdf.report_key(*older)
+        MaterialRequest.objects.create(material=Material.objects.first(), requester=self.users['technicians'][0], quantity=1)
+        self.assertNotEqual(pdf.report_key(*recent), before[0])
+        # Days outside the range do not affect it
+        self.assertEqual(pdf.report_key(*older), before[1])
+
+    def test_edits_that_keep_the_totals_get_a_new_key(self):
+        today = timezone.localdate()
+        reqs = list(MaterialRequest.objects.filter(requested_at__date=today).order_by('pk')[:2])
+        material = reqs[0].material
+
+        def changes_key(edit):
+            key = pdf.report_key(today, today)
+            with self.captureOnCommitCallbacks(execute=True):
+                edit()
+            self.assertNotEqual(pdf.report_key(today, today), key)
+
+        def note():
+            reqs[0].user_note = 'Revised'
+            reqs[0].save()
+
+        def swap_quantities():
+            reqs[0].quantity, reqs[1].quantity = reqs[1].quantity, reqs[0].quantity
+            # Bulk writes set updated_at themselves, as bulk_process_requests does
+            reqs[0].updated_at = reqs[1].updated_at = timezone.now()
+            MaterialRequest.objects.bulk_update(reqs, ['quantity', 'updated_at'])
+
+        def rename_material():
+            material.name = 'Renamed'
+            material.save()
+
+        def rename_requester():
+            reqs[0].requester.first_name = 'Field'
+            reqs[0].requester.save()
+
+        for edit in (note, swap_quantities, rename_material, rename_requester):
+            with self.subTest(edit=edit.__name__):
+                changes_key(edit)
+
+    def test_unknown_or_malformed_keys(self):
+        self.assertEqual(self.client.get(reverse('reports_pdf_file', args=['0' * 64])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('reports_pdf_file', args=['not-a-key'])).status_code, 404)
+
+
+class BackupTests(DerivedStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=12, requests=40, tasks=10, used=15, days=20)
+
+    def backup(self, *args):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'backup')
+        call_command('backup_inventory', path, '--chunk-size', '7', *args, stdout=StringIO())
+        return path
+
+    def snapshot(self):
+        return {
+            model._meta.label_lower: list(model._default_manager.order_by('pk').values())
+            for model in backups.backup_models()
+        }
+
+    def test_full_backup_round_trip(self):
+        for compression in ('gzip', 'brotli'):
+            with self.subTest(compression=compression):
+                before, counts = self.snapshot(), stats.get_counts()
+                path = self.backup('--compression', compression)
+                with transaction.atomic():
+                    Material.objects.all().delete()
+                    User.objects.all().delete()
+                    # The journal outlives its materials; lose it too
+                    StockMovement.objects.all().delete()
+                    StockSnapshot.objects.all().delete()
+                call_command('restore_inventory', path, stdout=StringIO())
+                self.assertEqual(self.snapshot(), before)
+                self.assertEqual(stats.get_counts(), counts)
+                self.assertEqual(self.users['technicians'][0].groups.get().name, 'Technician')
+                self.assertMatchesRebuild()
+                # Rows added after a restore do not collide with restored keys
+                Material.objects.create(name=f'After {compression} restore', quantity=1)
+
+    def test_incremental_backup_takes_new_movements_only(self):
+        with open(self.backup(), 'rb') as fileobj:
+            full = list(backups.read(fileobj))
+        stock.adjust(Material.objects.first().pk, 5, 'adjust')
+        with open(self.backup('--since', full[0]['created_at']), 'rb') as fileobj:
+            incremental = list(backups.read(fileobj))
+        self.assertEqual(incremental[0]['since'], full[0]['created_at'])
+        movements = [obj for record in incremental[1:] if record['model'] == 'isp_inventory.stockmovement'
+                     for obj in record['objects']]
+        self.assertEqual([obj['fields']['delta'] for obj in movements], [5])
+        self.assertTrue(all(len(record['objects']) <= 7 for record in incremental[1:]))
+
+    def test_settings_backup_streams(self):
+        self.client.force_login(self.users['admin'])
+        response = self.client.post(reverse('settings'), {'action': 'backup'})
+        self.assertTrue(response.streaming)
+        header = next(backups.read(BytesIO(b''.join(response.streaming_content))))
+        self.assertEqual(header['format'], backups.FORMAT)
+        self.assertIn('isp_inventory.materialrequest', header['models'])
+        self.assertNotIn('isp_inventory.searchdocument', header['models'])
+
+
+class ImportTests(DerivedStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=3, requests=0, tasks=0, used=0)
+        cls.cable = Material.objects.order_by('pk').first()
+
+    def upload(self, entity, content, name='import.csv', dry_run=False):
+        self.client.force_login(self.users['storekeeper'] if entity != 'vendors' else self.users['admin'])
+        data = {'entity': entity, 'file': SimpleUploadedFile(name, content)}
+        if dry_run:
+            data['dry_run'] = '1'
+        response = self.client.post(reverse('import_data'), data)
+        self.assertEqual(response.status_code, 200)
+        return response.context['report']
+
+    def test_materials_dry_run_then_upsert(self):
+        csv_file = (
+            'Name,Category,Quantity,Min Stock Level\n'
+            f'{self.cable.name},{self.cable.category},{self.cable.quantity + 25},10\n'
+            'Splitter 1x8,Internet,4,10\n'
+            'ONU X,Dish,0,5\n'
+            'Bad,Satellite,1,1\n'
+            'Splitter 1x8,Internet,9,10\n'
+        ).encode()
+        counts = stats.get_counts()
+        report = self.upload('materials', csv_file, dry_run=True)
+        self.assertEqual((report['created'], report['updated'], len(report['errors'])), (2, 1, 2))
+        self.assertEqual(report['diff'][0]['changes']['quantity'], [self.cable.quantity, self.cable.quantity + 25])
+        self.assertEqual([error['row'] for error in report['errors']], [5, 6])
+        self.assertFalse(Material.objects.filter(name='Splitter 1x8').exists())
+
+        movements = StockMovement.objects.count()
+        report = self.upload('materials', csv_file)
+        self.assertEqual((report['created'], report['updated']), (2, 1))
+        splitter = Material.objects.get(name='Splitter 1x8')
+        self.assertEqual((splitter.quantity, splitter.status, splitter.added_by), (4, 'Low Stock', 'storekeeper'))
+        self.cable.refresh_from_db()
+        self.assertEqual(StockMovement.objects.count(), movements + 2)  # ONU X starts at zero
+        self.assertEqual(StockMovement.objects.get(material=self.cable, reason='adjust').delta, 25)
+        self.assertEqual(search.search('material', 'splitter'), [splitter.pk])
+        # Signal-maintained counters were kept in step with the bulk writes
+        expected = stats.compute_counts()
+        self.assertEqual(expected[stats.MATERIAL_TOTAL], counts[stats.MATERIAL_TOTAL] + 2)
+        self.assertEqual({key: stats.get_counts().get(key, 0) for key in expected}, expected)
+
+        # Re-importing the same file changes nothing
+        report = self.upload('materials', csv_file)
+        self.assertEqual((report['created'], report['updated'], report['unchanged']), (0, 0, 3))
+        self.assertMatchesRebuild()
+
+    def test_tasks_and_vendors_from_xlsx(self):
+        def xlsx(*rows):
+            workbook = Workbook()
+            for row in rows:
+                workbook.active.append(row)
+            output = BytesIO()
+            workbook.save(output)
+            return output.getvalue()
+
+        report = self.upload('tasks', xlsx(
+            ['Title', 'Customer', 'Address', 'Technician', 'Status'],
+            ['Install A', 'Rahman', 'Road 1', 'tech1', 'Pending'],
+            ['Install B', 'Akter', 'Road 2', 'nobody', ''],
+        ), name='tasks.xlsx')
+        self.assertEqual((report['created'], len(report['errors'])), (1, 1))
+        self.assertEqual(Task.objects.get(title='Install A').technician, self.users['technicians'][0])
+        self.assertMatchesRebuild()
+
+        Vendor.objects.create(name='Fiber Co', phone='111')
+        report = self.upload('vendors', xlsx(['Name', 'Phone'], ['Fiber Co', 222], ['Cable BD', '333']), name='v.xlsx')
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        self.assertEqual(Vendor.objects.get(name='Fiber Co').phone, '222')
+
+    def test_technicians_cannot_import(self):
+        self.client.force_login(self.users['technicians'][0])
+        self.assertRedirects(self.client.get(reverse('import_data')), reverse('dashboard'), fetch_redirect_response=False)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=10, requests=30, tasks=10, used=12)
+        cls.tech = cls.users['technicians'][0]
+
+    def get(self, name, user, query='', args=()):
+        self.client.force_login(user)
+        return self.client.get(reverse(name, args=args) + query)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        url, seen = reverse('api_requests-list') + '?page_size=7', []
+        self.client.force_login(self.users['admin'])
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        expected = list(MaterialRequest.objects.order_by('-requested_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_fields_narrow_the_payload_and_the_query(self):
+        with CaptureQueriesContext(connection) as narrow:
+            rows = self.get('api_requests-list', self.users['admin'], '?fields=id,status').json()['results']
+        self.assertEqual(set(rows[0]), {'id', 'status'})
+        sql = narrow.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('admin_note', sql)
+
+        rows = self.get('api_requests-list', self.users['admin'], '?fields=id,material_name').json()['results']
+        self.assertEqual(set(rows[0]), {'id', 'material_name'})
+        response = self.get('api_requests-list', self.users['admin'], '?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+
+    def test_filters(self):
+        admin = self.users['admin']
+        rows = self.get('api_materials-list', admin, '?category=Internet&page_size=500').json()['results']
+        self.assertEqual(len(rows), Material.objects.filter(category='Internet').count())
+        self.assertEqual({row['category'] for row in rows}, {'Internet'})
+
+        today = timezone.localdate()
+        query = f'?status=Approved&from_date={today - timedelta(days=10)}&to_date={today}&page_size=500'
+        rows = self.get('api_requests-list', admin, query).json()['results']
+        expected = MaterialRequest.objects.filter(
+            status='Approved',
+            requested_at__gte=journal.day_end(today - timedelta(days=11)),
+            requested_at__lt=journal.day_end(today),
+        )
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(expected.values_list('pk', flat=True)))
+        self.assertEqual(self.get('api_requests-list', admin, '?status=Lost').status_code, 400)
+        self.assertEqual(self.get('api_tasks-list', admin, '?from_date=yesterday').status_code, 400)
+
+    def test_technicians_see_their_own_rows(self):
+        rows = self.get('api_tasks-list', self.tech, '?page_size=500').json()['results']
+        self.assertEqual(len(rows), Task.objects.filter(technician=self.tech).count())
+        self.assertEqual({row['technician'] for row in rows}, {self.tech.pk})
+        other = UsedMaterial.objects.exclude(technician=self.tech).first()
+        self.assertEqual(self.get('api_used_materials-detail', self.tech, args=[other.pk]).status_code, 404)
+        # The catalog is shared
+        rows = self.get('api_materials-list', self.tech, '?page_size=500').json()['results']
+        self.assertEqual(len(rows), Material.objects.count())
+
+    def test_read_only_and_login_required(self):
+        material = Material.objects.first()
+        self.assertEqual(self.get('api_materials-detail', self.users['admin'], args=[material.pk]).json()['name'],
+                         material.name)
+        response = self.client.delete(reverse('api_materials-detail', args=[material.pk]))
+        self.assertEqual(response.status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_materials-list')).status_code, 403)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=5, requests=10, tasks=4, used=4)
+        cls.material = Material.objects.order_by('pk').first()
+
+    def setUp(self):
+        self.client.force_login(self.users['storekeeper'])
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_material_json_answers_304_until_the_row_changes(self):
+        url = reverse('material_json', args=[self.material.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertFalse(any('"notes"' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        # Raw-SQL stock updates move the row version too
+        stock.adjust(self.material.pk, 5)
+        changed = self.revalidate(url, first)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_list_pages_follow_the_table_counters(self):
+        url = reverse('materials')
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        # Another user, or another query string, never matches
+        self.client.force_login(self.users['admin'])
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        self.client.force_login(self.users['storekeeper'])
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url + '?category=Dish', first).status_code, 200)
+
+        # Writes elsewhere leave the page valid; material writes do not
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='T', customer='C', address='A', technician=self.users['technicians'][0])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.material.notes = 'moved to shelf B'
+            self.material.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_pending_flash_messages_always_render(self):
+        url = reverse('materials')
+        first = self.client.get(url)
+        self.client.post(url, {'name': ''})
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Material name already exists!')
+
+    def test_api_lists_revalidate(self):
+        url = reverse('api_requests-list') + '?fields=id,status'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        pending = MaterialRequest.objects.filter(status='Pending').values_list('pk', flat=True)[:1]
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_process_requests(list(pending), 'reject', self.users['admin'])
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=4, requests=0, tasks=0, used=0)
+        cls.tech, cls.other = cls.users['technicians'][:2]
+
+    def setUp(self):
+        # Every entry counts as settled
+        self.enterContext(mock.patch.object(sync, 'SETTLE', timedelta(seconds=-60)))
+
+    def sync(self, user, since=None):
+        self.client.force_login(user)
+        return self.client.get(reverse('api_sync'), {'since': since} if since is not None else {}).json()
+
+    def task(self, technician, title='Install'):
+        return Task.objects.create(title=title, customer='C', address='A', technician=technician)
+
+    def test_first_sync_resets_then_deltas_follow(self):
+        first = self.sync(self.tech)
+        self.assertTrue(first['reset'])
+        task = self.task(self.tech)
+        self.task(self.other)
+        material = Material.objects.order_by('pk').first()
+        stock.adjust(material.pk, 3)
+        delta = self.sync(self.tech, first['token'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual([row['id'] for row in delta['changes']['task']], [task.pk])
+        self.assertEqual([row['id'] for row in delta['changes']['material']], [material.pk])
+        # Staff see every technician's rows; nothing new means the same token
+        self.assertEqual(len(self.sync(self.users['admin'], first['token'])['changes']['task']), 2)
+        again = self.sync(self.tech, delta['token'])
+        self.assertEqual((again['token'], again['changes'], again['deleted']), (delta['token'], {}, {}))
+
+    def test_rows_appear_once_and_removals_are_tombstones(self):
+        token = self.sync(self.tech)['token']
+        kept, moved, gone = self.task(self.tech, 'kept'), self.task(self.tech, 'moved'), self.task(self.tech, 'gone')
+        for status in ('In Progress', 'Completed'):
+            kept.status = status
+            kept.save()
+        moved.technician = self.other
+        moved.save()
+        gone_pk = gone.pk
+        gone.delete()
+        delta = self.sync(self.tech, token)
+        self.assertEqual([(row['id'], row['status']) for row in delta['changes']['task']], [(kept.pk, 'Completed')])
+        self.assertEqual(delta['deleted']['task'], sorted([moved.pk, gone_pk]))
+        # The new owner gets it as a change
+        self.assertEqual([row['id'] for row in self.sync(self.other, token)['changes']['task']], [moved.pk])
+
+    def test_pages_and_settle_window(self):
+        token = self.sync(self.tech)['token']
+        tasks = [self.task(self.tech, f'T{i}') for i in range(5)]
+        seen, more = [], True
+        while more:
+            page = sync.changes(self.tech, 'Technician', token, limit=2)
+            seen += [row['id'] for row in page['changes'].get('task', [])]
+            token, more = page['token'], page['more']
+        self.assertEqual(seen, [task.pk for task in tasks])
+        # Entries younger than SETTLE wait for the next sync
+        with mock.patch.object(sync, 'SETTLE', timedelta(minutes=5)):
+            self.task(self.tech, 'fresh')
+            delta = self.sync(self.tech, token)
+        self.assertEqual((delta['token'], delta['changes']), (token, {}))
+
+    def test_pruned_or_reissued_tokens_reset(self):
+        self.task(self.tech)
+        token = self.sync(self.tech)['token']
+        self.assertFalse(self.sync(self.tech, token)['reset'])
+        # Same entry id, different entry (a restore reissued the id)
+        self.assertTrue(self.sync(self.tech, token.split('.')[0] + '.1')['reset'])
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=40))
+        call_command('prune_changelog', days=30, stdout=StringIO())
+        self.assertFalse(ChangeLog.objects.exists())
+        self.assertTrue(self.sync(self.tech, token)['reset'])
+        self.assertEqual(self.client.get(reverse('api_sync'), {'since': 'abc'}).status_code, 400)
+
+    def test_bulk_writes_are_logged(self):
+        token = self.sync(self.users['admin'])['token']
+        material = Material.objects.filter(quantity__gt=0).order_by('pk').first()
+        req = MaterialRequest.objects.create(material=material, requester=self.tech, quantity=1)
+        bulk_process_requests([req.pk], 'approve', self.users['admin'])
+        delta = self.sync(self.tech, token)
+        self.assertEqual([(row['id'], row['status']) for row in delta['changes']['request']], [(req.pk, 'Approved')])
+        self.assertIn(material.pk, [row['id'] for row in delta['changes']['material']])
+        self.assertNotIn('request', self.sync(self.other, token)['changes'])
+
+
+class AsyncViewTests(TestCase):
+    """The async views, served through the ASGI handler and async middleware."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=6, requests=20, tasks=6, used=8)
+        cls.tech = cls.users['technicians'][0]
+
+    async def get(self, user, name, args=(), query='', **headers):
+        await self.async_client.aforce_login(user)
+        return await self.async_client.get(reverse(name, args=args) + query, headers=headers)
+
+    async def test_dashboard_counts(self):
+        response = await self.get(self.tech, 'dashboard')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['role'], 'Technician')
+        self.assertEqual(response.context['used_materials_count'],
+                         await UsedMaterial.objects.filter(technician=self.tech).acount())
+        self.assertEqual(response.context['my_stock_count'], await ledger.atotal(self.tech))
+        self.assertIsNotNone(response.context['used_material_form'])
+        response = await self.get(self.users['admin'], 'dashboard')
+        self.assertEqual(response.context['total_materials'], await Material.objects.acount())
+        # The async instrumentation sees the queries run on the request's thread
+        queries = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertTrue(0 < queries <= query_budget('dashboard', cold=True))
+
+    async def test_material_json_revalidates(self):
+        material = await Material.objects.order_by('pk').afirst()
+        first = await self.get(self.users['storekeeper'], 'material_json', [material.pk])
+        self.assertEqual(json.loads(first.content)['name'], material.name)
+        again = await self.get(self.users['storekeeper'], 'material_json', [material.pk],
+                               **{'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        missing = await self.get(self.users['storekeeper'], 'material_json', [0])
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_roles_and_lists(self):
+        other = self.users['technicians'][1]
+        # Technicians always get their own balances; staff may pick
+        own = json.loads((await self.get(self.tech, 'technician_stock', query=f'?technician={other.pk}')).content)
+        self.assertEqual(own['technician'], self.tech.username)
+        picked = json.loads((await self.get(self.users['admin'], 'technician_stock',
+                                            query=f'?technician={other.pk}')).content)
+        self.assertEqual(picked['technician'], other.username)
+        page = json.loads((await self.get(self.users['admin'], 'dashboard_modal', ['tasks'])).content)
+        self.assertEqual(page['html'].count('<tr'), await Task.objects.acount())
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('material_json', args=[1]))
+        self.assertEqual(response.status_code, 302)
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # A second process: its own local tier over the same shared tier
+        self.other = caching.TieredCache('other-process', {'OPTIONS': {'SHARED': 'shared'}})
+        self.addCleanup(self.other.clear)
+
+    def test_tiers_and_stats(self):
+        before = cache.stats()
+        cache.set('greeting', 'hello')
+        self.assertEqual(cache.get('greeting'), 'hello')
+        self.assertEqual(self.other.get('greeting'), 'hello')
+        self.assertEqual(self.other.get('greeting'), 'hello')
+        self.assertIsNone(cache.get('absent'))
+        after, other = cache.stats(), self.other.stats()
+        self.assertEqual(after['local_hit'] - before.get('local_hit', 0), 1)
+        self.assertEqual(after['miss'] - before.get('miss', 0), 1)
+        self.assertGreaterEqual(other['shared_hit'], 1)
+        self.assertGreaterEqual(other['local_hit'], 1)
+
+        # The local tier is a bounded LRU
+        small = caching.TieredCache('small', {'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAX_ENTRIES': 2}})
+        for key in 'abc':
+            small.set(f'lru-{key}', key)
+        small.get('lru-b')
+        self.assertEqual(small.stats()['local_entries'], 2)
+        self.assertEqual(small.get_many(['lru-a', 'lru-b', 'lru-c']), {'lru-a': 'a', 'lru-b': 'b', 'lru-c': 'c'})
+        self.assertEqual(small.stats()['shared_hit'], 1)
+
+    def test_tag_invalidation(self):
+        cache.set('row-1', 1, tags=['material:1'])
+        cache.set('row-2', 2, tags=['material:2'])
+        cache.set('all-materials', 'list', tags=['material:*'])
+        cache.set('tech-5', 'mine', tags=['requests:user:5'])
+        cache.set('tech-6', 'theirs', tags=['requests:user:6'])
+        caching.invalidate('material:1')
+        self.assertEqual(cache.get_many(['row-1', 'row-2', 'all-materials']), {'row-2': 2})
+        caching.invalidate('material:*')
+        self.assertIsNone(cache.get('row-2'))
+        caching.invalidate('requests:user:5')
+        self.assertEqual(cache.get_many(['tech-5', 'tech-6']), {'tech-6': 'theirs'})
+        # Other processes see it once their local copy is gone
+        self.assertEqual(self.other.get('tech-6'), 'theirs')
+        caching.invalidate('requests:*')
+        third = caching.TieredCache('third-process', {'OPTIONS': {'SHARED': 'shared'}})
+        self.assertIsNone(third.get('tech-6'))
+        self.assertEqual(third.stats()['stale'], 1)
+
+    def test_role_entries_expire_through_their_user_tag(self):
+        tech, other = User.objects.create_user('tech'), User.objects.create_user('other')
+        key = role_cache_key(tech.pk)
+        self.assertEqual(get_user_role(tech)['role'], 'Technician')
+        get_user_role(other)
+        self.assertEqual(self.other.get(key)['role'], 'Technician')
+
+        with caching.CacheRecorder() as recorder, self.captureOnCommitCallbacks(execute=True):
+            UserProfile.objects.filter(user=tech).update(role='Storekeeper')
+            tech.userprofile.refresh_from_db()
+            tech.userprofile.save()
+        self.assertEqual(recorder.counts['invalidate'], 1)
+        self.assertIsNone(cache.get(key))
+        third = caching.TieredCache('role-reader', {'OPTIONS': {'SHARED': 'shared'}})
+        self.assertIsNone(third.get(key))
+        self.assertEqual(get_user_role(tech)['role'], 'Storekeeper')
+        # Other users' entries are untouched
+        self.assertIsNotNone(third.get(role_cache_key(other.pk)))
+
+        # Large batches expire every role entry with one wildcard
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_user_roles(range(1, ROLE_INVALIDATE_ALL_OVER + 10))
+        fourth = caching.TieredCache('late-role-reader', {'OPTIONS': {'SHARED': 'shared'}})
+        self.assertEqual(fourth.get_many([key, role_cache_key(other.pk)]), {})
+
+    def test_request_log_carries_cache_counts(self):
+        users = seed_workload(materials=2, requests=2, tasks=0, used=0)
+        self.client.force_login(users['admin'])
+        with self.assertLogs('isp_inventory.sql', 'INFO') as logs:
+            self.client.get(reverse('dashboard'))
+        self.assertIn('"cache": {', logs.output[-1])
+
+
+class RoleCacheTests(TestCase):
+    """Cached roles expire, on commit, whenever what they were read from changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.groups = ensure_role_groups()
+        self.user = User.objects.create_user('field-tech')
+
+    def assertExpiresOnCommit(self, change, role='Technician', groups=()):
+        get_user_role(self.user)
+        key = role_cache_key(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            # Until the commit a reader could cache the old rows again
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(get_user_role(self.user), {'role': role, 'groups': list(groups)})
+
+    def test_profile_save(self):
+        def promote():
+            self.user.userprofile.role = 'Storekeeper'
+            self.user.userprofile.save()
+        self.assertExpiresOnCommit(promote, role='Storekeeper')
+
+    def test_group_add_and_remove(self):
+        self.assertExpiresOnCommit(lambda: self.user.groups.add(self.groups['Admin']), groups=['Admin'])
+        self.assertExpiresOnCommit(lambda: self.user.groups.remove(self.groups['Admin']))
+
+    def test_group_members_cleared(self):
+        self.user.groups.add(self.groups['Storekeeper'])
+        self.assertExpiresOnCommit(self.groups['Storekeeper'].user_set.clear)
+
+    def test_group_delete(self):
+        crew = Group.objects.create(name='Night Crew')
+        self.user.groups.add(crew)
+        self.assertExpiresOnCommit(crew.delete)
+
+    def test_reconcile_user_roles(self):
+        # The on-commit reconcile from user creation never ran here
+        self.assertExpiresOnCommit(lambda: reconcile_user_roles([self.user.pk]), groups=['Technician'])
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=30, requests=40, tasks=0, used=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def rendered_rows(self, url, user, partial):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [t.name for t in response.templates].count(partial)
+
+    def test_unchanged_rows_are_not_rendered_again(self):
+        partial = 'inventory/partials/material_row.html'
+        storekeeper = self.users['storekeeper']
+        _, first = self.rendered_rows(reverse('materials'), storekeeper, partial)
+        self.assertEqual(first, Material.objects.count())
+        response, again = self.rendered_rows(reverse('materials'), storekeeper, partial)
+        self.assertEqual(again, 0)
+        # Forms in cached rows carry this request's CSRF token
+        self.assertNotContains(response, fragments.CSRF_PLACEHOLDER)
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+        material = Material.objects.order_by('pk').first()
+        material.notes = 'edited'
+        material.quantity += 1
+        material.save()
+        response, changed = self.rendered_rows(reverse('materials'), storekeeper, partial)
+        self.assertEqual(changed, 1)
+        # Another role gets its own fragments
+        _, admin = self.rendered_rows(reverse('materials'), self.users['admin'], partial)
+        self.assertEqual(admin, Material.objects.count())
+
+    def test_request_rows_follow_related_names(self):
+        partial = 'inventory/partials/request_row.html'
+        admin = self.users['admin']
+        self.rendered_rows(reverse('requests'), admin, partial)
+        req = MaterialRequest.objects.select_related('material').first()
+        req.material.name = 'Renamed cable'
+        req.material.save()
+        response, rerendered = self.rendered_rows(reverse('requests'), admin, partial)
+        self.assertEqual(rerendered, MaterialRequest.objects.filter(material=req.material).count())
+        self.assertContains(response, 'Renamed cable')
+
+    def test_one_cache_round_trip_per_page(self):
+        rows = list(MaterialRequest.objects.select_related('requester', 'material'))
+        request = RequestFactory().get('/')
+        def extra(req):
+            return {'role': 'Admin'}
+
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            first = fragments.render_rows(request, 'inventory/partials/request_row.html', rows, 'req', extra)
+            again = fragments.render_rows(request, 'inventory/partials/request_row.html', rows, 'req', extra)
+        self.assertEqual((get_many.call_count, set_many.call_count), (2, 1))
+        self.assertEqual(len(first), len(rows))
+        self.assertEqual([html.count('<tr') for html in again], [1] * len(rows))
+
+
+class QueryBudgetTests(TestCase):
+    """Every URL name stays within its QUERY_BUDGETS entry at any data size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_workload(materials=20, requests=60, tasks=20, used=30)
+
+    def setUp(self):
+        self.enterContext(pdf_directory())
+
+    def cases(self):
+        """(url name, user, args, query string) for every page a role can load."""
+        admin, storekeeper = self.users['admin'], self.users['storekeeper']
+        tech = self.users['technicians'][0]
+        material = Material.objects.order_by('pk').first()
+        req = MaterialRequest.objects.order_by('pk').first()
+        used = UsedMaterial.objects.filter(technician=tech).order_by('pk').first()
+        today = timezone.localdate()
+        report = pdf.report_key(today - timedelta(days=30), today)
+        cases = [
+            ('login', None, [], ''),
+            ('register', None, [], ''),
+            ('logout', tech, [], ''),
+            ('material_json', storekeeper, [material.pk], ''),
+            ('technician_stock', tech, [], ''),
+            ('approve_request', admin, [req.pk], ''),
+            ('settings', admin, [], ''),
+            ('reports', admin, [], ''),
+            ('reports_export', admin, [], '?format=xlsx'),
+            ('reports_pdf', admin, [], ''),
+            ('reports_pdf_file', admin, [report], ''),
+            ('inventory_at', admin, [], ''),
+            ('import_data', storekeeper, [], ''),
+            ('used_materials', tech, [], ''),
+            ('used_materials', tech, [], '?search=road'),
+            ('manage_used_material', tech, [used.pk], ''),
+        ]
+        for user in (admin, storekeeper, tech):
+            cases += [
+                ('dashboard', user, [], ''),
+                ('materials', user, [], ''),
+                ('materials', user, [], '?search=material&category=Internet'),
+                ('tasks', user, [], ''),
+                ('requests', user, [], ''),
+                ('requests', user, [], '?search=job'),
+            ]
+        for kind in ('materials', 'requests', 'tasks', 'used_materials'):
+            cases.append(('dashboard_modal', admin, [kind], '?search=1'))
+        for kind in ('materials', 'advance'):
+            cases.append(('dashboard_modal', tech, [kind], ''))
+        task = Task.objects.filter(technician=tech).order_by('pk').first()
+        for name, pk in (('api_materials', material.pk), ('api_requests', req.pk),
+                         ('api_tasks', task.pk), ('api_used_materials', used.pk)):
+            cases += [
+                (f'{name}-list', storekeeper, [], ''),
+                (f'{name}-list', tech, [], '?fields=id,status'),
+                (f'{name}-detail', admin, [pk], ''),
+            ]
+        cases.append(('api_sync', tech, [], ''))
+        cases.append(('requests_bulk', admin, [], self.bulk_payload))
+        return cases
+
+    def bulk_payload(self):
+        """POST body approving the five oldest pending requests."""
+        ids = list(MaterialRequest.objects.filter(status='Pending').order_by('pk').values_list('pk', flat=True)[:5])
+        return {'ids': ids, 'action': 'approve', 'allow_partial': True}
+
+    def measure(self, name, user, args, query, cold=False):
+        url = reverse(name, args=args)
+        if cold:
+            # First load: nothing cached in either tier or in process
+            cache.clear()
+            invalidate_display_names()
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        if callable(query):
+            # POST endpoints run once; warm means caches left by earlier cases
+            body = json.dumps(query())
+            with QueryRecorder() as recorder:
+                response = self.client.post(url, body, content_type='application/json')
+        else:
+            url += query
+            if not cold:
+                # Warm per-process caches (roles, display names) first
+                self.client.get(url)
+                if user is not None:
+                    self.client.force_login(user)
+            with QueryRecorder() as recorder:
+                response = self.client.get(url)
+        self.assertIn(response.status_code, (200, 202, 302), url)
+        return recorder
+
+    def test_every_url_name_has_a_budget(self):
+        names = {pattern.name for pattern in get_resolver('isp_inventory.urls').url_patterns if pattern.name}
+        self.assertFalse(names - set(QUERY_BUDGETS), 'URL names without a query budget')
+        self.assertFalse(set(COLD_QUERY_BUDGETS) - names, 'cold budgets for unknown URL names')
+        for name, budget in COLD_QUERY_BUDGETS.items():
+            self.assertGreater(budget, QUERY_BUDGETS[name], name)
+        self.assertFalse(names - {case[0] for case in self.cases()}, 'URL names without a budget test')
+
+    def test_budgets_hold_as_rows_grow(self):
+        cases = self.cases()
+        small = [self.measure(*case).count for case in cases]
+        seed_workload(materials=60, requests=300, tasks=60, used=90, users=self.users)
+        for case, before in zip(cases, small):
+            name = case[0]
+            with self.subTest(view=name, user=case[1] and case[1].username, query=case[3] if isinstance(case[3], str) else 'POST'):
+                recorder = self.measure(*case, cold=True)
+                self.assertLessEqual(recorder.count, query_budget(name, cold=True), 'cold')
+                recorder = self.measure(*case)
+                detail = '\n'.join(f'{n}x {fp}' for fp, n in recorder.duplicates())
+                self.assertLessEqual(recorder.count, query_budget(name), detail)
+                if isinstance(case[3], str):
+                    # Writes vary with the rows they touch; warm pages must not.
+                    # First loads may also do one-off work (a missing
+                    # NotificationSetting), so only their budget is checked
+                    self.assertEqual(recorder.count, before, f'query count grows with rows\n{detail}')
+
+    def test_first_loads_stay_within_cold_budgets(self):
+        for case in self.cases():
+            name = case[0]
+            with self.subTest(view=name, user=case[1] and case[1].username, query=case[3] if isinstance(case[3], str) else 'POST'):
+                recorder = self.measure(*case, cold=True)
+                detail = '\n'.join(f'{n}x {fp}' for fp, n in recorder.duplicates())
+                self.assertLessEqual(recorder.count, query_budget(name, cold=True), detail)
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.users['admin'])
+        response = self.client.get(reverse('dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_inventory_command(self):
+        out = StringIO()
+        call_command('seed_inventory', materials=8, technicians=3, requests=40, used=30, tasks=6,
+                     batch_size=7, stdout=out)
+        self.assertEqual(Material.objects.count(), 8)
+        self.assertEqual(MaterialRequest.objects.count(), 40)
+        self.assertEqual(UsedMaterial.objects.count(), 30)
+        self.assertEqual(UserProfile.objects.filter(role='Technician').count(), 3)
+        # History is spread out rather than stamped "now"
+        self.assertGreater(MaterialRequest.objects.dates('requested_at', 'day').count(), 1)
+        # Derived tables were rebuilt
+        self.assertEqual(stats.get_counts()[stats.REQUEST_TOTAL], 40)
+        self.assertEqual(search.search('material', Material.objects.first().name), [Material.objects.first().pk])
+        self.assertIn('Seeded', out.getvalue())
+
+    def test_backfill_userprofiles_command(self):
+        users = [User.objects.create_user(f'legacy{i}') for i in range(5)]
+        users[0].groups.add(ensure_role_groups()['Storekeeper'])
+        UserProfile.objects.all().delete()
+
+        out = StringIO()
+        call_command('backfill_userprofiles', '--dry-run', '--batch-size', '2', stdout=out)
+        self.assertFalse(UserProfile.objects.exists())
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(' users')[0] for line in lines[:-1]], ['2/5', '4/5', '5/5'])
+        self.assertIn('Would create 5 profiles (Storekeeper: 1, Technician: 4)', lines[-1])
+
+        out = StringIO()
+        call_command('backfill_userprofiles', batch_size=3, stdout=out)
+        self.assertEqual(
+            dict(UserProfile.objects.values_list('user__username', 'role')),
+            {user.username: 'Storekeeper' if user == users[0] else 'Technician' for user in users},
+        )
+        self.assertRegex(out.getvalue(), r'3/5 users \(\d+ rows/sec\)\n5/5 users')
+        self.assertIn('Created 5 profiles', out.getvalue())
+
+        out = StringIO()
+        call_command('backfill_userprofiles', stdout=out)
+        self.assertIn('Every user already has a profile.', out.getvalue())
+
+    def test_benchmark_run_and_compare(self):
+        seeding.seed(materials=5, technicians=2, requests=20, used=10, tasks=4, batch_size=10)
+        results = benchmark.run(self.client, 'tiny', repeat=2)
+        self.assertEqual(len(results), len(benchmark.BENCHMARK_VIEWS))
+        for row in results.values():
+            self.assertGreater(row['queries'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+        slower = {key: dict(row, queries=row['queries'] + 1) for key, row in results.items()}
+        self.assertEqual(benchmark.compare(results, results), [])
+        self.assertEqual(len(benchmark.compare(slower, results)), len(results))
@@ -1,19 +1,34 @@
 from django.urls import path
-from . import views
+from rest_framework.routers import SimpleRouter
+from . import views, api
+
+router = SimpleRouter()
+router.register('api/materials', api.MaterialViewSet, basename='api_materials')
+router.register('api/requests', api.MaterialRequestViewSet, basename='api_requests')
+router.register('api/tasks', api.TaskViewSet, basename='api_tasks')
+router.register('api/used-materials', api.UsedMaterialViewSet, basename='api_used_materials')
 
 urlpatterns = [
     path('', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/modal/<slug:kind>/', views.dashboard_modal, name='dashboard_modal'),
     path('materials/', views.materials_view, name='materials'),
     path('materials/<int:pk>/json/', views.material_json, name='material_json'),
+    path('stock/', views.technician_stock_json, name='technician_stock'),
     path('tasks/', views.tasks_view, name='tasks'),
     path('requests/', views.requests_view, name='requests'),
+    path('requests/bulk/', views.requests_bulk, name='requests_bulk'),
     path('request/approve/<int:pk>/', views.approve_request, name='approve_request'),
     path('settings/', views.settings_view, name='settings'),
     path('reports/', views.reports_view, name='reports'),
+    path('reports/inventory-at/', views.inventory_at_json, name='inventory_at'),
+    path('reports/export/', views.reports_export, name='reports_export'),
+    path('reports/pdf/', views.reports_pdf, name='reports_pdf'),
+    path('reports/pdf/<slug:key>/', views.reports_pdf_file, name='reports_pdf_file'),
+    path('import/', views.import_view, name='import_data'),
     path('used-materials/', views.used_materials_view, name='used_materials'),
     path('used-materials/<int:pk>/manage/', views.manage_used_material, name='manage_used_material'),
-
-]
\ No newline at end of file
+    path('api/sync/', api.SyncView.as_view(), name='api_sync'),
+] + router.urls
@@ -1,8 +1,24 @@
-from django.contrib.auth.models import Group
+import asyncio
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
 from .models import UserProfile
+from . import caching
 
 ROLE_GROUPS = ['Admin', 'Storekeeper', 'Technician']
 
+# Cached role/group lookups, see get_user_role()
+ROLE_CACHE_TIMEOUT = 60 * 60
+# Invalidating more users than this expires every cached role at once
+ROLE_INVALIDATE_ALL_OVER = 50
+
+# Process-wide username -> display name cache, see resolve_display_names()
+DISPLAY_NAME_TTL = 300
+_display_names = {}
+_display_names_lock = threading.Lock()
+
 
 def ensure_userprofile(user):
     """Ensure a UserProfile exists for `user` and return it.
@@ -37,3 +53,193 @@ def ensure_userprofile(user):
 
     profile, _ = UserProfile.objects.get_or_create(user=user, defaults={'role': role_name})
     return profile
+
+
+def ensure_role_groups():
+    """Create any missing role groups and return them as {name: Group}."""
+    groups = {g.name: g for g in Group.objects.filter(name__in=ROLE_GROUPS)}
+    missing = [name for name in ROLE_GROUPS if name not in groups]
+    if missing:
+        Group.objects.bulk_create([Group(name=name) for name in missing], ignore_conflicts=True)
+        groups = {g.name: g for g in Group.objects.filter(name__in=ROLE_GROUPS)}
+    return groups
+
+
+def create_missing_profiles(user_ids, dry_run=False):
+    """Bulk-create UserProfiles for `user_ids` (users known to lack one).
+
+    The role comes from each user's first role group, else 'Technician'.
+    Returns the planned `(user_id, role)` pairs; nothing is written when
+    `dry_run` is true. Existing profiles are left alone (ignore_conflicts).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    role_by_user = {}
+    memberships = User.groups.through.objects.filter(
+        user_id__in=user_ids, group__name__in=ROLE_GROUPS
+    ).order_by('group_id').values_list('user_id', 'group__name')
+    for user_id, group_name in memberships:
+        role_by_user.setdefault(user_id, group_name)
+    planned = [(pk, role_by_user.get(pk, 'Technician')) for pk in user_ids]
+    if not dry_run:
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=pk, role=role) for pk, role in planned],
+            ignore_conflicts=True,
+        )
+    return planned
+
+
+def reconcile_user_roles(user_ids=None):
+    """Give every user a UserProfile and at least one role group, set-based.
+
+    Missing profiles are bulk-created with the role taken from the user's
+    first role group (or 'Technician'); users in no role group are added
+    to the group matching their profile role with one bulk M2M insert.
+    Restrict the work to `user_ids` when given. Returns a summary dict.
+    """
+    groups = ensure_role_groups()
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    Membership = User.groups.through
+
+    # Profiles: one query for users without one, one for their role groups
+    missing_ids = list(users.filter(userprofile__isnull=True).values_list('pk', flat=True))
+    profiles_created = len(create_missing_profiles(missing_ids))
+
+    # Role groups: a single anti-join finds users with no role group
+    ungrouped = list(
+        users.exclude(groups__name__in=ROLE_GROUPS).values_list('pk', 'userprofile__role')
+    )
+    if ungrouped:
+        Membership.objects.bulk_create(
+            [Membership(user_id=pk, group_id=groups.get(role, groups['Technician']).pk) for pk, role in ungrouped],
+            ignore_conflicts=True,
+        )
+
+    # Bulk inserts skip signals, so drop the affected cached roles here
+    invalidate_user_roles(set(missing_ids) | {pk for pk, _ in ungrouped})
+    return {
+        'profiles_created': profiles_created,
+        'memberships_added': len(ungrouped),
+    }
+
+
+def role_cache_key(user_id):
+    return f'role:{user_id}'
+
+
+def role_cache_tag(user_id):
+    return f'user:{user_id}'
+
+
+def get_user_role(user):
+    """Return `{'role': ..., 'groups': [...]}` for `user`, cached per user id.
+
+    The cache entry is tagged with the user (see caching.py) and signals
+    invalidate that tag once a change to the user's UserProfile or group
+    membership commits. Other processes may still serve their local copy
+    of the old role for up to the cache's LOCAL_TIMEOUT (5 seconds).
+    """
+    if user is None or user.pk is None:
+        return {'role': 'Technician', 'groups': []}
+    key = role_cache_key(user.pk)
+    info = cache.get(key)
+    if info is None:
+        profile = ensure_userprofile(user)
+        info = {
+            'role': profile.role if profile else 'Technician',
+            'groups': list(user.groups.values_list('name', flat=True)),
+        }
+        cache.set(key, info, ROLE_CACHE_TIMEOUT, tags=[role_cache_tag(user.pk)])
+    return info
+
+
+async def aget_user_role(user):
+    """Async get_user_role(): the profile and group lookups run concurrently."""
+    if user is None or user.pk is None:
+        return {'role': 'Technician', 'groups': []}
+    key = role_cache_key(user.pk)
+    info = await cache.aget(key)
+    if info is None:
+        role, groups = await asyncio.gather(
+            UserProfile.objects.filter(user_id=user.pk).values_list('role', flat=True).afirst(),
+            _alist(user.groups.values_list('name', flat=True)),
+        )
+        if role is None:
+            # No profile yet: create it the same way the sync path does
+            role = (await sync_to_async(ensure_userprofile)(user)).role
+        info = {'role': role, 'groups': groups}
+        await cache.aset(key, info, ROLE_CACHE_TIMEOUT, tags=[role_cache_tag(user.pk)])
+    return info
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+def invalidate_user_roles(user_ids):
+    """Expire cached roles for the given user ids once the transaction commits."""
+    ids = set(user_ids)
+    if len(ids) > ROLE_INVALIDATE_ALL_OVER:
+        # One counter bump instead of a pair per user
+        caching.invalidate_on_commit(role_cache_tag('*'))
+    elif ids:
+        caching.invalidate_on_commit(*[role_cache_tag(pk) for pk in sorted(ids)])
+
+
+def user_display_name(user):
+    """Return the user's full name, falling back to the username."""
+    full = (user.first_name or '') + (' ' + user.last_name if user.last_name else '')
+    return full.strip() or user.username
+
+
+def resolve_display_names(usernames):
+    """Map each username in `usernames` to a display name.
+
+    Names are served from a short-lived process-wide cache; all misses
+    are resolved with a single query. Usernames without a matching User
+    map to themselves.
+    """
+    wanted = {name for name in usernames if name}
+    now = time.monotonic()
+    result = {}
+    with _display_names_lock:
+        for name in wanted:
+            cached = _display_names.get(name)
+            if cached and cached[1] > now:
+                result[name] = cached[0]
+    missing = wanted - result.keys()
+    if missing:
+        found = {
+            u.username: user_display_name(u)
+            for u in User.objects.filter(username__in=missing).only('username', 'first_name', 'last_name')
+        }
+        expires = now + DISPLAY_NAME_TTL
+        with _display_names_lock:
+            for name in missing:
+                display = found.get(name, name)
+                _display_names[name] = (display, expires)
+                result[name] = display
+    return result
+
+
+def invalidate_display_names():
+    """Drop every cached display name (called when a User changes)."""
+    with _display_names_lock:
+        _display_names.clear()
+
+
+def attach_added_by_display(materials):
+    """Resolve `added_by_display` for a batch of materials in one query.
+
+    Evaluates `materials` and returns it as a list whose items have the
+    display name pre-set, so templates reading `added_by_display` cost
+    no further queries.
+    """
+    materials = list(materials)
+    names = resolve_display_names(m.added_by for m in materials)
+    for m in materials:
+        m._added_by_display = names.get(m.added_by, m.added_by or '')
+    return materials
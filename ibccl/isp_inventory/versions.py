@@ -0,0 +1,141 @@
+import hashlib
+import os
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .models import TableVersion
+
+# Counted tables; `user` covers users and profiles (names, roles, choices)
+MATERIAL = 'material'
+REQUEST = 'request'
+TASK = 'task'
+USED_MATERIAL = 'used_material'
+USER = 'user'
+TABLES = (MATERIAL, REQUEST, TASK, USED_MATERIAL, USER)
+
+
+def _bump_now(tables):
+    now = timezone.now()
+    for table in sorted(set(tables)):
+        updated = TableVersion.objects.filter(table=table).update(version=F('version') + 1, updated_at=now)
+        if updated == 0:
+            _, created = TableVersion.objects.get_or_create(table=table, defaults={'version': 1})
+            if not created:
+                TableVersion.objects.filter(table=table).update(version=F('version') + 1, updated_at=now)
+
+
+def bump(*tables):
+    """Count one change to each of `tables` once the current transaction commits.
+
+    Bumping after commit keeps the counter rows out of writers' locks.
+    A reader between the commit and the bump pairs new rows with the old
+    version, which only costs its client one more full response later;
+    it can never pair old rows with the new version.
+    """
+    transaction.on_commit(lambda: _bump_now(tables))
+
+
+def current(tables):
+    """{table: (version, updated_at)} for `tables`, in one query."""
+    rows = {
+        table: (version, updated_at)
+        for table, version, updated_at in TableVersion.objects.filter(table__in=tables)
+        .values_list('table', 'version', 'updated_at')
+    }
+    return {table: rows.get(table, (0, None)) for table in tables}
+
+
+@lru_cache(maxsize=None)
+def templates_stamp():
+    """Newest template modification time, read once per process.
+
+    Part of every page's validators, so a deploy that changes templates
+    (and restarts the workers) never answers 304 with old markup.
+    """
+    newest = 0
+    for directory in (d for backend in settings.TEMPLATES for d in backend.get('DIRS', [])):
+        for root, _, files in os.walk(directory):
+            newest = max([newest] + [os.path.getmtime(os.path.join(root, name)) for name in files])
+    return int(newest)
+
+
+def _validators(request, tables, row, kwargs):
+    """(ETag, Last-Modified) for this request, or None to skip conditional handling."""
+    if request.method not in ('GET', 'HEAD') or get_messages(request):
+        # Writes, and pages carrying a flash message, always render
+        return None
+    if row:
+        model, kwarg = row
+        updated = model.objects.filter(pk=kwargs[kwarg]).values_list('updated_at', flat=True).first()
+        if updated is None:
+            return None
+        parts, stamps = [model._meta.model_name, kwargs[kwarg], updated.isoformat()], [updated]
+    else:
+        versions = current(tables)
+        parts = [f'{table}:{version}:{updated and updated.isoformat()}' for table, (version, updated) in versions.items()]
+        stamps = [updated for _, updated in versions.values() if updated]
+    user = request.user
+    # Make sure the CSRF secret exists now, so it is the one the page's forms carry
+    get_token(request)
+    # Responses differ per user, role, URL and CSRF secret; logins and
+    # deploys move Last-Modified forward for clients that only send that
+    parts += [user.pk, request.role, request.get_full_path(), request.META['CSRF_COOKIE'], templates_stamp()]
+    stamps += [user.last_login, datetime.fromtimestamp(templates_stamp(), tz=dt_timezone.utc)]
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+    # Weak: the markup repeats the data but CSRF tokens differ per render
+    return f'W/"{digest}"', max(stamp for stamp in stamps if stamp)
+
+
+def conditional(*tables, row=None):
+    """Answer If-None-Match / If-Modified-Since with 304 while the data is unchanged.
+
+    The validators come from one lookup: the change counters of `tables`
+    (the tables the response is built from) or, with `row` as a
+    (model, URL kwarg) pair, that one row's updated_at. Responses are
+    marked `private, no-cache`, so browsers revalidate on every visit
+    instead of guessing a freshness lifetime from Last-Modified.
+
+    Async views get their validators looked up through sync_to_async
+    before Django's (synchronous) precondition checks read them.
+    """
+    def validators(request, kwargs):
+        if not hasattr(request, '_validators'):
+            request._validators = _validators(request, tables, row, kwargs)
+        return request._validators
+
+    def etag(request, *args, **kwargs):
+        found = validators(request, kwargs)
+        return found and found[0]
+
+    def last_modified(request, *args, **kwargs):
+        found = validators(request, kwargs)
+        return found and found[1]
+
+    def finish(response):
+        if response.has_header('ETag'):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                await sync_to_async(validators)(request, kwargs)
+                return finish(await conditional_view(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return finish(conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
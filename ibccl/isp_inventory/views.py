@@ -1,67 +1,43 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User, Group
 from .forms import RegisterForm, MaterialForm, TaskForm, RequestForm, VendorForm, SystemSettingForm, NotificationSettingForm, UsedMaterialForm
-from .models import Material, Task, MaterialRequest, UserProfile, Vendor, SystemSetting, NotificationSetting, UsedMaterial
-from .utils import ensure_userprofile
-from django.db.models import Sum, Q, F
+from .models import Material, Task, MaterialRequest, UserProfile, Vendor, SystemSetting, NotificationSetting, UsedMaterial, StockMovement
+from .approvals import bulk_process_requests
+from .stock import InsufficientStock
+from .utils import ensure_userprofile, attach_added_by_display, ensure_role_groups, reconcile_user_roles, ROLE_GROUPS
+from . import stats, ledger, journal, stock, search, rollups, exports, pdf, backups, imports, versions, fragments
+from django.db.models import Sum, Q
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import datetime
-from django.http import HttpResponse, JsonResponse
-from django.core.management import call_command
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 import json
-from io import StringIO
-from . Serializer import MaterialSerializer
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-
-@api_view(['GET', 'POST', 'PUT', 'DELETE'])
-def material_list_api(request):
-    materials = Material.objects.all()
-    serializer = MaterialSerializer(materials, many=True)
-    return Response(serializer.data)
-def material_detail_api(request, pk):
-    try:
-        material = Material.objects.get(pk=pk)
-    except Material.DoesNotExist:
-        return Response({'error': 'Material not found'}, status=404)
-
-    if request.method == 'GET':
-        serializer = MaterialSerializer(material)
-        return Response(serializer.data)
-
-    elif request.method == 'PUT':
-        data = json.loads(request.body)
-        serializer = MaterialSerializer(material, data=data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=400)
-
-    elif request.method == 'DELETE':
-        material.delete()
-        return Response(status=204)
 
 def register_view(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            # Ensure role groups exist and add user to selected group
-            role = form.cleaned_data.get('role')
-            for r in ['Admin', 'Storekeeper', 'Technician']:
-                Group.objects.get_or_create(name=r)
-            if role:
-                grp = Group.objects.get(name=role)
-                user.groups.add(grp)
-            # Create the associated UserProfile for the new user
-            try:
-                ensure_userprofile(user)
-            except Exception:
-                pass
+            # One transaction so role reconciliation (run on commit) sees the chosen group
+            with transaction.atomic():
+                user = form.save()
+                # Ensure role groups exist and add user to selected group
+                role = form.cleaned_data.get('role')
+                groups = ensure_role_groups()
+                if role in groups:
+                    user.groups.add(groups[role])
+                # Create the associated UserProfile for the new user
+                try:
+                    ensure_userprofile(user)
+                except Exception:
+                    pass
             login(request, user)
             messages.success(request, "Account created!")
             return redirect('dashboard')
@@ -95,101 +71,144 @@ def logout_view(request):
     return redirect('login')
 
 @login_required
-def dashboard(request):
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+async def dashboard(request):
+    role = request.role
+    # The counters and the technician's own counts are independent: run them together
+    lookups = [stats.aget_counts()]
+    if role == 'Technician':
+        lookups += [
+            # For Technician: Count all approved requests with Normal stock status (not unique materials)
+            MaterialRequest.objects.filter(
+                requester=request.user,
+                status='Approved',
+                material__status='Normal'  # Only count materials with Normal stock status
+            ).acount(),  # Count all approved requests, not distinct materials
+            # Stock: Approved Requests (In) - Used Materials (Out), from the balance table
+            ledger.atotal(request.user),
+            UsedMaterial.objects.filter(technician=request.user).acount(),
+        ]
+    counts, *mine = await asyncio.gather(*lookups)
 
     # Role-specific total materials count
     # Request send by technician materials approved by admin and auto update total materials count unique materials False
     if role == 'Technician':
-        # For Technician: Count all approved requests with Normal stock status (not unique materials)
-        total_materials = MaterialRequest.objects.filter(
-            requester=request.user, 
-            status='Approved',
-            material__status='Normal'  # Only count materials with Normal stock status
-        ).count()  # Count all approved requests, not distinct materials
+        total_materials, my_stock_count, used_materials_count = mine
     else:
         # For Admin & Storekeeper: Total count of all materials in system
-        total_materials = Material.objects.count()
-    
-    active_tasks = Task.objects.filter(status='In Progress').count()
-    pending_requests = MaterialRequest.objects.filter(status='Pending').count()
-    
-    # Data for dashboard modals - Role-specific
-    all_tasks = Task.objects.all().order_by('-created_at')
-    all_requests = MaterialRequest.objects.all().order_by('-requested_at')
-    all_used_materials = UsedMaterial.objects.all().select_related('technician', 'material').order_by('-added_at')
-    
-    # Role-specific material data for the materials modal
-    technician_approved_materials = None
-    all_materials = None
-    
-    if role == 'Technician':
-        # For Technicians: Get approved MaterialRequest objects with Normal stock status only
-        technician_approved_materials = MaterialRequest.objects.filter(
-            requester=request.user,
-            status='Approved',
-            material__status='Normal'  # Only show materials with Normal stock status
-        ).select_related('material').order_by('-requested_at')
-    else:
-        # For Admin & Storekeeper: Get all materials
-        all_materials = Material.objects.all().order_by('-added_at')
-    
-    # Technician specific stats
-    my_stock_count = 0
-    used_materials_count = 0
-    used_material_form = None
-    
-    if role == 'Technician':
-        # Calculate stock: Approved Requests (In) - Used Materials (Out)
-        total_in = MaterialRequest.objects.filter(requester=request.user, status='Approved').aggregate(s=Sum('quantity'))['s'] or 0
-        total_out = UsedMaterial.objects.filter(technician=request.user).aggregate(s=Sum('quantity'))['s'] or 0
-        my_stock_count = total_in - total_out
-        used_materials_count = UsedMaterial.objects.filter(technician=request.user).count()
-        used_material_form = UsedMaterialForm(user=request.user)
+        total_materials = counts.get(stats.MATERIAL_TOTAL, 0)
+        my_stock_count = used_materials_count = 0
+
+    active_tasks = counts.get(stats.task_key('In Progress'), 0)
+    pending_requests = counts.get(stats.request_key('Pending'), 0)
+
+    # Modal tables are loaded on demand from dashboard_modal
 
     # Admin specific stats
     total_users = 0
     if role == 'Admin':
-        total_users = User.objects.count()
+        total_users = counts.get(stats.USER_TOTAL, 0)
 
-    return render(request, 'inventory/dashboard.html', {
+    return await sync_to_async(_render_dashboard)(request, {
         'total_materials': total_materials,
         'active_tasks': active_tasks,
         'pending_requests': pending_requests,
-        'all_materials': all_materials,
-        'technician_approved_materials': technician_approved_materials,
-        'all_tasks': all_tasks,
-        'all_requests': all_requests,
-        'all_used_materials': all_used_materials,
         'role': role,
         'user': request.user,
         'my_stock_count': my_stock_count,
         'used_materials_count': used_materials_count,
-        'used_material_form': used_material_form,
+        'used_material_form': None,
         'total_users': total_users,
     })
 
 
+def _render_dashboard(request, context):
+    # Forms and context processors (messages, session) read synchronously
+    if context['role'] == 'Technician':
+        context['used_material_form'] = UsedMaterialForm(user=request.user)
+    return render(request, 'inventory/dashboard.html', context)
+
+
+DASHBOARD_MODAL_PAGE_SIZE = 25
+
+
+def _dashboard_modal_source(kind, user, role):
+    """Return (queryset, search entity, row template) for a dashboard modal."""
+    if kind == 'materials':
+        if role == 'Technician':
+            # Approved requests with Normal stock status only
+            qs = MaterialRequest.objects.filter(
+                requester=user, status='Approved', material__status='Normal'
+            ).select_related('material')
+            return qs, 'request', 'inventory/partials/dashboard_materials_rows.html'
+        return Material.objects.all(), 'material', 'inventory/partials/dashboard_materials_rows.html'
+    if kind == 'requests':
+        qs = MaterialRequest.objects.select_related('requester', 'material')
+        return qs, 'request', 'inventory/partials/dashboard_requests_rows.html'
+    if kind == 'tasks':
+        qs = Task.objects.select_related('technician')
+        return qs, 'task', 'inventory/partials/dashboard_tasks_rows.html'
+    if kind == 'used_materials':
+        qs = UsedMaterial.objects.select_related('technician', 'material')
+        return qs, 'used_material', 'inventory/partials/dashboard_used_materials_rows.html'
+    if kind == 'advance':
+        qs = MaterialRequest.objects.filter(requester=user, status='Approved').select_related('material')
+        return qs, 'request', 'inventory/partials/dashboard_advance_rows.html'
+    return None
+
+
 @login_required
+async def dashboard_modal(request, kind):
+    """Return one page of dashboard modal rows as an HTML fragment.
+
+    Pages are keyset-paginated on the primary key (newest first): pass the
+    `next` value of the previous response as `?before=` to continue.
+    """
+    role = request.role
+
+    source = _dashboard_modal_source(kind, request.user, role)
+    if source is None:
+        return JsonResponse({'error': 'Unknown modal'}, status=404)
+    qs, entity, template = source
+
+    query = request.GET.get('search', '').strip()
+    if query:
+        # Keyset pages stay in id order; the search only narrows the rows
+        qs = await sync_to_async(search.filter_queryset)(qs, entity, query, ranked=False)
+
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        qs = qs.filter(pk__lt=int(before))
+
+    rows = [row async for row in qs.order_by('-pk')[:DASHBOARD_MODAL_PAGE_SIZE + 1]]
+    has_more = len(rows) > DASHBOARD_MODAL_PAGE_SIZE
+    rows = rows[:DASHBOARD_MODAL_PAGE_SIZE]
+
+    html = await sync_to_async(render_to_string)(template, {
+        'rows': rows,
+        'role': role,
+        'first_page': not before,
+    }, request=request)
+    return JsonResponse({'html': html, 'next': rows[-1].pk if has_more else None})
+
+
+@login_required
+@versions.conditional(versions.MATERIAL, versions.USER)
 def materials_view(request):
     # Base queryset
     materials = Material.objects.all()
     # Materials count normal/Low stock/Out of stock
-    total_normal_stock = Material.objects.filter(status='Normal').count()
-    total_low_stock = Material.objects.filter(status='Low Stock').count()
-    total_out_of_stock = Material.objects.filter(status='Out of Stock').count()
+    counts = stats.get_counts()
+    total_normal_stock = counts.get(stats.material_key('Normal'), 0)
+    total_low_stock = counts.get(stats.material_key('Low Stock'), 0)
+    total_out_of_stock = counts.get(stats.material_key('Out of Stock'), 0)
 
-    # Ensure a UserProfile exists and read role
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+    # Role resolved once per request by RoleMiddleware
+    role = request.role
 
     #search name,categoty,status
-    search = request.GET.get('search', '').strip()
-    if search:
-        materials = materials.filter(
-            Q(name__icontains=search) | Q(category__icontains=search) | Q(status__icontains=search)
-        )
+    query = request.GET.get('search', '').strip()
+    if query:
+        materials = search.filter_queryset(materials, 'material', query)
 
     #Filter by category and stock_status    
     category = request.GET.get('category', '')
@@ -242,26 +261,17 @@ def materials_view(request):
                 messages.error(request, "Quantity must be a positive integer.")
                 return redirect('materials')
 
-            # Use F-expression update to decrement safely
+            # One UPDATE decrements stock and recomputes status
             try:
-                with transaction.atomic():
-                    updated = Material.objects.filter(pk=material_id, quantity__gte=qty).update(quantity=F('quantity') - qty)
-                    if updated == 0:
-                        messages.error(request, "Not enough stock to use that quantity or material not found.")
-                        return redirect('materials')
-                    # Refresh to show new value in message
-                    mat = Material.objects.get(pk=material_id)
-                    # Ensure status is recalculated by calling save() (update() bypasses save())
-                    try:
-                        mat.save()
-                    except Exception:
-                        # If save fails for some reason, continue and show quantity
-                        pass
-                    messages.success(request, f"Used {qty} of '{mat.name}'. New quantity: {mat.quantity}")
-                    return redirect('materials')
+                mat = stock.adjust(material_id, -qty, 'use', request.user)
+            except (InsufficientStock, Material.DoesNotExist, ValueError):
+                messages.error(request, "Not enough stock to use that quantity or material not found.")
+                return redirect('materials')
             except Exception:
                 messages.error(request, "An error occurred while updating stock. Try again.")
                 return redirect('materials')
+            messages.success(request, f"Used {qty} of '{mat['name']}'. New quantity: {mat['quantity']}")
+            return redirect('materials')
 
         # Add/edit material
         # Material model duplicate name not allowed massages show
@@ -287,6 +297,7 @@ def materials_view(request):
             if not is_new and role == 'Storekeeper' and material.added_by != request.user.username:
                 messages.error(request, "You can only update your own materials!")
                 return redirect('materials')
+            journal.describe(material, 'create' if is_new else 'adjust', request.user)
             material.save()
             messages.success(request, "Material saved!")
             #Material model duplicate name not allowed massages show
@@ -297,12 +308,20 @@ def materials_view(request):
     # render
     form = MaterialForm(user=request.user)
     context = {
+        'search': query,
         'category': category,
         'total_normal_stock': total_normal_stock,
         'total_low_stock': total_low_stock,
         'total_out_of_stock': total_out_of_stock,
         'stock_status': stock_status,
-        'materials': materials,
+        'material_rows': fragments.render_rows(
+            request, 'inventory/partials/material_row.html', attach_added_by_display(materials), 'material',
+            lambda material: {
+                'role': role,
+                'mine': material.added_by == request.user.username,
+                'added_by_display': material.added_by_display,
+            },
+        ),
         'form': form,
         'role': role,
         'user': request.user,
@@ -311,17 +330,17 @@ def materials_view(request):
 
 
 @login_required
-def material_json(request, pk):
+@versions.conditional(row=(Material, 'pk'))
+async def material_json(request, pk):
     """Return material data as JSON for populating the
      edit form via AJAX."""
     try:
-        mat = Material.objects.get(pk=pk)
+        mat = await Material.objects.aget(pk=pk)
     except Material.DoesNotExist:
         return JsonResponse({'error': 'Material not found'}, status=404)
 
     # Basic permission: Technicians should only fetch their own materials
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+    role = request.role
     if role == 'Technician' and mat.added_by != request.user.username:
         return JsonResponse({'error': 'Permission denied'}, status=403)
 
@@ -336,10 +355,37 @@ def material_json(request, pk):
     return JsonResponse(data)
 
 @login_required
+async def technician_stock_json(request):
+    """Return per-material stock balances held by a technician as JSON.
+
+    Technicians get their own balances; Admins and Storekeepers may pass
+    `?technician=<user id>`. `?material=<id>` narrows to one material.
+    """
+    technician = request.user
+    technician_id = request.GET.get('technician', '')
+    if technician_id and request.role in ['Admin', 'Storekeeper']:
+        technician = await aget_object_or_404(User, pk=technician_id)
+
+    rows = ledger.balances(technician)
+    material_id = request.GET.get('material', '')
+    if material_id.isdigit():
+        rows = rows.filter(material_id=int(material_id))
+
+    data = [{
+        'material_id': row.material_id,
+        'material': row.material.name,
+        'quantity': row.quantity,
+    } async for row in rows]
+    return JsonResponse({
+        'technician': technician.username,
+        'total': sum(item['quantity'] for item in data),
+        'balances': data,
+    })
+
 @login_required
+@versions.conditional(versions.TASK, versions.USER)
 def tasks_view(request):
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+    role = request.role
 
     # Filter permissions
     if role == 'Technician':
@@ -393,29 +439,30 @@ def tasks_view(request):
 
     else:
         form = TaskForm()
-        
-    return render(request, 'inventory/tasks.html', {'tasks': tasks.order_by('-created_at'), 'form': form, 'role': role})
+
+    tasks = tasks.order_by('-created_at')
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        tasks = search.filter_queryset(tasks, 'task', search_query)
+
+    return render(request, 'inventory/tasks.html', {'tasks': tasks, 'form': form, 'role': role, 'search': search_query})
 
 @login_required
+@versions.conditional(versions.REQUEST, versions.MATERIAL, versions.USER)
 def requests_view(request):
-    requests = MaterialRequest.objects.all().order_by('-requested_at')
+    requests = MaterialRequest.objects.select_related('requester', 'material').order_by('-requested_at')
     #Request count approved/pending/reject
-    approved_count = requests.filter(status='Approved').count()
-    pending_count = requests.filter(status='Pending').count()
-    reject_count = requests.filter(status='Rejected').count()
+    counts = stats.get_counts()
+    approved_count = counts.get(stats.request_key('Approved'), 0)
+    pending_count = counts.get(stats.request_key('Pending'), 0)
+    reject_count = counts.get(stats.request_key('Rejected'), 0)
     
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+    role = request.role
 
     # Search Logic
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        requests = requests.filter(
-            Q(material__name__icontains=search_query) | 
-            Q(user_note__icontains=search_query) | 
-            Q(notes__icontains=search_query) |
-            Q(requester__username__icontains=search_query)
-        )
+        requests = search.filter_queryset(requests, 'request', search_query)
 
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -450,11 +497,9 @@ def requests_view(request):
                         # Return stock before deleting
                         try:
                             with transaction.atomic():
-                                mat = Material.objects.select_for_update().get(pk=req.material.id)
-                                mat.quantity += req.quantity
-                                mat.save()
+                                mat = stock.adjust(req.material_id, req.quantity, 'return', request.user, f'request:{req.pk}')
                                 req.delete()
-                                messages.success(request, f"Approved request deleted. {req.quantity} units returned to {mat.name}.")
+                                messages.success(request, f"Approved request deleted. {req.quantity} units returned to {mat['name']}.")
                         except Exception as e:
                             messages.error(request, f"Internal error during stock return: {str(e)}")
                     else:
@@ -489,28 +534,20 @@ def requests_view(request):
                         messages.error(request, "Invalid quantity value.")
                         return redirect('requests')
                     
-                    # Check if sufficient stock available
-                    if approved_qty > req.material.quantity:
-                        messages.error(request, f"Insufficient stock for {req.material.name}. Available: {req.material.quantity}, Requested: {approved_qty}")
-                        return redirect('requests')
-                    
                     try:
                         with transaction.atomic():
-                            # Refresh material to be safe
-                            mat = Material.objects.select_for_update().get(pk=req.material.id)
-                            if mat.quantity < approved_qty:
-                                raise ValueError("Insufficient stock")
-                            
-                            # Deduct the approved quantity from material
-                            mat.quantity -= approved_qty
-                            mat.save()
-                            
+                            # Deduct the approved quantity; fails if stock is short
+                            mat = stock.adjust(req.material_id, -approved_qty, 'approve', request.user, f'request:{req.pk}')
+
                             # Update request with approved quantity
                             req.quantity = approved_qty
                             req.status = 'Approved'
                             req.admin_note = note
                             req.save()
-                            messages.success(request, f"Request approved. {approved_qty} units deducted from {mat.name}.")
+                            messages.success(request, f"Request approved. {approved_qty} units deducted from {mat['name']}.")
+                    except InsufficientStock as e:
+                        messages.error(request, str(e))
+                        return redirect('requests')
                     except Exception as e:
                          messages.error(request, f"Transaction failed: {str(e)}")
                          return redirect('requests')
@@ -520,15 +557,13 @@ def requests_view(request):
                         try:
                             with transaction.atomic():
                                 # Return quantity to material stock
-                                mat = Material.objects.select_for_update().get(pk=req.material.id)
-                                mat.quantity += req.quantity
-                                mat.save()
+                                mat = stock.adjust(req.material_id, req.quantity, 'reject', request.user, f'request:{req.pk}')
                                 
                                 # Update request status
                                 req.status = 'Rejected'
                                 req.admin_note = note
                                 req.save()
-                                messages.success(request, f"Request rejected and {req.quantity} units returned to {mat.name}.")
+                                messages.success(request, f"Request rejected and {req.quantity} units returned to {mat['name']}.")
                         except Exception as e:
                              messages.error(request, f"Failed to return stock: {str(e)}")
                              return redirect('requests')
@@ -551,11 +586,72 @@ def requests_view(request):
         form = RequestForm()
         
     return render(request, 'inventory/requests.html', {
-        'requests': requests, 
+        'request_rows': fragments.render_rows(
+            request, 'inventory/partials/request_row.html', requests, 'req',
+            lambda req: {
+                'role': role,
+                'requester': req.requester.get_full_name() or req.requester.username,
+                'material': req.material.name,
+            },
+        ),
         'form': form,
-        'role': role
+        'role': role,
+        'approved_count': approved_count,
+        'pending_count': pending_count,
+        'reject_count': reject_count,
     })
 
+@login_required
+def requests_bulk(request):
+    """Approve or reject many requests at once (Admin only).
+
+    Accepts a form POST from the requests page (`req_ids`, `action`,
+    `admin_note`, `allow_partial`) or a JSON body
+    `{"ids": [...], "action": "approve"|"reject", "admin_note": "", "allow_partial": false}`
+    and answers JSON with a per-request result.
+    """
+    is_json = request.content_type == 'application/json'
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    if request.role != 'Admin':
+        if is_json:
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        messages.error(request, "Permission denied.")
+        return redirect('requests')
+
+    if is_json:
+        try:
+            payload = json.loads(request.body or b'{}')
+            ids = [int(pk) for pk in payload.get('ids', [])]
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+        action = payload.get('action')
+        note = str(payload.get('admin_note', ''))
+        allow_partial = bool(payload.get('allow_partial', False))
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('req_ids') if pk.isdigit()]
+        action = request.POST.get('action')
+        note = request.POST.get('admin_note', '')
+        allow_partial = request.POST.get('allow_partial') == 'on'
+    action = {'accept': 'approve'}.get(action, action)
+
+    if action not in ('approve', 'reject') or not ids:
+        if is_json:
+            return JsonResponse({'error': 'Expected action approve/reject and at least one id'}, status=400)
+        messages.error(request, "Select at least one request and an action.")
+        return redirect('requests')
+
+    results = bulk_process_requests(ids, action, user=request.user, note=note, allow_partial=allow_partial)
+    if is_json:
+        return JsonResponse({'results': results})
+
+    done = sum(1 for r in results if r['result'] in ('approved', 'partial', 'rejected'))
+    messages.success(request, f"{done} of {len(results)} requests {action}d.")
+    for r in results:
+        if r['result'] in ('failed', 'partial'):
+            messages.warning(request, f"REQ-{r['id']:03d}: {r['reason']}")
+    return redirect('requests')
+
 @login_required
 def reports_view(request):
     # Get filter parameters
@@ -573,35 +669,195 @@ def reports_view(request):
     start = datetime.strptime(from_date, '%Y-%m-%d').date()
     end = datetime.strptime(to_date, '%Y-%m-%d').date()
 
-    # Filter requests by date
-    requests_qs = MaterialRequest.objects.filter(
-        requested_at__date__gte=start,
-        requested_at__date__lte=end
+    # Summary Stats from the daily rollups, stock counters from the summary table
+    summary = rollups.summary(start, end)
+    counts = stats.get_counts()
+    low_stock = counts.get(stats.material_key('Low Stock'), 0) + counts.get(stats.material_key('Out of Stock'), 0)
+
+    # Recent requests for table (plain timestamp bounds so the index applies)
+    recent_requests = MaterialRequest.objects.filter(
+        requested_at__gte=journal.day_end(start - timezone.timedelta(days=1)),
+        requested_at__lt=journal.day_end(end),
+    ).select_related('requester', 'material').order_by('-requested_at')[:20]
+
+    # Stock movement journal over the same range
+    movements_qs = StockMovement.objects.filter(
+        created_at__gte=journal.day_end(start - timezone.timedelta(days=1)),
+        created_at__lt=journal.day_end(end),
     )
-
-    # Summary Stats
-    total_used = requests_qs.filter(status='Approved').aggregate(total=Sum('quantity'))['total'] or 0
-    total_requests = requests_qs.count()
-    approved_count = requests_qs.filter(status='Approved').count()
-    pending_count = requests_qs.filter(status='Pending').count()
-    low_stock = Material.objects.filter(quantity__lt=10).count()
-
-    # Recent requests for table
-    recent_requests = requests_qs.order_by('-requested_at')[:20]
+    movement_summary = movements_qs.aggregate(
+        stock_in=Sum('delta', filter=Q(delta__gt=0)),
+        stock_out=Sum('delta', filter=Q(delta__lt=0)),
+    )
+    recent_movements = movements_qs.select_related('material', 'user').order_by('-created_at')[:20]
 
     context = {
-        'total_used': total_used,
-        'total_requests': total_requests,
-        'approved_count': approved_count,
-        'pending_count': pending_count,
+        'total_used': summary['total_used'],
+        'total_requests': summary['total_requests'],
+        'approved_count': summary['approved_count'],
+        'pending_count': summary['pending_count'],
+        'used_entries': summary['used_entries'],
+        'used_quantity': summary['used_quantity'],
         'low_stock': low_stock,
         'recent_requests': recent_requests,
+        'stock_in': movement_summary['stock_in'] or 0,
+        'stock_out': -(movement_summary['stock_out'] or 0),
+        'recent_movements': recent_movements,
         'from_date': from_date,
         'to_date': to_date,
         'report_type': report_type,
     }
     return render(request, 'inventory/reports.html', context)
 
+def _report_range(request):
+    """(start, end) days from ?from_date=&to_date=, defaulting to the last 30 days."""
+    today = timezone.localdate()
+    start = request.GET.get('from_date') or str(today - timezone.timedelta(days=30))
+    end = request.GET.get('to_date') or str(today)
+    return datetime.strptime(start, '%Y-%m-%d').date(), datetime.strptime(end, '%Y-%m-%d').date()
+
+@login_required
+def reports_export(request):
+    """Stream the requests, used materials and stock journal in a date range as CSV or XLSX.
+
+    `?format=csv|xlsx&type=requests|used_materials|movements|all&from_date=&to_date=`
+    (defaults: xlsx, all, the last 30 days). CSV holds one table, so
+    `all` exports requests; XLSX gets one sheet per table.
+    """
+    if request.role not in ['Admin', 'Storekeeper']:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    fmt = request.GET.get('format', 'xlsx')
+    kind = request.GET.get('type', 'all')
+    try:
+        start, end = _report_range(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+    names = list(exports.EXPORTS) if kind not in exports.EXPORTS else [kind]
+    filename = f"{'report' if len(names) > 1 else names[0]}_{start}_{end}"
+
+    if fmt == 'csv':
+        response = StreamingHttpResponse(
+            exports.csv_stream(exports.rows(names[0], start, end)), content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{names[0]}_{start}_{end}.csv"'
+        return response
+    if fmt != 'xlsx':
+        return JsonResponse({'error': 'format must be csv or xlsx'}, status=400)
+    output = exports.xlsx_file({exports.EXPORTS[name][0]: exports.rows(name, start, end) for name in names})
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+@login_required
+def reports_pdf(request):
+    """Start (or reuse) the PDF report for a date range.
+
+    Redirects to the finished file when this range was already rendered
+    at the current data version; otherwise queues the render and answers
+    202 with the URL to poll.
+    """
+    if request.role not in ['Admin', 'Storekeeper']:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    try:
+        start, end = _report_range(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+    key, state = pdf.request_pdf(start, end)
+    if state == 'ready':
+        return redirect('reports_pdf_file', key=key)
+    url = reverse('reports_pdf_file', args=[key])
+    response = JsonResponse({'status': state, 'url': url}, status=202)
+    response['Location'] = url
+    response['Retry-After'] = '2'
+    return response
+
+@login_required
+def reports_pdf_file(request, key):
+    """Serve a rendered PDF report, or its render status while it is pending."""
+    if request.role not in ['Admin', 'Storekeeper']:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    try:
+        state = pdf.status(key)
+    except ValueError:
+        return JsonResponse({'error': 'Unknown report'}, status=404)
+    if state == 'ready':
+        response = FileResponse(open(pdf.path(key), 'rb'), content_type='application/pdf',
+                                filename=f'report_{key[:12]}.pdf')
+        # The key is a content hash, so the file never changes
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+    if state == 'rendering':
+        response = JsonResponse({'status': state}, status=202)
+        response['Retry-After'] = '2'
+        return response
+    return JsonResponse({'status': state}, status=500 if state == 'failed' else 404)
+
+@login_required
+def import_view(request):
+    """Upload a CSV/XLSX file of materials, tasks or vendors; dry run by default."""
+    allowed = [entity for entity, (_, _, roles) in imports.IMPORTERS.items() if request.role in roles]
+    if not allowed:
+        messages.error(request, "You cannot import data.")
+        return redirect('dashboard')
+    entity = request.POST.get('entity') or request.GET.get('entity') or allowed[0]
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if entity not in allowed:
+            messages.error(request, f"You cannot import {entity}.")
+        elif not upload or not upload.name.lower().endswith(('.csv', '.xlsx')):
+            messages.error(request, "Choose a .csv or .xlsx file.")
+        else:
+            dry_run = bool(request.POST.get('dry_run'))
+            try:
+                report = imports.import_rows(
+                    entity, imports.read_rows(upload, upload.name), request.user,
+                    dry_run=dry_run, source=upload.name,
+                )
+            except imports.ImportFileError as exc:
+                messages.error(request, f"Could not read {exc}")
+            else:
+                verb = 'Would import' if dry_run else 'Imported'
+                messages.success(request, f"{verb} {entity}: {report['created']} new, {report['updated']} updated, "
+                                          f"{report['unchanged']} unchanged, {len(report['errors'])} rows with errors.")
+    return render(request, 'inventory/import.html', {
+        'entities': allowed, 'entity': entity, 'report': report, 'diff_limit': imports.DIFF_LIMIT,
+    })
+
+@login_required
+def inventory_at_json(request):
+    """Return on-hand quantity of every material at a point in time.
+
+    `?date=YYYY-MM-DD` gives the inventory at the end of that day (default
+    today, i.e. now).
+    """
+    if request.role not in ['Admin', 'Storekeeper']:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    date_str = request.GET.get('date', '')
+    if date_str:
+        try:
+            day = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+        when = min(journal.day_end(day), timezone.now())
+    else:
+        when = timezone.now()
+
+    quantities = journal.inventory_at(when)
+    names = dict(Material.objects.filter(pk__in=quantities).values_list('pk', 'name'))
+    # Materials deleted since then, under the name they had
+    names.update(
+        StockMovement.objects.filter(reason='delete', material_id__in=set(quantities) - set(names), created_at__gte=when)
+        .values_list('material_id', 'material_name')
+    )
+    data = [
+        {'material_id': pk, 'material': names[pk], 'quantity': qty}
+        for pk, qty in sorted(quantities.items(), key=lambda item: names.get(item[0], ''))
+        if pk in names
+    ]
+    return JsonResponse({'at': when.isoformat(), 'materials': data})
+
 @login_required
 def manage_request(request, pk):
     # Backward compatibility if needed, but requests_view now handles it via POST
@@ -614,36 +870,15 @@ def approve_request(request, pk):
 
 @login_required
 def settings_view(request):
-    # Ensure role groups exist
-    ROLE_GROUPS = ['Admin', 'Storekeeper', 'Technician']
-    for r in ROLE_GROUPS:
-        Group.objects.get_or_create(name=r)
-
     # Admin access: allow either UserProfile role==Admin or membership in Admin group
-    try:
-        is_admin_profile = (request.user.userprofile.role == 'Admin')
-    except Exception:
-        is_admin_profile = False
-
-    is_admin_group = request.user.groups.filter(name='Admin').exists()
-    if not (is_admin_profile or is_admin_group):
+    if not (request.role == 'Admin' or 'Admin' in request.role_groups):
         messages.error(request, "Only Admins can access Settings!")
         return redirect('dashboard')
 
-    # Use User queryset for compatibility with existing template which expects User objects
-    users = User.objects.all().select_related('userprofile')
-    default_group = Group.objects.get(name='Technician')
-    # Ensure every user has a UserProfile and at least one role-group
-    for u in users:
-        # create UserProfile if missing, prefilling role from first role-group if available
-        try:
-            ensure_userprofile(u)
-        except Exception:
-            # best effort; continue
-            pass
-        # ensure at least one role-group assigned
-        if not u.groups.filter(name__in=ROLE_GROUPS).exists():
-            u.groups.add(default_group)
+    # Use User queryset for compatibility with existing template which expects User objects.
+    # Profiles and role groups are reconciled on user creation and via the
+    # 'reconcile_roles' action / reconcile_user_roles command, not per page view.
+    users = User.objects.all().select_related('userprofile').prefetch_related('groups')
 
     vendors = Vendor.objects.all()
     system_settings = SystemSetting.objects.all()
@@ -679,11 +914,26 @@ def settings_view(request):
                 messages.success(request, "Notification preferences updated!")
 
         elif action == 'backup':
-            output = StringIO()
-            call_command('dumpdata', exclude=['auth.permission', 'contenttypes'], stdout=output)
-            response = HttpResponse(output.getvalue(), content_type='application/json')
-            response['Content-Disposition'] = 'attachment; filename="isp_backup_{}.json"'.format(
-                timezone.now().strftime('%Y%m%d_%H%M%S')
+            # Streamed and compressed chunk by chunk; restore with restore_inventory
+            compression = 'brotli' if request.POST.get('compression') == 'brotli' else 'gzip'
+            since = None
+            if request.POST.get('since'):
+                try:
+                    since = parse_datetime(request.POST['since'])
+                except ValueError:
+                    since = None
+                if since is None:
+                    messages.error(request, "Invalid 'since' timestamp for an incremental backup.")
+                    return redirect('settings')
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+            response = StreamingHttpResponse(
+                backups.stream(since, compression),
+                content_type='application/gzip' if compression == 'gzip' else 'application/octet-stream',
+            )
+            response['Content-Disposition'] = 'attachment; filename="isp_backup_{}{}.jsonl.{}"'.format(
+                timezone.now().strftime('%Y%m%d_%H%M%S'), '_incremental' if since else '',
+                'gz' if compression == 'gzip' else 'br',
             )
             return response
 
@@ -695,11 +945,8 @@ def settings_view(request):
                 user = User.objects.get(id=user_id)
                 # ensure group exists
                 grp, _ = Group.objects.get_or_create(name=new_role)
-                # remove existing role groups
-                for rn in ROLE_GROUPS:
-                    g = Group.objects.filter(name=rn).first()
-                    if g and g in user.groups.all():
-                        user.groups.remove(g)
+                # replace existing role groups
+                user.groups.remove(*[g for name, g in ensure_role_groups().items() if name != new_role])
                 user.groups.add(grp)
                 # update UserProfile if exists
                 try:
@@ -710,6 +957,10 @@ def settings_view(request):
                     pass
                 messages.success(request, f"Role updated for {user.username}")
 
+        elif action == 'reconcile_roles':
+            result = reconcile_user_roles()
+            messages.success(request, "Roles reconciled: {profiles_created} profiles created, {memberships_added} users added to a role group.".format(**result))
+
         # Group management: create/delete groups, add/remove members
         elif action == 'create_group':
             group_name = request.POST.get('group_name', '').strip()
@@ -784,16 +1035,17 @@ def settings_view(request):
 
 
 @login_required
+# The form offers materials the technician holds, which approvals change
+@versions.conditional(versions.USED_MATERIAL, versions.MATERIAL, versions.REQUEST)
 def used_materials_view(request):
-    profile = ensure_userprofile(request.user)
-    role = profile.role if profile else 'Technician'
+    role = request.role
 
     # Strict permission: Only Technicians can access this page
     if role != 'Technician':
         messages.error(request, "Access restricted to Technicians only.")
         return redirect('dashboard')
 
-    used_materials = UsedMaterial.objects.filter(technician=request.user).order_by('-added_at')
+    used_materials = UsedMaterial.objects.filter(technician=request.user).select_related('technician', 'material').order_by('-added_at')
 
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -807,7 +1059,9 @@ def used_materials_view(request):
             if form.is_valid():
                 um = form.save(commit=False)
                 um.technician = request.user
-                um.save()
+                # Row and stock balance change together
+                with transaction.atomic():
+                    um.save()
                 messages.success(request, "Used Model added successfully!")
                 return redirect('used_materials')
             else:
@@ -821,7 +1075,8 @@ def used_materials_view(request):
                 if role == 'Technician' and um.technician == request.user:
                      form = UsedMaterialForm(request.POST, instance=um, user=request.user)
                      if form.is_valid():
-                         form.save()
+                         with transaction.atomic():
+                             form.save()
                          messages.success(request, "Used Model updated.")
                      else:
                          messages.error(request, "Invalid data.")
@@ -834,10 +1089,15 @@ def used_materials_view(request):
     else:
         form = UsedMaterialForm(user=request.user)
 
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        used_materials = search.filter_queryset(used_materials, 'used_material', search_query)
+
     return render(request, 'inventory/used_materials.html', {
         'used_materials': used_materials,
         'form': form,
-        'role': role
+        'role': role,
+        'search': search_query,
     })
 
 @login_required